@@ -0,0 +1,112 @@
+"""Compare image budgets: payload size, and optionally tokens and confidence.
+
+Renders each document as the pipeline does (first page at 200 DPI for PDFs),
+applies every budget in BUDGETS and reports the base64 payload size sent to
+the provider. With --endpoint/--model (and CLAIMLENS_BENCH_API_KEY in the
+environment) it also runs a real extraction per setting and reports
+tokens_used and aggregate_confidence, using the file-based prompts.
+
+    python benchmarks/bench_image_budget.py ../test-data/*.pdf
+    CLAIMLENS_BENCH_API_KEY=sk-... python benchmarks/bench_image_budget.py \\
+        --endpoint https://openrouter.ai/api --model mistralai/pixtral-large-2411 ../test-data/*.pdf
+"""
+import argparse
+import base64
+import json
+import mimetypes
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from claimlens.preprocessing import fit_image_to_budget, render_pdf_page, RENDER_MIME_TYPE  # noqa: E402
+
+BUDGETS = [
+    ('original', {}),
+    ('png 2048', {'max_long_edge': 2048, 'format': 'png'}),
+    ('jpeg 2048 q85', {'max_long_edge': 2048, 'format': 'jpeg', 'quality': 85}),
+    ('jpeg 1600 q80', {'max_long_edge': 1600, 'format': 'jpeg', 'quality': 80}),
+    ('webp 1600 q80', {'max_long_edge': 1600, 'format': 'webp', 'quality': 80}),
+    ('jpeg 1280 q75 gray', {'max_long_edge': 1280, 'format': 'jpeg', 'quality': 75, 'grayscale': True}),
+    ('webp 2MP q70 gray', {'max_pixels': 2_000_000, 'format': 'webp', 'quality': 70, 'grayscale': True}),
+]
+
+DEFAULT_TEMPLATE = {
+    'patient_name': {'type': 'string', 'required': True},
+    'invoice_number': {'type': 'string', 'required': True},
+    'invoice_date': {'type': 'date', 'required': True},
+    'items': {
+        'type': 'array',
+        'required': True,
+        'items': {
+            'description': 'string: item or service description',
+            'quantity': 'integer: quantity',
+            'amount': 'decimal: line total',
+        },
+    },
+    'total_amount': {'type': 'decimal', 'required': True},
+}
+
+
+def load_source(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    mime_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if mime_type == 'application/pdf':
+        return render_pdf_page(data), RENDER_MIME_TYPE
+    return data, mime_type
+
+
+def make_engine(args, budget):
+    import claimlens.engine.base as base
+    from claimlens.engine.adapters.openai_compatible import OpenAICompatibleEngine
+
+    # No database here: resolve prompts from the bundled .md files
+    base._resolve_prompt = lambda prompt_type, document_type_code=None: base._load_prompt(f'{prompt_type}.md')
+    return OpenAICompatibleEngine({
+        'name': 'bench',
+        'endpoint_url': args.endpoint,
+        'api_key': os.environ.get('CLAIMLENS_BENCH_API_KEY', ''),
+        'model_name': args.model,
+        'image_budget': budget,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--endpoint')
+    parser.add_argument('--model')
+    parser.add_argument('--template', help='JSON extraction template (default: generic invoice)')
+    args = parser.parse_args()
+
+    live = bool(args.endpoint and args.model)
+    template = DEFAULT_TEMPLATE
+    if args.template:
+        with open(args.template) as f:
+            template = json.load(f)
+
+    header = f"{'file':<32} {'setting':<20} {'payload KB':>10}"
+    if live:
+        header += f" {'tokens':>8} {'confidence':>10} {'ms':>7}"
+    print(header)
+
+    for path in args.files:
+        image_bytes, mime_type = load_source(path)
+        for label, budget in BUDGETS:
+            fitted, fitted_mime = fit_image_to_budget(image_bytes, mime_type, budget)
+            payload_kb = len(base64.b64encode(fitted)) / 1024
+            row = f"{os.path.basename(path)[:32]:<32} {label:<20} {payload_kb:>10.1f}"
+            if live:
+                engine = make_engine(args, budget)
+                result = engine.extract(image_bytes, mime_type, template)
+                if result.success:
+                    row += f" {result.tokens_used:>8} {result.confidence:>10.2f} {result.processing_time_ms:>7}"
+                else:
+                    row += f" {'error: ' + (result.error or '')[:40]}"
+                engine.close()
+            print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark parsing of large extraction responses: strict path vs tolerant partial parser.
+
+Run from the backend directory (no database or Django settings needed):
+
+    python benchmarks/bench_json_repair.py
+
+For synthetic line-item tables of growing size it times the strict path
+(json.loads with split_merged_objects, then flatten_merged) and
+parse_partial_json on the complete text, on a response with merged line
+items, and on the same response truncated at 90%. It also reports how many
+line items the partial parser recovers from the truncated text, where the
+strict path recovers none.
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from claimlens.engine.json_repair import flatten_merged, parse_partial_json, split_merged_objects  # noqa: E402
+
+SIZES = [10, 100, 1000, 5000]
+REPEAT = 5
+
+
+def build(items, rng):
+    line_items = [
+        {
+            'code': f'SVC-{rng.randint(1000, 9999)}',
+            'description': rng.choice(['Consultation', 'X-ray chest', 'Amoxicillin 500mg', 'Full blood count']),
+            'quantity': str(rng.randint(1, 30)),
+            'unit_price': f'{rng.uniform(1, 500):.2f}',
+            'amount': f'{rng.uniform(1, 5000):.2f}',
+        }
+        for _ in range(items)
+    ]
+    return json.dumps({
+        'fields': {
+            'patient_name': {'value': 'Amina Hassan', 'confidence': 0.94},
+            'invoice_date': {'value': '2024-06-10', 'confidence': 0.91},
+            'line_items': {'value': line_items, 'confidence': 0.88},
+            'total_amount': {'value': '12345.00', 'confidence': 0.9},
+        },
+        'aggregate_confidence': 0.9,
+    })
+
+
+def strict(text):
+    return flatten_merged(json.loads(text, object_pairs_hook=split_merged_objects))
+
+
+def partial(text):
+    value, _truncated = parse_partial_json(text, object_pairs_hook=split_merged_objects)
+    return flatten_merged(value)
+
+
+def per_call_ms(func, text):
+    return timeit.timeit(lambda: func(text), number=REPEAT) / REPEAT * 1000
+
+
+def main():
+    rng = random.Random(42)
+    print(
+        f"{'items':>6} {'KB':>7} {'strict ms':>10} {'partial ms':>11} "
+        f"{'merged strict':>14} {'merged partial':>15} {'truncated ms':>13} {'recovered':>10}"
+    )
+    for items in SIZES:
+        text = build(items, rng)
+        # An LLM dropping the "}, {" between line items, handled by split_merged_objects
+        merged = text.replace('}, {"code"', ', "code"')
+        truncated = text[:int(len(text) * 0.9)]
+
+        recovered = partial(truncated)['fields']['line_items']['value']
+        print(
+            f"{items:>6} {len(text) / 1024:>7.1f} {per_call_ms(strict, text):>10.3f} "
+            f"{per_call_ms(partial, text):>11.3f} {per_call_ms(strict, merged):>14.3f} "
+            f"{per_call_ms(partial, merged):>15.3f} {per_call_ms(partial, truncated):>13.3f} "
+            f"{f'{len(recovered)}/{items}':>10}"
+        )
+
+
+if __name__ == '__main__':
+    main()
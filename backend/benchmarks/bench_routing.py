@@ -0,0 +1,69 @@
+"""Benchmark RoutingTable lookups as the number of rules and scores grows.
+
+Run from the backend directory (no database or Django settings needed):
+
+    python benchmarks/bench_routing.py
+
+A flat "warm lookup" column shows that routing a document costs the same
+regardless of how many rules and capability scores are configured.
+"""
+import os
+import random
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from claimlens.engine.routing import RoutingTable  # noqa: E402
+
+LANGUAGES = ['en', 'fr', 'ar', 'sw', 'pt', 'es', 'de', 'it', 'ru', 'zh']
+DOCUMENT_TYPES = [None] + [f'type-{i}' for i in range(50)]
+ENGINES = [f'engine-{i}' for i in range(40)]
+SIZES = [10, 100, 1000, 5000, 20000]
+LOOKUPS = 10000
+
+
+def build(size, rng):
+    rules = [
+        SimpleNamespace(
+            name=f'rule-{i}', engine_config_id=rng.choice(ENGINES),
+            language=rng.choice(LANGUAGES + [None]), document_type_id=rng.choice(DOCUMENT_TYPES),
+            priority=rng.choice([10, 50, 90, 100]), min_confidence=rng.choice([0.0, 0.0, 0.5, 0.8]),
+        )
+        for i in range(size)
+    ]
+    scores = [
+        SimpleNamespace(
+            engine_config_id=rng.choice(ENGINES), language=rng.choice(LANGUAGES),
+            document_type_id=rng.choice(DOCUMENT_TYPES), accuracy_score=rng.randint(0, 100),
+            cost_per_page=rng.random() / 10, speed_score=rng.randint(0, 100),
+        )
+        for _ in range(size)
+    ]
+    return rules, scores
+
+
+def main():
+    rng = random.Random(42)
+    keys = [(rng.choice(LANGUAGES), rng.choice(DOCUMENT_TYPES)) for _ in range(LOOKUPS)]
+
+    print(f"{'rules+scores':>13} {'compile ms':>11} {'cold lookup us':>15} {'warm lookup us':>15}")
+    for size in SIZES:
+        rules, scores = build(size, rng)
+
+        compile_s = timeit.timeit(lambda: RoutingTable(rules, scores), number=1)
+        table = RoutingTable(rules, scores)
+
+        unique_keys = list(dict.fromkeys(keys))
+        cold_s = timeit.timeit(lambda: [table.lookup(*k) for k in unique_keys], number=1)
+        warm_s = timeit.timeit(lambda: [table.lookup(*k) for k in keys], number=5)
+
+        print(
+            f"{size:>13} {compile_s * 1000:>11.2f} "
+            f"{cold_s / len(unique_keys) * 1e6:>15.2f} {warm_s / (5 * LOOKUPS) * 1e6:>15.3f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -38,6 +38,17 @@ DEFAULT_CFG = {
     "storage_endpoint_url": "http://minio:9000",
     "storage_access_key": "minioadmin",
     "storage_secret_key": "minioadmin",
+    # Endpoint presigned URLs are made for when browsers cannot reach storage_endpoint_url
+    "storage_public_endpoint_url": "",
+    # Local LRU disk cache in front of storage reads, shared by the workers of a host;
+    # hit/miss counts in /health/. It holds unencrypted document content, so it needs
+    # an explicit directory on a private volume (created 0700). Deleting a document
+    # only drops this host's copy; other hosts' copies expire after max_age_hours
+    "storage_cache_enabled": False,
+    "storage_cache_dir": "",
+    "storage_cache_max_mb": 512,
+    "storage_cache_max_object_mb": 50,
+    "storage_cache_max_age_hours": 24,
 
     # Celery
     "celery_broker_url": "redis://redis-claimlens:6379/0",
@@ -45,14 +56,108 @@ DEFAULT_CFG = {
     "celery_queue_classification": "claimlens.classification",
     "celery_queue_extraction": "claimlens.extraction",
     "celery_queue_validation": "claimlens.validation",
+    # "chain": one task per stage on its own queue; "fused": one task on the extraction
+    # queue reading storage once; "auto": fused up to fused_pipeline_max_file_size_mb
+    "processing_pipeline_mode": "chain",
+    "fused_pipeline_max_file_size_mb": 2,
+    # Task retries wait base * 2^retries seconds (plus jitter), capped at the max
+    "celery_retry_backoff_seconds": 10,
+    "celery_retry_max_backoff_seconds": 600,
 
     # LLM
     "default_engine_adapter": "openai_compatible",
     "llm_request_timeout_seconds": 120,
+    # Local retries of transient provider errors (429, 5xx, timeouts) inside one request
     "llm_max_retries": 2,
+    "llm_retry_backoff_seconds": 1.0,
+    "llm_retry_max_backoff_seconds": 30.0,
+    "llm_pool_max_connections": 20,
+    "llm_pool_max_keepalive_connections": 10,
+    "llm_keepalive_expiry_seconds": 30,
+    "llm_http2": False,
+    # Requests in flight per engine and process on the async engine path
+    "llm_async_max_concurrency_per_engine": 16,
+    # Hedged requests: when the routed engine is slower than this percentile of its
+    # recent latencies, the next-best engine is asked too and the first success wins
+    "llm_hedging_enabled": False,
+    "llm_hedge_percentile": 95,
+    "llm_hedge_min_samples": 20,
+    "llm_latency_window_size": 200,
+    # Per-request timeout of multiplier x the latency percentile per engine (and
+    # document type), between min_seconds and EngineConfig.timeout_seconds
+    "llm_adaptive_timeout_enabled": True,
+    "llm_adaptive_timeout_percentile": 99,
+    "llm_adaptive_timeout_multiplier": 2.0,
+    "llm_adaptive_timeout_min_seconds": 10,
+    "llm_adaptive_timeout_min_samples": 20,
+    # EngineConfig requests/tokens-per-minute budgets: "redis" shares them across
+    # workers (redis URL defaults to celery_broker_url), "local" enforces per process
+    "llm_rate_limit_backend": "redis",
+    "llm_rate_limit_redis_url": "",
+    # Longer waits for a slot reroute to another engine instead
+    "llm_rate_limit_max_wait_seconds": 10,
+    # Follow-up requests asking an engine to continue JSON cut off by max_tokens;
+    # 0 keeps whatever fields and array items the truncated output holds
+    "llm_max_continuations": 1,
+    # Cache of successful LLM responses keyed by document content, prompt and model
+    "llm_response_cache_enabled": True,
+    "llm_response_cache_alias": "default",
+    "llm_response_cache_ttl_seconds": 604800,
+    "llm_response_cache_max_bytes": 1048576,
+    # Language detected from the PDF text layer at preprocessing, used to route
+    # classification; the default applies to scanned documents when set
+    "language_detection_enabled": True,
+    "language_detection_min_words": 20,
+    "default_document_language": "",
+    # Local classification before the engine: text-layer match against quoted or
+    # comma-separated DocumentType.classification_hints keywords, then perceptual-hash
+    # match: at least phash_min_votes near-duplicates, all of one type, classified by
+    # an engine (with at least phash_min_confidence) or the uploader
+    "local_classification_enabled": True,
+    "local_classification_hint_min_score": 0.6,
+    "local_classification_hint_min_matches": 2,
+    "local_classification_phash_max_distance": 6,
+    "local_classification_phash_min_votes": 3,
+    "local_classification_phash_min_confidence": 0.9,
+    "local_classification_phash_candidates": 1000,
+    # Classify and extract in one request for every document type (otherwise only
+    # for types with DocumentType.fused_extraction) while the templates fit the limit
+    "fused_classify_extract_enabled": False,
+    "fused_max_template_chars": 8000,
+    # Applied to engines whose EngineConfig.image_budget is empty
+    "default_image_budget": {},
+    "engine_registry_ttl_seconds": 300,
+    # Bounds the age of cached prompt templates when the Django cache is not shared
+    "prompt_cache_ttl_seconds": 300,
+    "health_check_ttl_seconds": 30,
+    "circuit_failure_threshold": 3,
+    "circuit_cooldown_seconds": 60,
+
+    # Multi-page PDFs: "combined" sends all pages in one request,
+    # "per_page" sends parallel per-page requests and merges, "off" uses page 1 only
+    "multipage_extraction_mode": "off",
+    "multipage_max_pages": 10,
+    "multipage_max_parallel_requests": 4,
+
+    # PDF text layer: "auto" sends born-digital pages as text instead of images
+    "text_layer_mode": "off",
+    "text_layer_min_chars": 200,
 
     # Limits
     "max_file_size_mb": 20,
+    # Downloads are streamed from storage in chunks of this size; with presigned
+    # downloads enabled the endpoint redirects to a short-lived storage URL instead
+    "download_chunk_size_kb": 64,
+    "download_presigned_urls": False,
+    "download_presigned_url_expiry_seconds": 300,
+    # Direct uploads: the client PUTs to a presigned storage URL, then confirms the
+    # upload within this many seconds so it is verified and registered. Objects left
+    # unconfirmed are deleted by delete_unconfirmed_upload (claimlens.preprocessing)
+    # once the upload token expires; keep the broker's visibility timeout above 2x this
+    "upload_presigned_url_expiry_seconds": 900,
+    # Bulk uploads: files (or zip members) per batch, and parallel writes to storage
+    "batch_max_files": 5000,
+    "batch_upload_workers": 8,
     "allowed_mime_types": [
         "application/pdf",
         "image/jpeg",
@@ -101,6 +206,12 @@ class ClaimlensConfig(AppConfig):
     storage_endpoint_url = None
     storage_access_key = None
     storage_secret_key = None
+    storage_public_endpoint_url = None
+    storage_cache_enabled = None
+    storage_cache_dir = None
+    storage_cache_max_mb = None
+    storage_cache_max_object_mb = None
+    storage_cache_max_age_hours = None
 
     # Celery
     celery_broker_url = None
@@ -108,14 +219,75 @@ class ClaimlensConfig(AppConfig):
     celery_queue_classification = None
     celery_queue_extraction = None
     celery_queue_validation = None
+    processing_pipeline_mode = None
+    fused_pipeline_max_file_size_mb = None
+    celery_retry_backoff_seconds = None
+    celery_retry_max_backoff_seconds = None
 
     # LLM
     default_engine_adapter = None
     llm_request_timeout_seconds = None
     llm_max_retries = None
+    llm_retry_backoff_seconds = None
+    llm_retry_max_backoff_seconds = None
+    llm_pool_max_connections = None
+    llm_pool_max_keepalive_connections = None
+    llm_keepalive_expiry_seconds = None
+    llm_http2 = None
+    llm_async_max_concurrency_per_engine = None
+    llm_hedging_enabled = None
+    llm_hedge_percentile = None
+    llm_hedge_min_samples = None
+    llm_latency_window_size = None
+    llm_adaptive_timeout_enabled = None
+    llm_adaptive_timeout_percentile = None
+    llm_adaptive_timeout_multiplier = None
+    llm_adaptive_timeout_min_seconds = None
+    llm_adaptive_timeout_min_samples = None
+    llm_rate_limit_backend = None
+    llm_rate_limit_redis_url = None
+    llm_rate_limit_max_wait_seconds = None
+    llm_max_continuations = None
+    llm_response_cache_enabled = None
+    llm_response_cache_alias = None
+    llm_response_cache_ttl_seconds = None
+    llm_response_cache_max_bytes = None
+    language_detection_enabled = None
+    language_detection_min_words = None
+    default_document_language = None
+    local_classification_enabled = None
+    local_classification_hint_min_score = None
+    local_classification_hint_min_matches = None
+    local_classification_phash_max_distance = None
+    local_classification_phash_min_votes = None
+    local_classification_phash_min_confidence = None
+    local_classification_phash_candidates = None
+    fused_classify_extract_enabled = None
+    fused_max_template_chars = None
+    default_image_budget = None
+    engine_registry_ttl_seconds = None
+    prompt_cache_ttl_seconds = None
+    health_check_ttl_seconds = None
+    circuit_failure_threshold = None
+    circuit_cooldown_seconds = None
+
+    # Multi-page PDFs
+    multipage_extraction_mode = None
+    multipage_max_pages = None
+    multipage_max_parallel_requests = None
+
+    # PDF text layer
+    text_layer_mode = None
+    text_layer_min_chars = None
 
     # Limits
     max_file_size_mb = None
+    download_chunk_size_kb = None
+    download_presigned_urls = None
+    download_presigned_url_expiry_seconds = None
+    upload_presigned_url_expiry_seconds = None
+    batch_max_files = None
+    batch_upload_workers = None
     allowed_mime_types = None
 
     def __load_config(self, cfg):
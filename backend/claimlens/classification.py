@@ -0,0 +1,76 @@
+"""Local classification tier tried before asking an engine to classify a document."""
+import logging
+import re
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+EXPLICIT = 'explicit'
+HINTS = 'hints'
+PERCEPTUAL_HASH = 'perceptual_hash'
+
+_QUOTED = re.compile(r'"([^"]+)"|\'([^\']+)\'')
+_SEPARATORS = re.compile(r'[,;\n]')
+# Longer hint fragments are descriptions for the LLM rather than literal keywords
+_MAX_KEYWORD_WORDS = 4
+
+
+def hint_keywords(hints):
+    """Literal keywords of a ``classification_hints`` text, lower-cased.
+
+    Quoted phrases are used when there are any; otherwise the comma, semicolon
+    or newline separated fragments of at most four words.
+    """
+    if not hints:
+        return []
+    quoted = [a or b for a, b in _QUOTED.findall(hints)]
+    fragments = quoted or _SEPARATORS.split(hints)
+    keywords = []
+    for fragment in fragments:
+        fragment = ' '.join(fragment.split()).lower()
+        if fragment and (quoted or len(fragment.split()) <= _MAX_KEYWORD_WORDS):
+            keywords.append(fragment)
+    return keywords
+
+
+def match_hints(text, document_types, min_score=0.6, min_matches=2):
+    """Return ``(code, score)`` when exactly one type's hint keywords match the text, else None.
+
+    ``score`` is the share of the type's keywords found in the text. A match
+    needs ``min_matches`` keywords and ``min_score``; ties and several types
+    over the threshold are inconclusive.
+    """
+    text = ' '.join(text.split()).lower()
+    matches = []
+    for dt in document_types:
+        keywords = hint_keywords(dt.get('classification_hints'))
+        if not keywords:
+            continue
+        found = sum(1 for keyword in keywords if keyword in text)
+        score = found / len(keywords)
+        if found >= min_matches and score >= min_score:
+            matches.append((dt['code'], score))
+    if len(matches) != 1:
+        return None
+    return matches[0]
+
+
+def match_perceptual_hash(phash, candidates, max_distance=6, min_votes=3):
+    """Return ``(code, votes)`` when at least ``min_votes`` near-duplicates of ``phash`` agree on one type.
+
+    ``candidates`` are (phash, document_type_code) pairs of documents whose
+    type was set by an engine or the uploader. Any neighbour of another type
+    makes the match inconclusive.
+    """
+    from claimlens.preprocessing import hash_distance
+
+    votes = Counter(
+        code for other, code in candidates
+        if other and code and hash_distance(phash, other) <= max_distance
+    )
+    if len(votes) != 1:
+        return None
+    code, count = votes.most_common(1)[0]
+    if count < min_votes:
+        return None
+    return code, count
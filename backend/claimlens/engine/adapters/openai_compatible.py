@@ -1,10 +1,22 @@
 import logging
 
+from asgiref.sync import sync_to_async
+
 from claimlens.engine.base import BaseLLMEngine, register_adapter
+from claimlens.engine.event_loop import database_sync_to_async
+from claimlens.engine.ratelimit import RateLimitExceeded
+from claimlens.engine.retry import is_engine_fault
 from claimlens.engine.types import LLMResponse
+from claimlens.preprocessing import TEXT_MIME_TYPE
 
 logger = logging.getLogger(__name__)
 
+CONTINUATION_PROMPT = (
+    "Your previous answer was cut off. Continue the JSON exactly where it stopped: "
+    "output only the remaining characters, without repeating anything already written "
+    "and without markdown fences."
+)
+
 
 @register_adapter('openai_compatible')
 @register_adapter('mistral')
@@ -14,87 +26,195 @@ class OpenAICompatibleEngine(BaseLLMEngine):
     def classify(self, image_bytes, mime_type, document_types, document_type_code=None):
         try:
             prompt = self._build_classification_prompt(document_types, document_type_code=document_type_code)
-            data_url = self._encode_image(image_bytes, mime_type)
+            return self._response(*self._chat(prompt, [(image_bytes, mime_type)]), "confidence")
+        except RateLimitExceeded:
+            # Let the manager reroute instead of counting it as an engine failure
+            raise
+        except Exception as e:
+            logger.error("OpenAI-compatible classification failed: %s", e)
+            return self._failure(e)
+
+    def classify_extract(self, image_bytes, mime_type, document_types, document_type_code=None):
+        try:
+            prompt = self._build_classify_extract_prompt(document_types, document_type_code=document_type_code)
+            return self._response(*self._chat(prompt, [(image_bytes, mime_type)]), "confidence")
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error("OpenAI-compatible fused classification failed: %s", e)
+            return self._failure(e)
+
+    def extract(self, image_bytes, mime_type, extraction_template, document_type_code=None):
+        return self.extract_pages([(image_bytes, mime_type)], extraction_template, document_type_code)
 
-            payload = {
-                "model": self.model_name,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {"type": "image_url", "image_url": {"url": data_url}},
-                        ],
-                    }
-                ],
-                "max_tokens": self.max_tokens,
-                "temperature": self.temperature,
-            }
-
-            url = f"{self.endpoint_url}/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-
-            resp_data, elapsed_ms = self._make_request(url, headers, payload)
-            content = resp_data["choices"][0]["message"]["content"]
-            parsed = self._parse_json_response(content)
-            tokens = resp_data.get("usage", {}).get("total_tokens", 0)
-
-            return LLMResponse(
-                success=True,
-                data=parsed,
-                confidence=parsed.get("confidence", 0.0),
-                raw_response=resp_data,
-                tokens_used=tokens,
-                processing_time_ms=elapsed_ms,
-                engine_name=self.name,
+    def extract_pages(self, pages, extraction_template, document_type_code=None):
+        try:
+            prompt = self._build_extraction_prompt(
+                extraction_template, document_type_code=document_type_code, page_count=len(pages),
             )
+            response_format = self._response_format(extraction_template)
+            return self._response(*self._chat(prompt, pages, response_format), "aggregate_confidence")
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error("OpenAI-compatible extraction failed: %s", e)
+            return self._failure(e)
+
+    async def aclassify(self, image_bytes, mime_type, document_types, document_type_code=None):
+        try:
+            prompt = await database_sync_to_async(self._build_classification_prompt)(
+                document_types, document_type_code=document_type_code,
+            )
+            return self._response(*await self._achat(prompt, [(image_bytes, mime_type)]), "confidence")
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             logger.error("OpenAI-compatible classification failed: %s", e)
-            return LLMResponse(success=False, error=str(e), engine_name=self.name)
+            return self._failure(e)
 
-    def extract(self, image_bytes, mime_type, extraction_template, document_type_code=None):
+    async def aclassify_extract(self, image_bytes, mime_type, document_types, document_type_code=None):
         try:
-            prompt = self._build_extraction_prompt(extraction_template, document_type_code=document_type_code)
-            data_url = self._encode_image(image_bytes, mime_type)
+            prompt = await database_sync_to_async(self._build_classify_extract_prompt)(
+                document_types, document_type_code=document_type_code,
+            )
+            return self._response(*await self._achat(prompt, [(image_bytes, mime_type)]), "confidence")
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error("OpenAI-compatible fused classification failed: %s", e)
+            return self._failure(e)
+
+    async def aextract(self, image_bytes, mime_type, extraction_template, document_type_code=None):
+        return await self.aextract_pages([(image_bytes, mime_type)], extraction_template, document_type_code)
 
-            payload = {
-                "model": self.model_name,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {"type": "image_url", "image_url": {"url": data_url}},
-                        ],
-                    }
-                ],
-                "max_tokens": self.max_tokens,
-                "temperature": self.temperature,
-            }
-
-            url = f"{self.endpoint_url}/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-
-            resp_data, elapsed_ms = self._make_request(url, headers, payload)
-            content = resp_data["choices"][0]["message"]["content"]
-            parsed = self._parse_json_response(content)
-            tokens = resp_data.get("usage", {}).get("total_tokens", 0)
-
-            return LLMResponse(
-                success=True,
-                data=parsed,
-                confidence=parsed.get("aggregate_confidence", 0.0),
-                raw_response=resp_data,
-                tokens_used=tokens,
-                processing_time_ms=elapsed_ms,
-                engine_name=self.name,
+    async def aextract_pages(self, pages, extraction_template, document_type_code=None):
+        try:
+            prompt = await database_sync_to_async(self._build_extraction_prompt)(
+                extraction_template, document_type_code=document_type_code, page_count=len(pages),
             )
+            response_format = self._response_format(extraction_template)
+            return self._response(*await self._achat(prompt, pages, response_format), "aggregate_confidence")
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             logger.error("OpenAI-compatible extraction failed: %s", e)
-            return LLMResponse(success=False, error=str(e), engine_name=self.name)
+            return self._failure(e)
+
+    def _failure(self, exc):
+        return LLMResponse(
+            success=False, error=str(exc), engine_name=self.name, engine_fault=is_engine_fault(exc),
+        )
+
+    def _response(self, parsed, resp_data, elapsed_ms, truncated, confidence_key):
+        return LLMResponse(
+            success=True,
+            data=parsed,
+            confidence=parsed.get(confidence_key, 0.0),
+            raw_response=resp_data,
+            tokens_used=resp_data.get("usage", {}).get("total_tokens", 0),
+            processing_time_ms=elapsed_ms,
+            engine_name=self.name,
+            truncated=truncated,
+        )
+
+    def _chat(self, prompt, images, response_format=None):
+        """Send the prompt with one or more (bytes, mime_type) pages; return (parsed, raw, elapsed_ms, truncated).
+
+        Pages with TEXT_MIME_TYPE are sent as text parts, everything else as images.
+        Output cut off by max_tokens is continued in up to ``max_continuations``
+        follow-up requests before whatever was recovered is returned.
+        """
+        url, headers, payload = self._chat_request(prompt, images, response_format)
+        resp_data, elapsed_ms = self._make_request(url, headers, payload)
+        parsed, truncated = self._parse_chat(resp_data)
+        for _ in range(self.max_continuations):
+            if not (truncated and self._hit_max_tokens(resp_data)):
+                break
+            more, more_ms = self._make_request(url, headers, self._continuation_payload(payload, resp_data))
+            resp_data, elapsed_ms = self._join_continuation(resp_data, more), elapsed_ms + more_ms
+            parsed, truncated = self._parse_chat(resp_data)
+        return parsed, resp_data, elapsed_ms, truncated
+
+    async def _achat(self, prompt, images, response_format=None):
+        # Image encoding and resizing is CPU work; keep it off the event loop
+        url, headers, payload = await sync_to_async(self._chat_request, thread_sensitive=False)(
+            prompt, images, response_format,
+        )
+        resp_data, elapsed_ms = await self._amake_request(url, headers, payload)
+        parsed, truncated = self._parse_chat(resp_data)
+        for _ in range(self.max_continuations):
+            if not (truncated and self._hit_max_tokens(resp_data)):
+                break
+            more, more_ms = await self._amake_request(url, headers, self._continuation_payload(payload, resp_data))
+            resp_data, elapsed_ms = self._join_continuation(resp_data, more), elapsed_ms + more_ms
+            parsed, truncated = self._parse_chat(resp_data)
+        return parsed, resp_data, elapsed_ms, truncated
+
+    def _chat_request(self, prompt, images, response_format=None):
+        content = [{"type": "text", "text": prompt}]
+        for image_bytes, mime_type in images:
+            if mime_type == TEXT_MIME_TYPE:
+                content.append({"type": "text", "text": self._format_text_layer(image_bytes)})
+                continue
+            data_url = self._encode_image(image_bytes, mime_type)
+            content.append({"type": "image_url", "image_url": {"url": data_url}})
+
+        payload = {
+            "model": self.model_name,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content,
+                }
+            ],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+        }
+        if response_format:
+            payload["response_format"] = response_format
+
+        url = f"{self.endpoint_url}/v1/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        return url, headers, payload
+
+    def _parse_chat(self, resp_data):
+        text = resp_data["choices"][0]["message"]["content"]
+        return self._parse_partial_json_response(text)
+
+    @staticmethod
+    def _hit_max_tokens(resp_data):
+        return resp_data["choices"][0].get("finish_reason") == "length"
+
+    @staticmethod
+    def _continuation_payload(payload, resp_data):
+        """Replay the conversation with the cut-off answer so the model writes only the rest.
+
+        The response_format is dropped: guided decoding would make the model
+        start a new complete object instead of the rest of the cut-off text.
+        """
+        partial = resp_data["choices"][0]["message"]["content"]
+        messages = payload["messages"] + [
+            {"role": "assistant", "content": partial},
+            {"role": "user", "content": CONTINUATION_PROMPT},
+        ]
+        continuation = dict(payload, messages=messages)
+        continuation.pop("response_format", None)
+        return continuation
+
+    def _join_continuation(self, resp_data, more):
+        """Append the continuation to the cut-off content and add up the token usage."""
+        text = more["choices"][0]["message"]["content"]
+        if text.lstrip().startswith("```"):
+            # Only fences are stripped: the cut may fall inside a string, where spaces matter
+            text = self._strip_fences(text)
+        choice = dict(more["choices"][0])
+        choice["message"] = dict(choice["message"], content=resp_data["choices"][0]["message"]["content"] + text)
+        usage = {
+            key: resp_data.get("usage", {}).get(key, 0) + more.get("usage", {}).get(key, 0)
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens")
+        }
+        continuations = resp_data.get("continuations", 0) + 1
+        return dict(more, choices=[choice], usage=usage, continuations=continuations)
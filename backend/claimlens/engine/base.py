@@ -1,19 +1,40 @@
+import asyncio
 import base64
 import json
 import logging
 import os
+import threading
 import time
+import weakref
 from abc import ABC, abstractmethod
 from functools import lru_cache
 
 import httpx
 
+from claimlens.engine.event_loop import database_sync_to_async
+from claimlens.engine.json_repair import flatten_merged, parse_partial_json, split_merged_objects
+from claimlens.engine.latency import request_latencies, request_timeout
+from claimlens.engine.ratelimit import EngineRateLimit, estimate_tokens
+from claimlens.engine.retry import RetryPolicy
+from claimlens.engine.schema import extraction_response_format
 from claimlens.engine.types import LLMResponse
 
 logger = logging.getLogger(__name__)
 
 PROMPTS_DIR = os.path.join(os.path.dirname(__file__), 'prompts')
 
+HEALTH_CHECK_TIMEOUT = 10
+
+# Engines holding an open HTTP client, so worker shutdown can close them all
+_LIVE_ENGINES = weakref.WeakSet()
+_LIVE_ASYNC_ENGINES = weakref.WeakSet()
+
+
+def _record_request_latency(seconds):
+    latencies = request_latencies.get()
+    if latencies is not None:
+        latencies.append(seconds)
+
 
 @lru_cache(maxsize=4)
 def _load_prompt(filename):
@@ -22,35 +43,65 @@ def _load_prompt(filename):
         return f.read()
 
 
-def _resolve_prompt(prompt_type, document_type_code=None):
+def _resolve_prompt(prompt_type, document_type_code=None, registry=None):
     """
     Resolution order:
     1. Active per-DocType override (if document_type_code provided)
     2. Active global prompt (document_type=null)
     3. File-based fallback (existing .md files)
+
+    Active templates come from the in-memory PromptRegistry snapshot, so this
+    does not query the database once the snapshot is loaded.
     """
-    from claimlens.models import PromptTemplate
-
-    if document_type_code:
-        override = PromptTemplate.objects.filter(
-            prompt_type=prompt_type,
-            document_type__code=document_type_code,
-            is_active=True, is_deleted=False,
-        ).first()
-        if override:
-            return override.content
-
-    global_prompt = PromptTemplate.objects.filter(
-        prompt_type=prompt_type,
-        document_type__isnull=True,
-        is_active=True, is_deleted=False,
-    ).first()
-    if global_prompt:
-        return global_prompt.content
+    from claimlens.engine.prompt_cache import get_prompt_registry
+
+    resolved = (registry or get_prompt_registry()).resolve(prompt_type, document_type_code)
+    if resolved:
+        return resolved[1]
 
     # Fallback to file
     return _load_prompt(f'{prompt_type}.md')
 
+
+def _render_prompt(prompt_type, document_type_code, inputs_key, render):
+    """Return ``render(template)`` memoised per resolved template and prompt inputs.
+
+    The key holds the resolved template text itself, so activating another
+    version can never serve a prompt rendered from the previous one. Within
+    one engine call (see ``call_prompts``) the prompt is rendered only once.
+    """
+    from claimlens.engine.prompt_cache import call_prompts, get_prompt_registry
+
+    call_memo = call_prompts.get()
+    call_key = (prompt_type, document_type_code, inputs_key)
+    if call_memo is not None and call_key in call_memo:
+        return call_memo[call_key]
+
+    registry = get_prompt_registry()
+    template = _resolve_prompt(prompt_type, document_type_code, registry)
+    key = (prompt_type, document_type_code, template, inputs_key)
+    prompt = registry.rendered(key)
+    if prompt is None:
+        prompt = render(template)
+        registry.remember(key, prompt)
+    if call_memo is not None:
+        call_memo[call_key] = prompt
+    return prompt
+
+
+ARRAY_INSTRUCTIONS = (
+    "\nFor array fields (those with type \"array\" in the template), "
+    "extract ALL matching items from the document as a JSON array. "
+    "Each element should be an object matching the \"items\" schema. "
+    "The \"value\" must be a JSON array of objects, and \"confidence\" "
+    "should reflect overall confidence for the array extraction.\n"
+)
+
+
+def _has_array_fields(extraction_template):
+    return any(isinstance(v, dict) and v.get('type') == 'array' for v in extraction_template.values())
+
+
 ADAPTER_REGISTRY = {}
 
 
@@ -61,42 +112,16 @@ def register_adapter(name):
     return decorator
 
 
-def _split_merged_objects(pairs):
-    """object_pairs_hook for json.loads that detects duplicate keys.
+def close_all_clients():
+    """Close the pooled HTTP client of every live engine (worker shutdown hook)."""
+    for engine in list(_LIVE_ENGINES):
+        engine.close()
 
-    When an LLM merges adjacent array items into one JSON object
-    (missing ``}, {`` separator), Python sees duplicate keys.  This
-    hook splits them into separate dicts and returns a list instead.
-    """
-    seen = set()
-    current = []
-    groups = [current]
-    for key, value in pairs:
-        if key in seen:
-            current = []
-            groups.append(current)
-            seen = set()
-        seen.add(key)
-        current.append((key, value))
-    if len(groups) == 1:
-        return dict(groups[0])
-    return [dict(g) for g in groups]
-
-
-def _flatten_merged(obj):
-    """Flatten nested lists produced by _split_merged_objects."""
-    if isinstance(obj, list):
-        flat = []
-        for item in obj:
-            item = _flatten_merged(item)
-            if isinstance(item, list):
-                flat.extend(item)
-            else:
-                flat.append(item)
-        return flat
-    if isinstance(obj, dict):
-        return {k: _flatten_merged(v) for k, v in obj.items()}
-    return obj
+
+async def aclose_all_clients():
+    """Close the AsyncClient of every live engine; run on the engine event loop."""
+    for engine in list(_LIVE_ASYNC_ENGINES):
+        await engine.aclose()
 
 
 class BaseLLMEngine(ABC):
@@ -109,6 +134,95 @@ class BaseLLMEngine(ABC):
         self.max_tokens = config.get('max_tokens', 4096)
         self.temperature = config.get('temperature', 0.1)
         self.timeout = config.get('timeout_seconds', 120)
+        self.pool_max_connections = config.get('pool_max_connections', 20)
+        self.pool_max_keepalive_connections = config.get('pool_max_keepalive_connections', 10)
+        self.keepalive_expiry = config.get('keepalive_expiry_seconds', 30)
+        self.http2 = config.get('http2', False)
+        self.image_budget = config.get('image_budget') or {}
+        self.structured_output = config.get('structured_output', False)
+        self.max_continuations = config.get('max_continuations', 1)
+        self.rate_limit = EngineRateLimit(
+            self.name, config.get('requests_per_minute'), config.get('tokens_per_minute'),
+        )
+        self.retry_policy = RetryPolicy(
+            max_retries=config.get('max_retries', 2),
+            backoff=config.get('retry_backoff_seconds', 1.0),
+            max_backoff=config.get('retry_max_backoff_seconds', 30.0),
+        )
+
+        self._client = None
+        self._client_pid = None
+        self._client_lock = threading.Lock()
+        self._async_client = None
+        self._async_client_loop = None
+
+    @property
+    def client(self):
+        """Long-lived, connection-pooled client shared by every call on this engine.
+
+        Rebuilt lazily after close() and in forked children, which must not
+        reuse sockets opened by the parent process.
+        """
+        pid = os.getpid()
+        if self._client is None or self._client.is_closed or self._client_pid != pid:
+            with self._client_lock:
+                if self._client is None or self._client.is_closed or self._client_pid != pid:
+                    self._client = self._build_client()
+                    self._client_pid = pid
+                    _LIVE_ENGINES.add(self)
+        return self._client
+
+    @property
+    def async_client(self):
+        """Pooled AsyncClient for the running event loop.
+
+        Engine calls run on the process's long-lived loop (see event_loop), so
+        this client lives as long as the engine. An AsyncClient cannot be shared
+        across event loops, so it is rebuilt when called from a different loop;
+        aclose() releases it.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client.is_closed or self._async_client_loop is not loop:
+            self._async_client = self._build_client(asynchronous=True)
+            self._async_client_loop = loop
+            _LIVE_ASYNC_ENGINES.add(self)
+        return self._async_client
+
+    def _build_client(self, asynchronous=False):
+        client_cls = httpx.AsyncClient if asynchronous else httpx.Client
+        limits = httpx.Limits(
+            max_connections=self.pool_max_connections,
+            max_keepalive_connections=self.pool_max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        if self.http2:
+            try:
+                return client_cls(timeout=self.timeout, limits=limits, http2=True)
+            except ImportError:
+                logger.warning("HTTP/2 requested for engine %s but 'h2' is not installed, using HTTP/1.1", self.name)
+        return client_cls(timeout=self.timeout, limits=limits)
+
+    def close(self):
+        with self._client_lock:
+            client, self._client = self._client, None
+            self._client_pid = None
+        _LIVE_ENGINES.discard(self)
+        if client is not None:
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning("Failed to close HTTP client for engine %s: %s", self.name, e)
+
+    async def aclose(self):
+        """Close the AsyncClient if it belongs to the running event loop."""
+        client, self._async_client = self._async_client, None
+        loop, self._async_client_loop = self._async_client_loop, None
+        _LIVE_ASYNC_ENGINES.discard(self)
+        if client is not None and loop is asyncio.get_running_loop():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning("Failed to close async HTTP client for engine %s: %s", self.name, e)
 
     @abstractmethod
     def classify(self, image_bytes, mime_type, document_types, document_type_code=None):
@@ -118,65 +232,182 @@ class BaseLLMEngine(ABC):
     def extract(self, image_bytes, mime_type, extraction_template, document_type_code=None):
         pass
 
+    def extract_pages(self, pages, extraction_template, document_type_code=None):
+        """Extract from several (image_bytes, mime_type) pages.
+
+        Adapters that can send every page in a single request override this;
+        the default extracts the pages one by one and merges the results.
+        """
+        from claimlens.engine.merge import merge_page_responses
+
+        responses = [
+            self.extract(image_bytes, mime_type, extraction_template, document_type_code=document_type_code)
+            for image_bytes, mime_type in pages
+        ]
+        result = merge_page_responses(responses)
+        # One after another, so the latency is the sum of the pages
+        result.processing_time_ms = sum(r.processing_time_ms for r in responses)
+        return result
+
+    def classify_extract(self, image_bytes, mime_type, document_types, document_type_code=None):
+        """Classify and extract in one request (fused mode).
+
+        ``document_types`` entries may carry an ``extraction_template``; the
+        response holds the classification keys plus ``fields`` and
+        ``aggregate_confidence`` for the chosen type. Adapters that can do both
+        in one request override this; the default classifies, then extracts
+        with the chosen type's template.
+        """
+        classification = self.classify(
+            image_bytes, mime_type, document_types, document_type_code=document_type_code,
+        )
+        if not classification.success:
+            return classification
+        code = classification.data.get('document_type_code')
+        template = next(
+            (dt.get('extraction_template') for dt in document_types if dt.get('code') == code), None,
+        )
+        if not template:
+            return classification
+
+        extraction = self.extract(image_bytes, mime_type, template, document_type_code=code)
+        if not extraction.success:
+            return classification
+        return LLMResponse(
+            success=True,
+            data={**classification.data, **extraction.data},
+            confidence=classification.confidence,
+            raw_response={'classification': classification.raw_response, 'extraction': extraction.raw_response},
+            tokens_used=classification.tokens_used + extraction.tokens_used,
+            processing_time_ms=classification.processing_time_ms + extraction.processing_time_ms,
+            engine_name=self.name,
+            truncated=extraction.truncated,
+        )
+
+    # Async variants. Adapters without a native implementation run the
+    # synchronous call in a worker thread so they still work on the async path;
+    # prompt rendering queries the database there.
+
+    async def aclassify(self, image_bytes, mime_type, document_types, document_type_code=None):
+        return await database_sync_to_async(self.classify, thread_sensitive=False)(
+            image_bytes, mime_type, document_types, document_type_code=document_type_code,
+        )
+
+    async def aextract(self, image_bytes, mime_type, extraction_template, document_type_code=None):
+        return await database_sync_to_async(self.extract, thread_sensitive=False)(
+            image_bytes, mime_type, extraction_template, document_type_code=document_type_code,
+        )
+
+    async def aextract_pages(self, pages, extraction_template, document_type_code=None):
+        return await database_sync_to_async(self.extract_pages, thread_sensitive=False)(
+            pages, extraction_template, document_type_code=document_type_code,
+        )
+
+    async def aclassify_extract(self, image_bytes, mime_type, document_types, document_type_code=None):
+        return await database_sync_to_async(self.classify_extract, thread_sensitive=False)(
+            image_bytes, mime_type, document_types, document_type_code=document_type_code,
+        )
+
     def health_check(self):
         try:
-            with httpx.Client(timeout=10) as client:
-                resp = client.get(self.endpoint_url)
-                return resp.status_code < 500
+            resp = self.client.get(self.endpoint_url, timeout=HEALTH_CHECK_TIMEOUT)
+            return resp.status_code < 500
         except Exception:
             return False
 
     def _encode_image(self, image_bytes, mime_type):
         if mime_type == 'application/pdf':
             image_bytes, mime_type = self._pdf_to_png(image_bytes)
+        if self.image_budget:
+            from claimlens.preprocessing import fit_image_to_budget, source_quality
+            try:
+                image_bytes, mime_type = fit_image_to_budget(
+                    image_bytes, mime_type, self.image_budget, quality_score=source_quality.get(),
+                )
+            except Exception as e:
+                logger.warning("Image budget not applied for engine %s: %s", self.name, e)
         b64 = base64.b64encode(image_bytes).decode('utf-8')
         return f"data:{mime_type};base64,{b64}"
 
+    @staticmethod
+    def _format_text_layer(text_bytes):
+        text = text_bytes.decode('utf-8') if isinstance(text_bytes, bytes) else text_bytes
+        return (
+            "The document page is provided as its extracted text layer instead of an image. "
+            "Each line starts with the [x,y] position of the text block in PDF points "
+            "from the top-left of the page.\n\n" + text
+        )
+
     @staticmethod
     def _pdf_to_png(pdf_bytes):
-        import fitz
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc[0]
-        pix = page.get_pixmap(dpi=200)
-        png_bytes = pix.tobytes("png")
-        doc.close()
-        return png_bytes, "image/png"
+        # Normally done once in preprocessing; only reached when no render exists
+        from claimlens.preprocessing import render_pdf_page, RENDER_MIME_TYPE
+        return render_pdf_page(pdf_bytes), RENDER_MIME_TYPE
 
-    def _build_classification_prompt(self, document_types, document_type_code=None):
+    @staticmethod
+    def _types_text(document_types):
         type_descriptions = []
         for dt in document_types:
             hints = f" (hints: {dt['classification_hints']})" if dt.get('classification_hints') else ""
             type_descriptions.append(f"- {dt['code']}: {dt['name']}{hints}")
+        return "\n".join(type_descriptions)
 
-        types_text = "\n".join(type_descriptions)
-        template = _resolve_prompt('classification', document_type_code)
-        return template.format_map({'types_text': types_text})
-
-    def _build_extraction_prompt(self, extraction_template, document_type_code=None):
-        fields_text = json.dumps(extraction_template, indent=2)
-
-        array_fields = [
-            k for k, v in extraction_template.items()
-            if isinstance(v, dict) and v.get('type') == 'array'
-        ]
-
-        array_instructions = ""
-        if array_fields:
-            array_instructions = (
-                "\nFor array fields (those with type \"array\" in the template), "
-                "extract ALL matching items from the document as a JSON array. "
-                "Each element should be an object matching the \"items\" schema. "
-                "The \"value\" must be a JSON array of objects, and \"confidence\" "
-                "should reflect overall confidence for the array extraction.\n"
-            )
-
-        template = _resolve_prompt('extraction', document_type_code)
-        return template.format_map({
-            'fields_text': fields_text,
-            'array_instructions': array_instructions,
-        })
+    def _build_classification_prompt(self, document_types, document_type_code=None):
+        from claimlens.engine.prompt_cache import inputs_hash
+
+        def render(template):
+            return template.format_map({'types_text': self._types_text(document_types)})
+
+        return _render_prompt('classification', document_type_code, inputs_hash(document_types), render)
+
+    def _build_classify_extract_prompt(self, document_types, document_type_code=None):
+        """Prompt for the fused mode: classify among all types, extract the types that carry a template."""
+        from claimlens.engine.prompt_cache import inputs_hash
+
+        def render(template):
+            templated = [dt for dt in document_types if dt.get('extraction_template')]
+            templates_text = "\n\n".join(
+                f"### {dt['code']}\n{json.dumps(dt['extraction_template'], indent=2)}" for dt in templated
+            ) or "(none)"
+            has_arrays = any(_has_array_fields(dt['extraction_template']) for dt in templated)
+            return template.format_map({
+                'types_text': self._types_text(document_types),
+                'templates_text': templates_text,
+                'array_instructions': ARRAY_INSTRUCTIONS if has_arrays else "",
+            })
+
+        return _render_prompt('classify_extract', document_type_code, inputs_hash(document_types), render)
+
+    def _build_extraction_prompt(self, extraction_template, document_type_code=None, page_count=1):
+        from claimlens.engine.prompt_cache import inputs_hash
+
+        def render(template):
+            fields_text = json.dumps(extraction_template, indent=2)
+
+            array_instructions = ARRAY_INSTRUCTIONS if _has_array_fields(extraction_template) else ""
+            if page_count > 1:
+                array_instructions += (
+                    f"\nThe document has {page_count} pages, provided as images in page order. "
+                    "Extract from ALL pages as one document: array fields must contain the "
+                    "items from every page, in order.\n"
+                )
+
+            return template.format_map({
+                'fields_text': fields_text,
+                'array_instructions': array_instructions,
+            })
+
+        inputs_key = (inputs_hash(extraction_template), page_count)
+        return _render_prompt('extraction', document_type_code, inputs_key, render)
+
+    def _response_format(self, extraction_template):
+        """JSON Schema response_format for engines configured for structured output, else None."""
+        if not self.structured_output or not extraction_template:
+            return None
+        return extraction_response_format(extraction_template)
 
-    def _parse_json_response(self, text):
+    @staticmethod
+    def _strip_fences(text):
         text = text.strip()
         if text.startswith('```'):
             lines = text.split('\n')
@@ -184,13 +415,102 @@ class BaseLLMEngine(ABC):
             if lines and lines[-1].strip() == '```':
                 lines = lines[:-1]
             text = '\n'.join(lines)
-        parsed = json.loads(text, object_pairs_hook=_split_merged_objects)
-        return _flatten_merged(parsed)
+        return text
+
+    def _parse_json_response(self, text):
+        parsed = json.loads(self._strip_fences(text), object_pairs_hook=split_merged_objects)
+        return flatten_merged(parsed)
+
+    def _parse_partial_json_response(self, text):
+        """Like _parse_json_response, but recovers truncated output; return ``(parsed, truncated)``."""
+        text = self._strip_fences(text)
+        try:
+            return flatten_merged(json.loads(text, object_pairs_hook=split_merged_objects)), False
+        except json.JSONDecodeError as e:
+            try:
+                parsed, truncated = parse_partial_json(text, object_pairs_hook=split_merged_objects)
+            except ValueError:
+                raise e
+        if not isinstance(parsed, dict):
+            raise ValueError("LLM response is not a JSON object")
+        logger.warning("Recovered %s LLM response (%d chars)", 'truncated' if truncated else 'malformed', len(text))
+        return flatten_merged(parsed), truncated
 
     def _make_request(self, url, headers, payload):
+        """POST to the provider, retrying transient errors (429, 5xx, timeouts) per ``retry_policy``."""
+        attempt = 0
+        while True:
+            try:
+                return self._send_request(url, headers, payload)
+            except Exception as e:
+                delay = self.retry_policy.next_delay(attempt, e)
+                # Past an adaptive timeout the engine is degraded: fall back rather than retry
+                if delay is None or (isinstance(e, httpx.TimeoutException) and request_timeout.get()):
+                    raise
+                attempt += 1
+                logger.warning(
+                    "Transient error from engine %s (%s), retry %d/%d in %.1fs",
+                    self.name, e, attempt, self.retry_policy.max_retries, delay,
+                )
+                time.sleep(delay)
+
+    async def _amake_request(self, url, headers, payload):
+        attempt = 0
+        while True:
+            try:
+                return await self._asend_request(url, headers, payload)
+            except Exception as e:
+                delay = self.retry_policy.next_delay(attempt, e)
+                # Past an adaptive timeout the engine is degraded: fall back rather than retry
+                if delay is None or (isinstance(e, httpx.TimeoutException) and request_timeout.get()):
+                    raise
+                attempt += 1
+                logger.warning(
+                    "Transient error from engine %s (%s), retry %d/%d in %.1fs",
+                    self.name, e, attempt, self.retry_policy.max_retries, delay,
+                )
+                await asyncio.sleep(delay)
+
+    def _send_request(self, url, headers, payload):
+        tokens = estimate_tokens(payload) if self.rate_limit else 0
+        if self.rate_limit:
+            self.rate_limit.acquire(tokens)
+        timeout = request_timeout.get() or self.timeout
         start = time.time()
-        with httpx.Client(timeout=self.timeout) as client:
-            response = client.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-        elapsed_ms = int((time.time() - start) * 1000)
-        return response.json(), elapsed_ms
+        try:
+            response = self.client.post(url, headers=headers, json=payload, timeout=timeout)
+        except httpx.TimeoutException:
+            # The request took at least this long; without the sample a slower
+            # engine could never raise its adaptive timeout again
+            _record_request_latency(timeout)
+            raise
+        response.raise_for_status()
+        data = response.json()
+        elapsed = time.time() - start
+        _record_request_latency(elapsed)
+        elapsed_ms = int(elapsed * 1000)
+        if self.rate_limit:
+            self.rate_limit.settle(tokens, data.get('usage', {}).get('total_tokens', 0))
+        return data, elapsed_ms
+
+    async def _asend_request(self, url, headers, payload):
+        tokens = estimate_tokens(payload) if self.rate_limit else 0
+        if self.rate_limit:
+            await self.rate_limit.aacquire(tokens)
+        timeout = request_timeout.get() or self.timeout
+        start = time.time()
+        try:
+            response = await self.async_client.post(url, headers=headers, json=payload, timeout=timeout)
+        except httpx.TimeoutException:
+            # The request took at least this long; without the sample a slower
+            # engine could never raise its adaptive timeout again
+            _record_request_latency(timeout)
+            raise
+        response.raise_for_status()
+        data = response.json()
+        elapsed = time.time() - start
+        _record_request_latency(elapsed)
+        elapsed_ms = int(elapsed * 1000)
+        if self.rate_limit:
+            await self.rate_limit.asettle(tokens, data.get('usage', {}).get('total_tokens', 0))
+        return data, elapsed_ms
@@ -0,0 +1,100 @@
+import dataclasses
+import hashlib
+import json
+import logging
+
+from claimlens.engine.types import LLMResponse
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'claimlens:llm_response:'
+
+
+def response_cache_key(engine, method_name, pages, prompt, response_format=None):
+    """Key a provider call by the exact inputs that determine its response.
+
+    ``pages`` is the list of (bytes, mime_type) sent to the engine (original,
+    render or text layer); the resolved prompt covers template and prompt
+    version changes, the engine settings cover model or sampling changes, and
+    ``response_format`` the schema guided decoding constrains the answer to.
+    """
+    digest = hashlib.sha256()
+    for part in (
+        method_name, engine.endpoint_url, engine.model_name,
+        repr(engine.temperature), repr(engine.max_tokens), repr(engine.structured_output),
+        json.dumps(engine.image_budget, sort_keys=True), prompt,
+        json.dumps(response_format, sort_keys=True),
+    ):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    for data, mime_type in pages:
+        digest.update(hashlib.sha256(data).digest())
+        digest.update(mime_type.encode('utf-8'))
+    return CACHE_KEY_PREFIX + digest.hexdigest()
+
+
+class ResponseCache:
+    """Successful LLMResponses stored in a Django cache shared by all workers.
+
+    Entries expire after ``ttl`` seconds; entries larger than ``max_bytes``
+    are not stored, and overall size is bounded by the cache backend's own
+    eviction (Redis maxmemory policy, locmem MAX_ENTRIES...).
+    """
+
+    def __init__(self, alias='default', ttl=7 * 24 * 3600, max_bytes=1024 * 1024, enabled=True):
+        self.alias = alias
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+    @classmethod
+    def from_config(cls):
+        from claimlens.apps import ClaimlensConfig
+        return cls(
+            alias=ClaimlensConfig.llm_response_cache_alias or 'default',
+            ttl=ClaimlensConfig.llm_response_cache_ttl_seconds or 7 * 24 * 3600,
+            max_bytes=ClaimlensConfig.llm_response_cache_max_bytes or 1024 * 1024,
+            enabled=bool(ClaimlensConfig.llm_response_cache_enabled),
+        )
+
+    @property
+    def backend(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, key):
+        try:
+            payload = self.backend.get(key)
+        except Exception as e:
+            logger.warning("LLM response cache read failed: %s", e)
+            return None
+        if payload is None:
+            return None
+        try:
+            data = json.loads(payload)
+            data['cached'] = True
+            return LLMResponse(**data)
+        except (TypeError, ValueError) as e:
+            # Corrupt, or written by a release with other LLMResponse fields
+            logger.warning("Dropping unreadable LLM response cache entry %s: %s", key, e)
+            try:
+                self.backend.delete(key)
+            except Exception:
+                pass
+            return None
+
+    def set(self, key, response):
+        # A truncated response might succeed in full next time
+        if not response.success or response.truncated:
+            return
+        data = dataclasses.asdict(response)
+        data.pop('cached', None)
+        data.pop('hedge', None)
+        payload = json.dumps(data)
+        if len(payload) > self.max_bytes:
+            logger.debug("LLM response of %d bytes not cached (limit %d)", len(payload), self.max_bytes)
+            return
+        try:
+            self.backend.set(key, payload, timeout=self.ttl)
+        except Exception as e:
+            logger.warning("LLM response cache write failed: %s", e)
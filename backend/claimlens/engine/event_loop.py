@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import os
+import threading
+
+from asgiref.sync import sync_to_async
+
+logger = logging.getLogger(__name__)
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop():
+    """Return this process's long-lived event loop, running in a daemon thread.
+
+    Every async engine call of the process runs on it, so AsyncClients keep
+    their connection pools and the per-engine semaphores bound all requests
+    in flight, whichever thread submitted them. Forked children start their
+    own loop, since the parent's thread does not survive the fork.
+    """
+    global _loop, _loop_pid
+    pid = os.getpid()
+    if _loop is None or _loop_pid != pid or _loop.is_closed():
+        with _loop_lock:
+            if _loop is None or _loop_pid != pid or _loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name='claimlens-engine-loop', daemon=True,
+                )
+                thread.start()
+                _loop, _loop_pid = loop, pid
+    return _loop
+
+
+def run_coroutine(coro):
+    """Run ``coro`` on the process event loop and wait for its result from synchronous code."""
+    loop = get_event_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_coroutine() cannot wait on the engine loop from inside it")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def submit_coroutine(coro):
+    """Schedule ``coro`` on the process event loop without waiting, if the loop is running."""
+    loop = _loop
+    if loop is None or _loop_pid != os.getpid() or loop.is_closed():
+        coro.close()
+        return None
+    return asyncio.run_coroutine_threadsafe(coro, loop)
+
+
+def stop_event_loop(timeout=5):
+    """Close the async HTTP clients and stop the process event loop (worker shutdown)."""
+    global _loop
+    from claimlens.engine.base import aclose_all_clients
+
+    with _loop_lock:
+        loop, _loop = _loop, None
+    if loop is None or _loop_pid != os.getpid() or loop.is_closed():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(aclose_all_clients(), loop).result(timeout)
+    except Exception as e:
+        logger.warning("Failed to close async HTTP clients: %s", e)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def database_sync_to_async(func, thread_sensitive=True):
+    """sync_to_async for code that queries the database from the engine loop.
+
+    Outside async_to_sync such calls run in asgiref's shared sync thread (or
+    an executor thread with ``thread_sensitive=False``), whose connection no
+    request or task cycle closes, so stale connections are dropped around
+    each call as Django does at request boundaries.
+    """
+    from django.db import close_old_connections
+
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper, thread_sensitive=thread_sensitive)
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_HEALTH_REGISTRY = {}
+_registry_lock = threading.Lock()
+
+
+class EngineHealth:
+    """Cached health state and circuit breaker for a single engine.
+
+    Routing asks ``is_available()`` instead of probing the provider inline.
+    The cached probe result is refreshed in a background thread once it is
+    older than ``ttl`` seconds, and real request outcomes are fed back
+    through ``record_success``/``record_failure``. After
+    ``failure_threshold`` consecutive failures the circuit opens and the
+    engine is skipped until ``cooldown`` seconds have passed, when it is
+    half-opened: the single caller that claims ``try_acquire_probe`` sends
+    the probe, and its outcome decides whether the circuit closes again. A
+    probe that never reports back is given up after another ``cooldown``.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, engine, ttl=30, failure_threshold=3, cooldown=60):
+        self.engine = engine
+        self.ttl = ttl
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self.last_checked = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        """Whether the engine may be tried: closed, or past its cooldown with no probe in flight.
+
+        Changes no circuit state, so candidates can be checked freely; the
+        caller about to send a request claims it with ``try_acquire_probe``.
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = self._admits(now)
+            stale = self.last_checked is None or now - self.last_checked > self.ttl
+        if available and stale:
+            self.refresh_async()
+        return available
+
+    def try_acquire_probe(self):
+        """Claim the right to send a request now; on an open circuit only one caller gets it."""
+        now = time.monotonic()
+        with self._lock:
+            if not self._admits(now):
+                return False
+            if self.state != self.CLOSED:
+                if self.state == self.OPEN:
+                    self.state = self.HALF_OPEN
+                    logger.info("Circuit for engine %s half-open after cooldown", self.engine.name)
+                self.probe_started_at = now
+            return True
+
+    def _admits(self, now):
+        if self.state == self.OPEN:
+            return now - self.opened_at >= self.cooldown
+        if self.state == self.HALF_OPEN:
+            return self.probe_started_at is None or now - self.probe_started_at >= self.cooldown
+        return True
+
+    def refresh_async(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name=f'health-{self.engine.name}', daemon=True).start()
+
+    def refresh(self):
+        try:
+            healthy = self.engine.health_check()
+        except Exception:
+            healthy = False
+        finally:
+            with self._lock:
+                self._refreshing = False
+        if healthy:
+            self.record_success()
+        else:
+            self.record_failure()
+        return healthy
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit for engine %s closed", self.engine.name)
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probe_started_at = None
+            self.last_checked = time.monotonic()
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            self.consecutive_failures += 1
+            self.last_checked = now
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(
+                        "Circuit for engine %s opened after %d consecutive failures",
+                        self.engine.name, self.consecutive_failures,
+                    )
+                self.state = self.OPEN
+                self.opened_at = now
+            self.probe_started_at = None
+
+    def release_probe(self):
+        """Let another caller probe a half-open circuit when this one ended without an outcome."""
+        with self._lock:
+            self.probe_started_at = None
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+            }
+
+
+def _engine_key(engine):
+    return (engine.name, engine.endpoint_url, engine.model_name)
+
+
+def get_engine_health(engine):
+    """Return the process-wide EngineHealth for ``engine``, shared across manager reloads."""
+    from claimlens.apps import ClaimlensConfig
+
+    key = _engine_key(engine)
+    with _registry_lock:
+        health = _HEALTH_REGISTRY.get(key)
+        if health is None:
+            health = EngineHealth(
+                engine,
+                ttl=ClaimlensConfig.health_check_ttl_seconds or 30,
+                failure_threshold=ClaimlensConfig.circuit_failure_threshold or 3,
+                cooldown=ClaimlensConfig.circuit_cooldown_seconds or 60,
+            )
+            _HEALTH_REGISTRY[key] = health
+        else:
+            # Probe through the most recently loaded instance (and its live client)
+            health.engine = engine
+        return health
+
+
+def reset_engine_health():
+    with _registry_lock:
+        _HEALTH_REGISTRY.clear()
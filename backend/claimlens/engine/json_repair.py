@@ -0,0 +1,138 @@
+"""Parsing of LLM JSON output, including merged, malformed and truncated responses."""
+import json
+import re
+from json.decoder import scanstring
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_MISSING = object()
+
+
+def split_merged_objects(pairs):
+    """object_pairs_hook for json.loads that detects duplicate keys.
+
+    When an LLM merges adjacent array items into one JSON object
+    (missing ``}, {`` separator), Python sees duplicate keys.  This
+    hook splits them into separate dicts and returns a list instead.
+    """
+    seen = set()
+    current = []
+    groups = [current]
+    for key, value in pairs:
+        if key in seen:
+            current = []
+            groups.append(current)
+            seen = set()
+        seen.add(key)
+        current.append((key, value))
+    if len(groups) == 1:
+        return dict(groups[0])
+    return [dict(g) for g in groups]
+
+
+def flatten_merged(obj):
+    """Flatten nested lists produced by split_merged_objects."""
+    if isinstance(obj, list):
+        flat = []
+        for item in obj:
+            item = flatten_merged(item)
+            if isinstance(item, list):
+                flat.extend(item)
+            else:
+                flat.append(item)
+        return flat
+    if isinstance(obj, dict):
+        return {k: flatten_merged(v) for k, v in obj.items()}
+    return obj
+
+
+def parse_partial_json(text, object_pairs_hook=None):
+    """Parse the leading JSON value of ``text``, recovering what a truncated response holds.
+
+    Returns ``(value, truncated)``. Complete values are decoded by the C
+    decoder; only the containers enclosing the point where decoding stops
+    are walked here. Missing or trailing commas are tolerated. Of an
+    unfinished container, its complete members and array elements are kept,
+    while the unfinished scalar or array element it ends with is dropped.
+    Raises ValueError when no object or array can be recovered.
+    """
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        raise ValueError("No JSON object or array in response")
+    parser = _PartialParser(text, object_pairs_hook)
+    value, _end, complete = parser.value(min(starts))
+    if value is _MISSING:
+        raise ValueError("No JSON value could be recovered from response")
+    return value, not complete
+
+
+class _PartialParser:
+
+    def __init__(self, text, object_pairs_hook=None):
+        self.text = text
+        self.end = len(text)
+        self.decoder = json.JSONDecoder(object_pairs_hook=object_pairs_hook)
+        self.make_object = object_pairs_hook or dict
+
+    def skip(self, pos):
+        return _WHITESPACE.match(self.text, pos).end()
+
+    def value(self, pos):
+        """Return ``(value, end, complete)``; value is _MISSING when nothing is recoverable."""
+        try:
+            value, end = self.decoder.raw_decode(self.text, pos)
+        except ValueError:
+            pass
+        else:
+            # A number or literal running into the end of the text may itself be cut short
+            if end < self.end or isinstance(value, (str, dict, list)):
+                return value, end, True
+            return _MISSING, self.end, False
+        char = self.text[pos] if pos < self.end else ''
+        if char == '{':
+            return self.object(pos + 1)
+        if char == '[':
+            return self.array(pos + 1)
+        return _MISSING, self.end, False
+
+    def object(self, pos):
+        pairs = []
+        while True:
+            pos = self.skip(pos)
+            char = self.text[pos] if pos < self.end else ''
+            if char == '}':
+                return self.make_object(pairs), pos + 1, True
+            if char == ',':
+                pos += 1
+                continue
+            if char != '"':
+                return self.make_object(pairs), self.end, False
+            try:
+                key, pos = scanstring(self.text, pos + 1)
+            except ValueError:
+                return self.make_object(pairs), self.end, False
+            pos = self.skip(pos)
+            if pos >= self.end or self.text[pos] != ':':
+                return self.make_object(pairs), self.end, False
+            value, pos, complete = self.value(self.skip(pos + 1))
+            if value is not _MISSING:
+                pairs.append((key, value))
+            if not complete:
+                return self.make_object(pairs), self.end, False
+
+    def array(self, pos):
+        items = []
+        while True:
+            pos = self.skip(pos)
+            char = self.text[pos] if pos < self.end else ''
+            if char == ']':
+                return items, pos + 1, True
+            if char == ',':
+                pos += 1
+                continue
+            if not char:
+                return items, self.end, False
+            value, pos, complete = self.value(pos)
+            if not complete:
+                # An unfinished element (e.g. a half-written line item) is not kept
+                return items, self.end, False
+            items.append(value)
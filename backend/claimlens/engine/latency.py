@@ -0,0 +1,91 @@
+import threading
+from collections import deque
+from contextvars import ContextVar
+
+_WINDOWS = {}
+_registry_lock = threading.Lock()
+
+# Timeout (seconds) for provider requests made in the current call, set by the
+# manager from observed latencies; None means the engine's timeout_seconds
+request_timeout = ContextVar('claimlens_request_timeout', default=None)
+
+# Durations (seconds) of the single provider requests made during the current
+# call, appended by the engine (a timed-out request at its timeout). Retry backoff and rate-limit waits fall
+# outside them, so the samples match the per-request timeout they feed.
+request_latencies = ContextVar('claimlens_request_latencies', default=None)
+
+
+class LatencyWindow:
+    """Rolling window of the most recent provider request latencies (seconds).
+
+    Requests cut off by their timeout are recorded at the timeout, so a lasting
+    slowdown pushes the percentile (and the adaptive timeout) up instead of
+    failing every request against the old, faster samples.
+    """
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p, min_samples=1):
+        """Nearest-rank ``p``-th percentile, or None with fewer than ``min_samples`` samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples or len(samples) < min_samples:
+            return None
+        rank = max(0, min(len(samples) - 1, int(round(p / 100.0 * len(samples))) - 1))
+        return samples[rank]
+
+
+def get_latency_window(engine, method_name, document_type_code=None):
+    """Return the process-wide latency window of ``engine`` for ``method_name``.
+
+    With ``document_type_code`` the window only holds calls for that document
+    type, whose prompts and outputs can differ a lot in size from the others.
+    """
+    from claimlens.apps import ClaimlensConfig
+
+    key = (engine.name, engine.endpoint_url, engine.model_name, method_name, document_type_code)
+    with _registry_lock:
+        window = _WINDOWS.get(key)
+        if window is None:
+            window = _WINDOWS[key] = LatencyWindow(ClaimlensConfig.llm_latency_window_size or 200)
+        return window
+
+
+def reset_latency_windows():
+    with _registry_lock:
+        _WINDOWS.clear()
+
+
+def adaptive_timeout(engine, method_name, document_type_code=None):
+    """Timeout derived from the engine's latency percentile, capped by its ``timeout_seconds``.
+
+    Uses the per-document-type window when it has enough samples, else the
+    engine-wide one; returns None (keep the configured timeout) without data.
+    """
+    from claimlens.apps import ClaimlensConfig
+
+    if not ClaimlensConfig.llm_adaptive_timeout_enabled:
+        return None
+    percentile = ClaimlensConfig.llm_adaptive_timeout_percentile or 99
+    min_samples = ClaimlensConfig.llm_adaptive_timeout_min_samples or 20
+    observed = None
+    if document_type_code:
+        observed = get_latency_window(engine, method_name, document_type_code).percentile(percentile, min_samples)
+    if observed is None:
+        observed = get_latency_window(engine, method_name).percentile(percentile, min_samples)
+    if observed is None:
+        return None
+    timeout = max(
+        ClaimlensConfig.llm_adaptive_timeout_min_seconds or 10,
+        observed * (ClaimlensConfig.llm_adaptive_timeout_multiplier or 2.0),
+    )
+    return min(timeout, engine.timeout)
@@ -1,6 +1,19 @@
+import asyncio
 import logging
+import threading
+import time
+import weakref
 
 from claimlens.engine.base import ADAPTER_REGISTRY
+from claimlens.engine.cache import ResponseCache, response_cache_key
+from claimlens.engine.event_loop import database_sync_to_async, run_coroutine, submit_coroutine
+from claimlens.engine.health import get_engine_health
+from claimlens.engine.latency import adaptive_timeout, get_latency_window, request_latencies, request_timeout
+from claimlens.engine.merge import merge_page_responses
+from claimlens.engine.prompt_cache import call_prompts
+from claimlens.engine.ratelimit import RateLimitExceeded
+from claimlens.engine.retry import is_engine_fault
+from claimlens.engine.routing import RoutingTable
 from claimlens.engine.types import LLMResponse
 
 # Import adapters to trigger registration
@@ -8,17 +21,97 @@ import claimlens.engine.adapters.openai_compatible  # noqa: F401
 
 logger = logging.getLogger(__name__)
 
+REGISTRY_VERSION_KEY = 'claimlens:engine_registry:{scope}'
+ENGINES_SCOPE = 'engines'
+ROUTING_SCOPE = 'routing'
+
+_registry_lock = threading.Lock()
+_shared_manager = None
+
+
+def get_registry_version(scope):
+    """Return the shared version stamp for ``scope`` (None if the cache is unreachable)."""
+    from django.core.cache import cache
+    try:
+        return cache.get(REGISTRY_VERSION_KEY.format(scope=scope), 0)
+    except Exception as e:
+        logger.warning("Engine registry version lookup failed: %s", e)
+        return None
+
+
+def bump_registry_version(scope):
+    """Invalidate the engine registry in this process and, via the cache, in every worker."""
+    from django.core.cache import cache
+    key = REGISTRY_VERSION_KEY.format(scope=scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+    except Exception as e:
+        logger.warning("Engine registry version bump failed: %s", e)
+
+    manager = _shared_manager
+    if manager is not None:
+        manager.invalidate(scope)
+
+
+def get_engine_manager():
+    """Return the process-wide EngineManager, reloading it only when engine configs changed.
+
+    Staleness is detected through a version stamp in the Django cache bumped by
+    the model signals in ``claimlens.signals``; ``engine_registry_ttl_seconds``
+    bounds the age of the registry when the cache is not shared across processes.
+    """
+    global _shared_manager
+    from claimlens.apps import ClaimlensConfig
+
+    ttl = ClaimlensConfig.engine_registry_ttl_seconds or 300
+    version = get_registry_version(ENGINES_SCOPE)
+    with _registry_lock:
+        manager = _shared_manager
+        if manager is None or manager.is_stale(version, ttl):
+            if manager is not None:
+                manager.close()
+            manager = EngineManager()
+            manager.load_engines()
+            manager.versions[ENGINES_SCOPE] = version
+            _shared_manager = manager
+    return manager
+
 
 class EngineManager:
 
     def __init__(self):
         self._engines = []
+        self._loaded_at = None
+        self._routing_table = None
+        self._routing_loaded_at = None
+        self.versions = {}
+        self.response_cache = ResponseCache.from_config()
+        # Per-engine concurrency limits for the async path, one set per event loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def is_stale(self, version, ttl):
+        if self._loaded_at is None:
+            return True
+        if version is not None and version != self.versions.get(ENGINES_SCOPE):
+            return True
+        return time.monotonic() - self._loaded_at > ttl
+
+    def invalidate(self, scope):
+        """Mark ``scope`` as changed so it is rebuilt on next use."""
+        self.versions.pop(scope, None)
+        if scope == ENGINES_SCOPE:
+            self._loaded_at = None
+        elif scope == ROUTING_SCOPE:
+            self._routing_table = None
 
     def load_engines(self):
+        from claimlens.apps import ClaimlensConfig
         from claimlens.models import EngineConfig
         from claimlens.services import EngineConfigService
 
-        self._engines = []
+        self.close()
         configs = EngineConfig.objects.filter(is_active=True, is_deleted=False).order_by(
             '-is_primary', '-is_fallback'
         )
@@ -45,167 +138,607 @@ class EngineManager:
                 'max_tokens': config.max_tokens,
                 'temperature': config.temperature,
                 'timeout_seconds': config.timeout_seconds,
+                'pool_max_connections': ClaimlensConfig.llm_pool_max_connections or 20,
+                'pool_max_keepalive_connections': ClaimlensConfig.llm_pool_max_keepalive_connections or 10,
+                'keepalive_expiry_seconds': ClaimlensConfig.llm_keepalive_expiry_seconds or 30,
+                'http2': bool(ClaimlensConfig.llm_http2),
+                'image_budget': config.image_budget or ClaimlensConfig.default_image_budget or {},
+                'requests_per_minute': config.requests_per_minute,
+                'tokens_per_minute': config.tokens_per_minute,
+                'structured_output': config.structured_output,
+                'max_continuations': (
+                    1 if ClaimlensConfig.llm_max_continuations is None else ClaimlensConfig.llm_max_continuations
+                ),
+                'max_retries': 2 if ClaimlensConfig.llm_max_retries is None else ClaimlensConfig.llm_max_retries,
+                'retry_backoff_seconds': ClaimlensConfig.llm_retry_backoff_seconds or 1.0,
+                'retry_max_backoff_seconds': ClaimlensConfig.llm_retry_max_backoff_seconds or 30.0,
             })
             self._engines.append((config, engine))
 
+        self._loaded_at = time.monotonic()
         logger.info("Loaded %d engines", len(self._engines))
 
-    def classify(self, image_bytes, mime_type, document_types):
-        return self._execute_with_fallback('classify', image_bytes, mime_type, document_types)
+    def classify(self, image_bytes, mime_type, document_types, use_cache=True):
+        return self._execute_with_fallback('classify', image_bytes, mime_type, document_types, use_cache=use_cache)
 
-    def extract(self, image_bytes, mime_type, extraction_template):
-        return self._execute_with_fallback('extract', image_bytes, mime_type, extraction_template)
+    def extract(self, image_bytes, mime_type, extraction_template, use_cache=True):
+        return self._execute_with_fallback('extract', image_bytes, mime_type, extraction_template, use_cache=use_cache)
 
-    def classify_routed(self, image_bytes, mime_type, document_types, language=None, document_type_code=None):
+    def classify_routed(self, image_bytes, mime_type, document_types, language=None, document_type_code=None,
+                        use_cache=True):
         """Try scored engine selection for classification, fall back to primary/fallback."""
+        if self._hedging_enabled():
+            return self.run_async(
+                self.aclassify_routed, image_bytes, mime_type, document_types, language=language,
+                document_type_code=document_type_code, use_cache=use_cache,
+            )
         selected = self.select_engine(language, document_type=None)
         if selected:
-            config, engine = selected
-            try:
-                result = engine.classify(image_bytes, mime_type, document_types, document_type_code=document_type_code)
-                if result.success:
-                    return result, config
-            except Exception as e:
-                logger.warning("Routed engine %s failed classify: %s, falling back", config.name, e)
-        return self._execute_with_fallback('classify', image_bytes, mime_type, document_types), None
-
-    def extract_routed(self, image_bytes, mime_type, extraction_template, language=None, document_type=None, document_type_code=None):
+            result = self._call_routed(
+                selected, 'classify', (image_bytes, mime_type, document_types),
+                {'document_type_code': document_type_code}, use_cache,
+            )
+            if result:
+                return result, selected[0]
+        return self._execute_with_fallback(
+            'classify', image_bytes, mime_type, document_types, use_cache=use_cache,
+        ), None
+
+    def classify_extract_routed(self, image_bytes, mime_type, document_types, language=None,
+                                document_type_code=None, use_cache=True):
+        """Fused classification + extraction on the routed engine, falling back to primary/fallback."""
+        if self._hedging_enabled():
+            return self.run_async(
+                self.aclassify_extract_routed, image_bytes, mime_type, document_types, language=language,
+                document_type_code=document_type_code, use_cache=use_cache,
+            )
+        selected = self.select_engine(language, document_type=None)
+        if selected:
+            result = self._call_routed(
+                selected, 'classify_extract', (image_bytes, mime_type, document_types),
+                {'document_type_code': document_type_code}, use_cache,
+            )
+            if result:
+                return result, selected[0]
+        return self._execute_with_fallback(
+            'classify_extract', image_bytes, mime_type, document_types, use_cache=use_cache,
+        ), None
+
+    def extract_routed(self, image_bytes, mime_type, extraction_template, language=None, document_type=None,
+                       document_type_code=None, use_cache=True):
         """Try scored engine selection for extraction, fall back to primary/fallback."""
+        if self._hedging_enabled():
+            return self.run_async(
+                self.aextract_routed, image_bytes, mime_type, extraction_template, language=language,
+                document_type=document_type, document_type_code=document_type_code, use_cache=use_cache,
+            )
+        selected = self.select_engine(language, document_type)
+        if selected:
+            result = self._call_routed(
+                selected, 'extract', (image_bytes, mime_type, extraction_template),
+                {'document_type_code': document_type_code}, use_cache,
+            )
+            if result:
+                return result, selected[0]
+        return self._execute_with_fallback(
+            'extract', image_bytes, mime_type, extraction_template, use_cache=use_cache,
+        ), None
+
+    def extract_pages_routed(self, pages, extraction_template, mode='combined', language=None,
+                             document_type=None, document_type_code=None, use_cache=True):
+        """Extract a multi-page document given as [(image_bytes, mime_type), ...].
+
+        ``combined`` sends every page in one request; ``per_page`` extracts pages
+        in parallel and merges the results (arrays concatenated, scalars by confidence).
+        """
+        if mode == 'per_page':
+            # Pages are independent requests: fan them out on the async path
+            return self.run_async(
+                self.aextract_pages_routed, pages, extraction_template, mode=mode, language=language,
+                document_type=document_type, document_type_code=document_type_code, use_cache=use_cache,
+            )
+
         selected = self.select_engine(language, document_type)
         if selected:
-            config, engine = selected
+            result = self._call_routed(
+                selected, 'extract_pages', (pages, extraction_template),
+                {'document_type_code': document_type_code}, use_cache,
+            )
+            if result:
+                return result, selected[0]
+        return self._execute_with_fallback(
+            'extract_pages', pages, extraction_template, use_cache=use_cache,
+        ), None
+
+    def _call_routed(self, selected, method_name, args, kwargs, use_cache):
+        """Run the routed engine; return its successful response, or None to fall back."""
+        config, engine = selected
+        try:
+            result = self._call_engine(engine, method_name, args, kwargs, use_cache)
+            if result.success:
+                return result
+        except Exception as e:
+            logger.warning("Routed engine %s failed %s: %s, falling back", config.name, method_name, e)
+        return None
+
+    def _call_engine(self, engine, method_name, args, kwargs=None, use_cache=True, force=False):
+        """Call an engine method through the response cache, feeding the outcome to its circuit breaker.
+
+        The request is only sent if the engine's circuit grants it (one probe
+        at a time while half-open), or with ``force`` when no engine is available.
+        """
+        kwargs = kwargs or {}
+        # The engine reuses the prompts rendered here for the response cache key
+        prompts_token = call_prompts.set({})
+        try:
+            key = None
+            if use_cache and self.response_cache.enabled:
+                key = self._response_cache_key(engine, method_name, args, kwargs)
+                cached = self.response_cache.get(key) if key else None
+                if cached:
+                    logger.info("Response cache hit for %s on engine %s", method_name, engine.name)
+                    return cached
+
+            health = get_engine_health(engine)
+            if not health.try_acquire_probe() and not force:
+                return self._circuit_open(engine)
+            document_type_code = kwargs.get('document_type_code')
+            timeout_token = request_timeout.set(adaptive_timeout(engine, method_name, document_type_code))
+            latencies_token = request_latencies.set([])
+            start = time.monotonic()
             try:
-                result = engine.extract(image_bytes, mime_type, extraction_template, document_type_code=document_type_code)
-                if result.success:
-                    return result, config
+                result = getattr(engine, method_name)(*args, **kwargs)
+            except RateLimitExceeded:
+                # Budget exhausted, not unhealthy: let the caller reroute
+                health.release_probe()
+                raise
             except Exception as e:
-                logger.warning("Routed engine %s failed extract: %s, falling back", config.name, e)
-        return self._execute_with_fallback('extract', image_bytes, mime_type, extraction_template), None
+                if is_engine_fault(e):
+                    health.record_failure()
+                else:
+                    health.release_probe()
+                raise
+            finally:
+                latencies = request_latencies.get()
+                request_latencies.reset(latencies_token)
+                request_timeout.reset(timeout_token)
+            self._record_latencies(
+                engine, method_name, document_type_code, latencies,
+                fallback=time.monotonic() - start if result.success else None,
+            )
+            if result.success:
+                health.record_success()
+                if key:
+                    self.response_cache.set(key, result)
+            elif result.engine_fault:
+                health.record_failure()
+            else:
+                # The engine answered, just not usefully; that says nothing about its health
+                health.release_probe()
+            return result
+        finally:
+            call_prompts.reset(prompts_token)
 
-    def select_engine(self, language=None, document_type=None):
-        """Select best engine based on routing rules, then EngineCapabilityScore weights.
+    # Async path: one process keeps many provider calls in flight, bounded
+    # per engine by llm_async_max_concurrency_per_engine.
 
-        Returns (config, engine) tuple or None if no capability scores match.
+    def run_async(self, func, *args, **kwargs):
+        """Run an async manager method from synchronous code (e.g. a Celery task).
+
+        The call runs on the process's long-lived event loop, so the engines'
+        AsyncClients and concurrency slots are shared by every caller.
         """
-        if not language:
-            return None
+        return run_coroutine(func(*args, **kwargs))
 
-        if not self._engines:
-            self.load_engines()
+    async def aclose(self):
+        """Close the async HTTP clients opened on the running event loop."""
+        for config, engine in self._engines:
+            await engine.aclose()
 
-        engine_map = {cfg.id: (cfg, eng) for cfg, eng in self._engines}
+    async def aclassify(self, image_bytes, mime_type, document_types, use_cache=True):
+        return await self._aexecute_with_fallback(
+            'classify', image_bytes, mime_type, document_types, use_cache=use_cache,
+        )
 
-        # Check explicit routing rules first (highest priority wins)
-        from claimlens.models import EngineRoutingRule
-        from django.db.models import Q as RuleQ
+    async def aextract(self, image_bytes, mime_type, extraction_template, use_cache=True):
+        return await self._aexecute_with_fallback(
+            'extract', image_bytes, mime_type, extraction_template, use_cache=use_cache,
+        )
 
-        rules = EngineRoutingRule.objects.filter(
-            is_active=True, is_deleted=False,
-            engine_config__is_active=True, engine_config__is_deleted=False,
-        ).order_by('-priority')
+    async def aclassify_routed(self, image_bytes, mime_type, document_types, language=None,
+                               document_type_code=None, use_cache=True):
+        selected = await database_sync_to_async(self.select_engine)(language, document_type=None)
+        if selected:
+            routed = await self._acall_selected(
+                selected, 'classify', (image_bytes, mime_type, document_types),
+                {'document_type_code': document_type_code}, use_cache, language, None,
+            )
+            if routed:
+                return routed
+        return await self._aexecute_with_fallback(
+            'classify', image_bytes, mime_type, document_types, use_cache=use_cache,
+        ), None
+
+    async def aclassify_extract_routed(self, image_bytes, mime_type, document_types, language=None,
+                                       document_type_code=None, use_cache=True):
+        selected = await database_sync_to_async(self.select_engine)(language, document_type=None)
+        if selected:
+            routed = await self._acall_selected(
+                selected, 'classify_extract', (image_bytes, mime_type, document_types),
+                {'document_type_code': document_type_code}, use_cache, language, None,
+            )
+            if routed:
+                return routed
+        return await self._aexecute_with_fallback(
+            'classify_extract', image_bytes, mime_type, document_types, use_cache=use_cache,
+        ), None
+
+    async def aextract_routed(self, image_bytes, mime_type, extraction_template, language=None,
+                              document_type=None, document_type_code=None, use_cache=True):
+        selected = await database_sync_to_async(self.select_engine)(language, document_type)
+        if selected:
+            routed = await self._acall_selected(
+                selected, 'extract', (image_bytes, mime_type, extraction_template),
+                {'document_type_code': document_type_code}, use_cache, language, document_type,
+            )
+            if routed:
+                return routed
+        return await self._aexecute_with_fallback(
+            'extract', image_bytes, mime_type, extraction_template, use_cache=use_cache,
+        ), None
+
+    async def aextract_pages_routed(self, pages, extraction_template, mode='combined', language=None,
+                                    document_type=None, document_type_code=None, use_cache=True):
+        if mode == 'per_page':
+            from claimlens.apps import ClaimlensConfig
+
+            limit = asyncio.Semaphore(min(ClaimlensConfig.multipage_max_parallel_requests or 4, len(pages)))
+
+            async def extract_page(image_bytes, mime_type):
+                async with limit:
+                    return await self.aextract_routed(
+                        image_bytes, mime_type, extraction_template, language=language,
+                        document_type=document_type, document_type_code=document_type_code,
+                        use_cache=use_cache,
+                    )
 
-        rules = rules.filter(RuleQ(language=language) | RuleQ(language__isnull=True))
-        if document_type:
-            rules = rules.filter(RuleQ(document_type=document_type) | RuleQ(document_type__isnull=True))
+            outcomes = await asyncio.gather(*(extract_page(b, m) for b, m in pages))
+            routed_config = next((cfg for r, cfg in outcomes if r.success and cfg), None)
+            return merge_page_responses([r for r, _ in outcomes]), routed_config
 
-        from claimlens.models import EngineCapabilityScore
+        selected = await database_sync_to_async(self.select_engine)(language, document_type)
+        if selected:
+            result = await self._acall_routed(
+                selected, 'extract_pages', (pages, extraction_template),
+                {'document_type_code': document_type_code}, use_cache,
+            )
+            if result:
+                return result, selected[0]
+        return await self._aexecute_with_fallback(
+            'extract_pages', pages, extraction_template, use_cache=use_cache,
+        ), None
+
+    async def _acall_selected(self, selected, method_name, args, kwargs, use_cache, language, document_type):
+        """Call the routed engine, hedging to the next-best engine when enabled; return (result, config) or None."""
+        if self._hedging_enabled():
+            delay = self._hedge_delay(selected[1], method_name)
+            backup = await database_sync_to_async(self._hedge_candidate)(selected, language, document_type) \
+                if delay is not None else None
+            if backup:
+                return await self._ahedged_call(selected, backup, delay, method_name, args, kwargs, use_cache)
+        result = await self._acall_routed(selected, method_name, args, kwargs, use_cache)
+        return (result, selected[0]) if result else None
+
+    async def _ahedged_call(self, primary, backup, delay, method_name, args, kwargs, use_cache):
+        """Hedged request: if ``primary`` has not answered after ``delay`` seconds, also ask
+        ``backup``; the first success wins and the other request is cancelled.
+
+        The winning response carries a ``hedge`` dict describing the extra request.
+        """
+        first = asyncio.ensure_future(self._acall_routed(primary, method_name, args, kwargs, use_cache))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            # Answered (or failed) before the hedge delay: no extra request
+            result = first.result()
+            return (result, primary[0]) if result else None
+
+        logger.info(
+            "Engine %s slower than %.1fs for %s, hedging to %s",
+            primary[0].name, delay, method_name, backup[0].name,
+        )
+        second = asyncio.ensure_future(self._acall_routed(backup, method_name, args, kwargs, use_cache))
+        calls = {first: primary, second: backup}
+
+        winner = None
+        pending = set(calls)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in done if task.result()), None)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        if winner is None:
+            return None
+        loser = second if winner is first else first
+        result, config = winner.result(), calls[winner][0]
+        result.hedge = {
+            'primary': primary[0].name,
+            'hedge_engine': backup[0].name,
+            'delay_ms': int(delay * 1000),
+            'winner': config.name,
+            'loser_cancelled': loser.cancelled(),
+            # A cancelled request may still be billed by the provider; a completed one is known
+            'extra_tokens_used': loser.result().tokens_used if not loser.cancelled() and loser.result() else 0,
+        }
+        return result, config
+
+    def _hedging_enabled(self):
+        from claimlens.apps import ClaimlensConfig
+        return bool(ClaimlensConfig.llm_hedging_enabled)
+
+    def _hedge_delay(self, engine, method_name):
+        """Latency percentile after which a request is hedged, or None while there are too few samples."""
+        from claimlens.apps import ClaimlensConfig
+        return get_latency_window(engine, method_name).percentile(
+            ClaimlensConfig.llm_hedge_percentile or 95,
+            min_samples=ClaimlensConfig.llm_hedge_min_samples or 20,
+        )
 
-        for rule in rules:
-            config_id = rule.engine_config_id
-            if config_id not in engine_map:
-                continue
+    def _hedge_candidate(self, selected, language=None, document_type=None):
+        """Next-best available engine after ``selected``: the routing order, then primary/fallback order."""
+        for cfg, eng in self._route_candidates(language, document_type):
+            if cfg.id != selected[0].id:
+                return (cfg, eng)
+        for cfg, eng in self._engines:
+            if cfg.id != selected[0].id and get_engine_health(eng).is_available():
+                return (cfg, eng)
+        return None
+
+    async def _acall_routed(self, selected, method_name, args, kwargs, use_cache):
+        config, engine = selected
+        try:
+            result = await self._acall_engine(engine, method_name, args, kwargs, use_cache)
+            if result.success:
+                return result
+        except Exception as e:
+            logger.warning("Routed engine %s failed %s: %s, falling back", config.name, method_name, e)
+        return None
+
+    async def _acall_engine(self, engine, method_name, args, kwargs=None, use_cache=True, force=False):
+        """Async counterpart of _call_engine, holding the engine's concurrency slot during the call."""
+        kwargs = kwargs or {}
+        # The engine reuses the prompts rendered here for the response cache key
+        prompts_token = call_prompts.set({})
+        try:
+            key = None
+            if use_cache and self.response_cache.enabled:
+                key = await database_sync_to_async(self._response_cache_key)(engine, method_name, args, kwargs)
+                cached = await database_sync_to_async(self.response_cache.get)(key) if key else None
+                if cached:
+                    logger.info("Response cache hit for %s on engine %s", method_name, engine.name)
+                    return cached
+
+            health = get_engine_health(engine)
+            document_type_code = kwargs.get('document_type_code')
+            async with self._engine_semaphore(engine):
+                if not health.try_acquire_probe() and not force:
+                    return self._circuit_open(engine)
+                timeout_token = request_timeout.set(adaptive_timeout(engine, method_name, document_type_code))
+                latencies_token = request_latencies.set([])
+                start = time.monotonic()
+                try:
+                    result = await getattr(engine, 'a' + method_name)(*args, **kwargs)
+                except RateLimitExceeded:
+                    health.release_probe()
+                    raise
+                except Exception as e:
+                    if is_engine_fault(e):
+                        health.record_failure()
+                    else:
+                        health.release_probe()
+                    raise
+                finally:
+                    latencies = request_latencies.get()
+                    request_latencies.reset(latencies_token)
+                    request_timeout.reset(timeout_token)
+            self._record_latencies(
+                engine, method_name, document_type_code, latencies,
+                fallback=time.monotonic() - start if result.success else None,
+            )
+            if result.success:
+                health.record_success()
+                if key:
+                    await database_sync_to_async(self.response_cache.set)(key, result)
+            elif result.engine_fault:
+                health.record_failure()
+            else:
+                # The engine answered, just not usefully; that says nothing about its health
+                health.release_probe()
+            return result
+        finally:
+            call_prompts.reset(prompts_token)
 
-            # Enforce min_confidence against historical accuracy
-            if rule.min_confidence > 0:
-                cap = EngineCapabilityScore.objects.filter(
-                    engine_config_id=config_id,
-                    language=language,
-                    is_active=True, is_deleted=False,
-                ).first()
-                if not cap or (cap.accuracy_score / 100.0) < rule.min_confidence:
-                    logger.debug(
-                        "Rule '%s' skipped: engine %s accuracy below min_confidence %.2f",
-                        rule.name, engine_map[config_id][0].name, rule.min_confidence,
-                    )
-                    continue
+    async def _aexecute_with_fallback(self, method_name, *args, use_cache=True):
+        if not self._engines:
+            await database_sync_to_async(self.load_engines)()
 
-            cfg, eng = engine_map[config_id]
-            try:
-                if eng.health_check():
-                    logger.info(
-                        "Rule '%s' selected engine %s (priority=%d)",
-                        rule.name, cfg.name, rule.priority,
-                    )
-                    return (cfg, eng)
-            except Exception:
-                logger.warning("Health check failed for rule-selected engine %s", cfg.name)
+        if not self._engines:
+            return LLMResponse(success=False, error="No active engines configured")
 
-        # Fall through to composite scoring
-        from claimlens.models import RoutingPolicy
+        last_error = None
+        for config, engine, force in self._fallback_candidates():
+            try:
+                result = await self._acall_engine(engine, method_name, args, use_cache=use_cache, force=force)
+                if result.success:
+                    return result
+                last_error = result.error
+                logger.warning(
+                    "Engine %s failed for %s: %s, trying next",
+                    engine.name, method_name, result.error
+                )
+            except Exception as e:
+                last_error = str(e)
+                logger.warning(
+                    "Engine %s raised exception for %s: %s, trying next",
+                    engine.name, method_name, e
+                )
 
-        scores_qs = EngineCapabilityScore.objects.filter(
-            is_active=True, is_deleted=False,
-            language=language,
-            engine_config__is_active=True, engine_config__is_deleted=False,
+        return LLMResponse(
+            success=False,
+            error=f"All engines failed. Last error: {last_error}"
         )
-        if document_type:
-            # Try exact document_type match first, then fall back to wildcard (null)
-            typed = scores_qs.filter(document_type=document_type)
-            if typed.exists():
-                scores_qs = typed
-            else:
-                scores_qs = scores_qs.filter(document_type__isnull=True)
-        else:
-            scores_qs = scores_qs.filter(document_type__isnull=True)
 
-        scores_list = list(scores_qs.select_related('engine_config'))
-        if not scores_list:
+    def _engine_semaphore(self, engine):
+        # asyncio primitives are bound to one event loop, so keep a set per loop
+        from claimlens.apps import ClaimlensConfig
+
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        semaphore = semaphores.get(engine.name)
+        if semaphore is None:
+            limit = ClaimlensConfig.llm_async_max_concurrency_per_engine or 16
+            semaphore = semaphores[engine.name] = asyncio.Semaphore(limit)
+        return semaphore
+
+    @staticmethod
+    def _circuit_open(engine):
+        return LLMResponse(success=False, error=f"Circuit open for engine {engine.name}", engine_name=engine.name)
+
+    @staticmethod
+    def _record_latency(engine, method_name, document_type_code, seconds):
+        get_latency_window(engine, method_name).record(seconds)
+        if document_type_code:
+            get_latency_window(engine, method_name, document_type_code).record(seconds)
+
+    @classmethod
+    def _record_latencies(cls, engine, method_name, document_type_code, latencies, fallback=None):
+        """Record each provider request of a call, timed-out ones at their timeout.
+
+        ``fallback`` (the whole call) is recorded for engines that report no requests.
+        """
+        if not latencies:
+            latencies = [] if fallback is None else [fallback]
+        for seconds in latencies:
+            cls._record_latency(engine, method_name, document_type_code, seconds)
+
+    @staticmethod
+    def _response_cache_key(engine, method_name, args, kwargs):
+        document_type_code = kwargs.get('document_type_code')
+        response_format = None
+        try:
+            if method_name == 'classify':
+                image_bytes, mime_type, document_types = args[:3]
+                pages = [(image_bytes, mime_type)]
+                prompt = engine._build_classification_prompt(document_types, document_type_code=document_type_code)
+            elif method_name == 'classify_extract':
+                image_bytes, mime_type, document_types = args[:3]
+                pages = [(image_bytes, mime_type)]
+                prompt = engine._build_classify_extract_prompt(document_types, document_type_code=document_type_code)
+            elif method_name == 'extract':
+                image_bytes, mime_type, extraction_template = args[:3]
+                pages = [(image_bytes, mime_type)]
+                prompt = engine._build_extraction_prompt(extraction_template, document_type_code=document_type_code)
+                response_format = engine._response_format(extraction_template)
+            elif method_name == 'extract_pages':
+                pages, extraction_template = args[:2]
+                prompt = engine._build_extraction_prompt(
+                    extraction_template, document_type_code=document_type_code, page_count=len(pages),
+                )
+                response_format = engine._response_format(extraction_template)
+            else:
+                return None
+        except Exception as e:
+            logger.debug("No response cache key for %s: %s", method_name, e)
             return None
+        return response_cache_key(engine, method_name, pages, prompt, response_format)
 
-        policy = RoutingPolicy.objects.first()
-        acc_w = policy.accuracy_weight if policy else 0.50
-        cost_w = policy.cost_weight if policy else 0.30
-        speed_w = policy.speed_weight if policy else 0.20
+    def select_engine(self, language=None, document_type=None):
+        """Select best engine based on routing rules, then EngineCapabilityScore weights.
 
-        # Normalize cost: find max cost to compute inverted score
-        max_cost = max(float(s.cost_per_page) for s in scores_list) or 1.0
-        if max_cost == 0:
-            max_cost = 1.0
+        Returns (config, engine) tuple or None if no capability scores match.
+        """
+        return next(self._route_candidates(language, document_type), None)
 
-        best_score = -1
-        best_engine = None
+    def _route_candidates(self, language=None, document_type=None):
+        """Yield available (config, engine) pairs in routing order: rules by priority, then composite score."""
+        if not language:
+            return
 
-        for cap in scores_list:
-            config_id = cap.engine_config_id
-            if config_id not in engine_map:
+        if not self._engines:
+            self.load_engines()
+
+        engine_map = {cfg.id: (cfg, eng) for cfg, eng in self._engines}
+        entry = self.get_routing_table().lookup(language, document_type.pk if document_type else None)
+        seen = set()
+
+        # Explicit routing rules first (highest priority wins)
+        for rule in entry.rules:
+            if rule.config_id not in engine_map or rule.config_id in seen:
                 continue
+            cfg, eng = engine_map[rule.config_id]
+            if get_engine_health(eng).is_available():
+                logger.info(
+                    "Rule '%s' selected engine %s (priority=%d)",
+                    rule.name, cfg.name, rule.priority,
+                )
+                seen.add(rule.config_id)
+                yield (cfg, eng)
+            else:
+                logger.debug("Rule '%s' skipped: circuit open for engine %s", rule.name, cfg.name)
 
-            cfg, eng = engine_map[config_id]
-            normalized_cost = (1.0 - float(cap.cost_per_page) / max_cost) * 100
-            composite = (
-                acc_w * cap.accuracy_score
-                + cost_w * normalized_cost
-                + speed_w * cap.speed_score
-            )
+        # Fall through to composite scoring, best score first
+        for candidate in entry.scores:
+            if candidate.config_id not in engine_map or candidate.config_id in seen:
+                continue
+            cfg, eng = engine_map[candidate.config_id]
+            if get_engine_health(eng).is_available():
+                logger.info(
+                    "Routed to engine %s (score=%.2f) for language=%s",
+                    cfg.name, candidate.composite, language
+                )
+                seen.add(candidate.config_id)
+                yield (cfg, eng)
 
-            if composite > best_score:
-                # Verify engine health before selecting
-                try:
-                    if eng.health_check():
-                        best_score = composite
-                        best_engine = (cfg, eng)
-                except Exception:
-                    logger.warning("Health check failed for %s during routing", cfg.name)
-
-        if best_engine:
-            logger.info(
-                "Routed to engine %s (score=%.2f) for language=%s",
-                best_engine[0].name, best_score, language
+    def get_routing_table(self):
+        """Return the compiled routing table, rebuilding it if rules, scores or policy changed.
+
+        Admin edits bump the routing version; score updates from extraction
+        feedback don't, and are picked up once the table outlives its TTL.
+        """
+        from claimlens.apps import ClaimlensConfig
+
+        version = get_registry_version(ROUTING_SCOPE)
+        ttl = ClaimlensConfig.engine_registry_ttl_seconds or 300
+        if self._routing_table is None:
+            stale = True
+        else:
+            stale = (
+                version != self.versions.get(ROUTING_SCOPE)
+                or time.monotonic() - self._routing_loaded_at > ttl
             )
+        if stale:
+            self._routing_table = RoutingTable.load()
+            self._routing_loaded_at = time.monotonic()
+            self.versions[ROUTING_SCOPE] = version
+        return self._routing_table
+
+    def _fallback_candidates(self):
+        """Yield ``(config, engine, force)`` in primary/fallback order, checked lazily.
 
-        return best_engine
+        Engines whose circuit is open are skipped, unless that would leave
+        nothing to try: then every engine is yielded again with ``force``.
+        """
+        skipped = 0
+        for config, engine in self._engines:
+            if get_engine_health(engine).is_available():
+                yield config, engine, False
+            else:
+                skipped += 1
+        if skipped == len(self._engines):
+            for config, engine in self._engines:
+                yield config, engine, True
 
-    def _execute_with_fallback(self, method_name, *args):
+    def _execute_with_fallback(self, method_name, *args, use_cache=True):
         if not self._engines:
             self.load_engines()
 
@@ -213,10 +746,9 @@ class EngineManager:
             return LLMResponse(success=False, error="No active engines configured")
 
         last_error = None
-        for config, engine in self._engines:
+        for config, engine, force in self._fallback_candidates():
             try:
-                method = getattr(engine, method_name)
-                result = method(*args)
+                result = self._call_engine(engine, method_name, args, use_cache=use_cache, force=force)
                 if result.success:
                     return result
                 last_error = result.error
@@ -244,10 +776,17 @@ class EngineManager:
                 return config
         return self._engines[0][0] if self._engines else None
 
+    def close(self):
+        """Close the pooled HTTP clients of the currently loaded engines."""
+        for config, engine in self._engines:
+            engine.close()
+            submit_coroutine(engine.aclose())
+        self._engines = []
+
     def health_check(self):
         if not self._engines:
             self.load_engines()
         results = {}
         for config, engine in self._engines:
-            results[config.name] = engine.health_check()
+            results[config.name] = get_engine_health(engine).refresh()
         return results
@@ -0,0 +1,82 @@
+from claimlens.engine.types import LLMResponse
+
+
+def _is_empty(value):
+    return value is None or value == '' or value == []
+
+
+def merge_page_extractions(page_datas):
+    """Merge per-page extraction payloads into one ``{"fields", "aggregate_confidence"}`` dict.
+
+    Array fields (``items``, ``services``...) are concatenated in page order and
+    their confidence averaged over the pages that contributed items. Scalar
+    fields keep the non-empty value with the highest confidence.
+    """
+    fields = {}
+    array_confidences = {}
+    aggregates = []
+
+    for data in page_datas:
+        if 'aggregate_confidence' in data:
+            aggregates.append(data.get('aggregate_confidence') or 0.0)
+        for name, field in (data.get('fields') or {}).items():
+            if not isinstance(field, dict):
+                continue
+            value = field.get('value')
+            confidence = field.get('confidence') or 0.0
+            current = fields.get(name)
+
+            if isinstance(value, list):
+                if current is None or not isinstance(current.get('value'), list):
+                    current = fields[name] = {'value': [], 'confidence': 0.0}
+                if value:
+                    current['value'].extend(value)
+                    array_confidences.setdefault(name, []).append(confidence)
+                continue
+
+            if current is None:
+                fields[name] = {'value': value, 'confidence': confidence}
+            elif isinstance(current.get('value'), list):
+                continue
+            elif _is_empty(current.get('value')) and not _is_empty(value):
+                fields[name] = {'value': value, 'confidence': confidence}
+            elif not _is_empty(value) and confidence > (current.get('confidence') or 0.0):
+                fields[name] = {'value': value, 'confidence': confidence}
+
+    for name, confidences in array_confidences.items():
+        fields[name]['confidence'] = sum(confidences) / len(confidences)
+
+    return {
+        'fields': fields,
+        'aggregate_confidence': sum(aggregates) / len(aggregates) if aggregates else 0.0,
+    }
+
+
+def merge_page_responses(responses):
+    """Combine per-page LLMResponses into one; failed pages lower the confidence."""
+    succeeded = [r for r in responses if r.success]
+    if not succeeded:
+        errors = [r.error for r in responses if r.error]
+        return LLMResponse(
+            success=False,
+            error=f"All pages failed. Last error: {errors[-1] if errors else None}",
+        )
+
+    merged = merge_page_extractions([r.data for r in succeeded])
+    failed_pages = [i + 1 for i, r in enumerate(responses) if not r.success]
+    if failed_pages:
+        merged['failed_pages'] = failed_pages
+        merged['aggregate_confidence'] *= len(succeeded) / len(responses)
+    merged['page_count'] = len(responses)
+
+    return LLMResponse(
+        success=True,
+        data=merged,
+        confidence=merged['aggregate_confidence'],
+        raw_response={'pages': [r.raw_response for r in responses]},
+        tokens_used=sum(r.tokens_used for r in responses),
+        # Pages run in parallel, so the slowest page bounds the latency
+        processing_time_ms=max(r.processing_time_ms for r in responses),
+        engine_name=succeeded[0].engine_name,
+        truncated=any(r.truncated for r in succeeded),
+    )
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+PROMPT_VERSION_KEY = 'claimlens:prompt_templates:version'
+
+# Rendered prompts kept per process; the key space is bounded by configuration
+# (prompt types x document types x templates) so a full reset is enough
+MAX_RENDERED_PROMPTS = 512
+
+# Prompts rendered during the current engine call, keyed by prompt type, document
+# type and inputs; the manager renders one to key the response cache and the
+# engine reuses it rather than resolving and rendering it again
+call_prompts = ContextVar('claimlens_call_prompts', default=None)
+
+_prompt_lock = threading.Lock()
+_prompt_registry = None
+
+
+def get_prompt_version():
+    """Return the shared prompt version stamp (None if the cache is unreachable)."""
+    from django.core.cache import cache
+    try:
+        return cache.get(PROMPT_VERSION_KEY, 0)
+    except Exception as e:
+        logger.warning("Prompt version lookup failed: %s", e)
+        return None
+
+
+def bump_prompt_version():
+    """Invalidate resolved and rendered prompts in this process and every worker."""
+    global _prompt_registry
+    from django.core.cache import cache
+    try:
+        cache.incr(PROMPT_VERSION_KEY)
+    except ValueError:
+        cache.set(PROMPT_VERSION_KEY, 1, timeout=None)
+    except Exception as e:
+        logger.warning("Prompt version bump failed: %s", e)
+
+    with _prompt_lock:
+        _prompt_registry = None
+
+
+def reset_prompt_registry():
+    global _prompt_registry
+    with _prompt_lock:
+        _prompt_registry = None
+
+
+def inputs_hash(value):
+    """Stable hash of the JSON inputs (extraction template, document types) of a prompt."""
+    payload = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class PromptRegistry:
+    """Snapshot of the active PromptTemplates plus the prompts rendered from them.
+
+    All active templates are loaded in one query; resolving a prompt is then a
+    dictionary lookup. The snapshot is replaced when the shared version stamp
+    bumped by PromptTemplateService changes, which also drops the rendered prompts.
+    """
+
+    def __init__(self, templates, version=None):
+        # (prompt_type, document_type_code or None) -> (version, content)
+        self.templates = templates
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self._rendered = {}
+
+    @classmethod
+    def load(cls, version=None):
+        from claimlens.models import PromptTemplate
+
+        templates = {}
+        active = PromptTemplate.objects.filter(
+            is_active=True, is_deleted=False,
+        ).select_related('document_type').order_by('-version')
+        for template in active:
+            code = template.document_type.code if template.document_type_id else None
+            templates.setdefault((template.prompt_type, code), (template.version, template.content))
+        logger.info("Loaded %d active prompt templates", len(templates))
+        return cls(templates, version)
+
+    def is_stale(self, version, ttl):
+        if version is not None:
+            return version != self.version
+        # Cache unreachable: bound the snapshot age instead
+        return time.monotonic() - self.loaded_at > ttl
+
+    def resolve(self, prompt_type, document_type_code=None):
+        """Return (version, content) of the active prompt, or None for the file fallback."""
+        if document_type_code:
+            override = self.templates.get((prompt_type, document_type_code))
+            if override:
+                return override
+        return self.templates.get((prompt_type, None))
+
+    def rendered(self, key):
+        return self._rendered.get(key)
+
+    def remember(self, key, prompt):
+        if len(self._rendered) >= MAX_RENDERED_PROMPTS:
+            self._rendered.clear()
+        self._rendered[key] = prompt
+
+
+def get_prompt_registry():
+    global _prompt_registry
+    from claimlens.apps import ClaimlensConfig
+
+    ttl = ClaimlensConfig.prompt_cache_ttl_seconds or 300
+    version = get_prompt_version()
+    with _prompt_lock:
+        registry = _prompt_registry
+        if registry is None or registry.is_stale(version, ttl):
+            registry = _prompt_registry = PromptRegistry.load(version)
+    return registry
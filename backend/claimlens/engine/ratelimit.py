@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY = 'claimlens:ratelimit:{engine}:{kind}'
+
+# Rough input cost of one page image; text is counted at ~4 characters per token
+IMAGE_TOKEN_ESTIMATE = 1000
+
+# Buckets hold one minute of budget and refill continuously. The script takes
+# from every bucket or from none, and returns how long to wait when any is short.
+# KEYS: bucket keys; ARGV: force, then (capacity, amount) per key.
+_TAKE_SCRIPT = """
+local force = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local amount = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * capacity / 60)
+    levels[i] = tokens
+    if tokens < amount then
+        wait = math.max(wait, (amount - tokens) * 60 / capacity)
+    end
+end
+if wait > 0 and force == 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local amount = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', math.min(capacity, levels[i] - amount), 'ts', now)
+    redis.call('EXPIRE', key, 120)
+end
+return '0'
+"""
+
+
+class RateLimitExceeded(Exception):
+    """The engine's request or token budget is exhausted for longer than we are willing to wait."""
+
+    def __init__(self, engine_name, wait_seconds):
+        super().__init__(f"Rate limit reached for engine {engine_name}, next slot in {wait_seconds:.1f}s")
+        self.engine_name = engine_name
+        self.wait_seconds = wait_seconds
+
+
+def estimate_tokens(payload):
+    """Upper-bound token cost of a chat request: input estimate plus the max_tokens reservation."""
+    tokens = payload.get('max_tokens') or 0
+    for message in payload.get('messages', []):
+        content = message.get('content')
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content or []:
+            if part.get('type') == 'text':
+                tokens += len(part.get('text', '')) // 4
+            else:
+                tokens += IMAGE_TOKEN_ESTIMATE
+    return tokens
+
+
+class LocalTokenBucket:
+    """In-process token buckets; the stand-in for RedisTokenBucket in tests and single-worker setups."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, buckets, force=False):
+        """Take ``amount`` from every (key, capacity, amount) bucket; return seconds to wait, 0 if granted."""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            wait = 0.0
+            for key, capacity, amount in buckets:
+                tokens, ts = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - ts) * capacity / 60)
+                levels.append(tokens)
+                if tokens < amount:
+                    wait = max(wait, (amount - tokens) * 60 / capacity)
+            if wait and not force:
+                return wait
+            for (key, capacity, amount), tokens in zip(buckets, levels):
+                self._buckets[key] = (min(capacity, tokens - amount), now)
+            return 0.0
+
+
+class RedisTokenBucket:
+    """Token buckets shared by every worker through Redis, updated atomically by a Lua script.
+
+    Fails open: when Redis is unreachable requests are not throttled.
+    """
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(_TAKE_SCRIPT)
+
+    def take(self, buckets, force=False):
+        args = [1 if force else 0]
+        for _, capacity, amount in buckets:
+            args.extend([capacity, amount])
+        try:
+            return float(self._script(keys=[key for key, _, _ in buckets], args=args))
+        except Exception as e:
+            logger.warning("Rate limit check failed, not throttling: %s", e)
+            return 0.0
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = _build_rate_limiter()
+    return _limiter
+
+
+def reset_rate_limiter():
+    global _limiter
+    with _limiter_lock:
+        _limiter = None
+
+
+def _build_rate_limiter():
+    from claimlens.apps import ClaimlensConfig
+
+    if (ClaimlensConfig.llm_rate_limit_backend or 'redis') == 'redis':
+        url = ClaimlensConfig.llm_rate_limit_redis_url or ClaimlensConfig.celery_broker_url
+        try:
+            return RedisTokenBucket(url)
+        except ImportError:
+            logger.warning("'redis' is not installed, engine rate limits are enforced per process only")
+    return LocalTokenBucket()
+
+
+class EngineRateLimit:
+    """Requests-per-minute and tokens-per-minute budgets of one engine."""
+
+    def __init__(self, engine_name, requests_per_minute=None, tokens_per_minute=None):
+        self.engine_name = engine_name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+    def __bool__(self):
+        return bool(self.requests_per_minute or self.tokens_per_minute)
+
+    def _buckets(self, tokens, requests=1):
+        buckets = []
+        if self.requests_per_minute:
+            key = BUCKET_KEY.format(engine=self.engine_name, kind='rpm')
+            buckets.append((key, self.requests_per_minute, requests))
+        if self.tokens_per_minute:
+            key = BUCKET_KEY.format(engine=self.engine_name, kind='tpm')
+            # A single request larger than the budget would never fit
+            buckets.append((key, self.tokens_per_minute, min(tokens, self.tokens_per_minute)))
+        return buckets
+
+    def _max_wait(self):
+        from claimlens.apps import ClaimlensConfig
+        max_wait = ClaimlensConfig.llm_rate_limit_max_wait_seconds
+        return 10 if max_wait is None else max_wait
+
+    def acquire(self, tokens):
+        """Block until the request fits the budget, or raise RateLimitExceeded so the caller reroutes."""
+        limiter, buckets, max_wait = get_rate_limiter(), self._buckets(tokens), self._max_wait()
+        waited = 0.0
+        while True:
+            wait = limiter.take(buckets)
+            if not wait:
+                return
+            if waited + wait > max_wait:
+                raise RateLimitExceeded(self.engine_name, wait)
+            time.sleep(wait)
+            waited += wait
+
+    async def aacquire(self, tokens):
+        """Async acquire; the Redis round trip runs off the event loop, which it would otherwise stall."""
+        limiter, buckets, max_wait = get_rate_limiter(), self._buckets(tokens), self._max_wait()
+        take = sync_to_async(limiter.take, thread_sensitive=False)
+        waited = 0.0
+        while True:
+            wait = await take(buckets)
+            if not wait:
+                return
+            if waited + wait > max_wait:
+                raise RateLimitExceeded(self.engine_name, wait)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def settle(self, estimated, actual):
+        """Return the unused part of the token reservation (or charge the overrun)."""
+        if not self.tokens_per_minute or not actual:
+            return
+        key = BUCKET_KEY.format(engine=self.engine_name, kind='tpm')
+        estimated = min(estimated, self.tokens_per_minute)
+        get_rate_limiter().take([(key, self.tokens_per_minute, actual - estimated)], force=True)
+
+    async def asettle(self, estimated, actual):
+        await sync_to_async(self.settle, thread_sensitive=False)(estimated, actual)
@@ -0,0 +1,66 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+# Provider responses worth retrying on the same engine; other 4xx are permanent
+TRANSIENT_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+TRANSIENT_EXCEPTIONS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+
+def is_transient(exc):
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in TRANSIENT_STATUS_CODES
+    return isinstance(exc, TRANSIENT_EXCEPTIONS)
+
+
+def is_engine_fault(exc):
+    """Whether a failed call counts against the engine's circuit breaker.
+
+    Only transport errors and 5xx responses do; a malformed answer or a
+    rejected request says nothing about the engine's availability.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+def retry_after_seconds(exc):
+    """Seconds requested by a ``Retry-After`` header (delta or HTTP date), or None."""
+    response = getattr(exc, 'response', None)
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Local retries of transient provider errors: exponential backoff with full jitter.
+
+    ``max_retries`` counts retries after the first attempt. A ``Retry-After``
+    longer than ``max_backoff`` is not waited for; the error is raised so the
+    manager can move on to another engine.
+    """
+
+    def __init__(self, max_retries=2, backoff=1.0, max_backoff=30.0):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def next_delay(self, attempt, exc):
+        """Seconds to wait before retry ``attempt`` (0-based), or None to give up."""
+        if attempt >= self.max_retries or not is_transient(exc):
+            return None
+        retry_after = retry_after_seconds(exc)
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_backoff else None
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
@@ -0,0 +1,118 @@
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEIGHTS = (0.50, 0.30, 0.20)
+
+RuleCandidate = namedtuple('RuleCandidate', ['config_id', 'name', 'priority'])
+ScoreCandidate = namedtuple('ScoreCandidate', ['config_id', 'composite'])
+RouteEntry = namedtuple('RouteEntry', ['rules', 'scores'])
+
+
+class RoutingTable:
+    """In-memory routing decision table compiled from rules, scores and policy.
+
+    Rules, capability scores and the routing policy are loaded once; the
+    ordered rule candidates and composite-score ranking for each
+    (language, document_type) pair are derived on first lookup and
+    memoised, so routing a document is a dictionary lookup.
+    """
+
+    def __init__(self, rules, scores, weights=DEFAULT_WEIGHTS):
+        self.weights = weights
+
+        # Rules ordered by priority (highest first), bucketed by language (None = any)
+        self._rules_by_language = {}
+        for rule in sorted(rules, key=lambda r: -r.priority):
+            self._rules_by_language.setdefault(rule.language, []).append(rule)
+
+        # Scores bucketed by (language, document_type_id), plus the accuracy
+        # used for min_confidence per (engine, language)
+        self._scores = {}
+        self._accuracy = {}
+        for score in scores:
+            self._scores.setdefault((score.language, score.document_type_id), []).append(score)
+            acc_key = (score.engine_config_id, score.language)
+            if acc_key not in self._accuracy or score.document_type_id is None:
+                self._accuracy[acc_key] = score.accuracy_score
+
+        self._entries = {}
+
+    @classmethod
+    def load(cls):
+        from claimlens.models import EngineRoutingRule, EngineCapabilityScore, RoutingPolicy
+
+        rules = list(EngineRoutingRule.objects.filter(
+            is_active=True, is_deleted=False,
+            engine_config__is_active=True, engine_config__is_deleted=False,
+        ))
+        scores = list(EngineCapabilityScore.objects.filter(
+            is_active=True, is_deleted=False,
+            engine_config__is_active=True, engine_config__is_deleted=False,
+        ))
+        policy = RoutingPolicy.objects.first()
+        weights = (
+            (policy.accuracy_weight, policy.cost_weight, policy.speed_weight)
+            if policy else DEFAULT_WEIGHTS
+        )
+        logger.info("Compiled routing table: %d rules, %d scores", len(rules), len(scores))
+        return cls(rules, scores, weights)
+
+    def lookup(self, language, document_type_id=None):
+        key = (language, document_type_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = RouteEntry(
+                rules=self._compile_rules(language, document_type_id),
+                scores=self._compile_scores(language, document_type_id),
+            )
+            self._entries[key] = entry
+        return entry
+
+    def _compile_rules(self, language, document_type_id):
+        matching = self._rules_by_language.get(language, []) + self._rules_by_language.get(None, [])
+        matching.sort(key=lambda r: -r.priority)
+
+        candidates = []
+        for rule in matching:
+            if document_type_id and rule.document_type_id not in (document_type_id, None):
+                continue
+            # Enforce min_confidence against historical accuracy
+            if rule.min_confidence > 0:
+                accuracy = self._accuracy.get((rule.engine_config_id, language))
+                if accuracy is None or accuracy / 100.0 < rule.min_confidence:
+                    logger.debug(
+                        "Rule '%s' excluded: accuracy below min_confidence %.2f",
+                        rule.name, rule.min_confidence,
+                    )
+                    continue
+            candidates.append(RuleCandidate(rule.engine_config_id, rule.name, rule.priority))
+        return candidates
+
+    def _compile_scores(self, language, document_type_id):
+        # Exact document_type match first, then fall back to wildcard (null)
+        scores = None
+        if document_type_id:
+            scores = self._scores.get((language, document_type_id))
+        if not scores:
+            scores = self._scores.get((language, None), [])
+        if not scores:
+            return []
+
+        acc_w, cost_w, speed_w = self.weights
+        # Normalize cost: find max cost to compute inverted score
+        max_cost = max(float(s.cost_per_page) for s in scores) or 1.0
+
+        ranked = []
+        for cap in scores:
+            normalized_cost = (1.0 - float(cap.cost_per_page) / max_cost) * 100
+            composite = (
+                acc_w * cap.accuracy_score
+                + cost_w * normalized_cost
+                + speed_w * cap.speed_score
+            )
+            ranked.append(ScoreCandidate(cap.engine_config_id, composite))
+        # Stable sort keeps the first of equally scored engines, as before
+        ranked.sort(key=lambda c: -c.composite)
+        return ranked
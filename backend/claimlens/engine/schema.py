@@ -0,0 +1,81 @@
+import threading
+
+from claimlens.engine.prompt_cache import inputs_hash
+
+# Compiled schemas per process; templates only change through admin edits, and a
+# changed template hashes to a new key, so a full reset on overflow is enough
+MAX_SCHEMAS = 256
+
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+# Every scalar is returned as a string (see the extraction prompt's data type rules)
+_NULLABLE_STRING = {'type': ['string', 'null']}
+
+
+def _closed_object(properties):
+    """Object schema in the strict structured-output dialect: every key required, no extras."""
+    return {
+        'type': 'object',
+        'properties': properties,
+        'required': list(properties),
+        'additionalProperties': False,
+    }
+
+
+def _item_schema(spec):
+    # Array items use the "type: description" shorthand, e.g. "string: ICD-10 code"
+    if isinstance(spec, str) and ':' in spec:
+        return dict(_NULLABLE_STRING, description=spec.split(':', 1)[1].strip())
+    return dict(_NULLABLE_STRING)
+
+
+def _value_schema(field):
+    if isinstance(field, dict) and field.get('type') == 'array':
+        items = field.get('items')
+        if isinstance(items, dict) and items:
+            item = _closed_object({name: _item_schema(spec) for name, spec in items.items()})
+        else:
+            item = dict(_NULLABLE_STRING)
+        return {'type': ['array', 'null'], 'items': item}
+    schema = dict(_NULLABLE_STRING)
+    if isinstance(field, dict) and field.get('description'):
+        schema['description'] = field['description']
+    return schema
+
+
+def compile_extraction_schema(extraction_template):
+    """JSON Schema of the extraction response (``fields`` and ``aggregate_confidence``) for a template."""
+    fields = {
+        name: _closed_object({'value': _value_schema(field), 'confidence': {'type': 'number'}})
+        for name, field in extraction_template.items()
+    }
+    return _closed_object({
+        'fields': _closed_object(fields),
+        'aggregate_confidence': {'type': 'number'},
+    })
+
+
+def extraction_schema(extraction_template):
+    """Compiled schema of ``extraction_template``, cached per template content (i.e. per version)."""
+    key = inputs_hash(extraction_template)
+    schema = _schemas.get(key)
+    if schema is None:
+        schema = compile_extraction_schema(extraction_template)
+        with _schemas_lock:
+            if len(_schemas) >= MAX_SCHEMAS:
+                _schemas.clear()
+            _schemas[key] = schema
+    return schema
+
+
+def extraction_response_format(extraction_template):
+    """OpenAI-style ``response_format`` (also accepted by vLLM and Mistral) for guided decoding."""
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': 'extraction',
+            'strict': True,
+            'schema': extraction_schema(extraction_template),
+        },
+    }
@@ -12,3 +12,9 @@ class LLMResponse:
     processing_time_ms: int = 0
     error: Optional[str] = None
     engine_name: Optional[str] = None
+    cached: bool = False
+    hedge: Optional[dict] = None
+    # Output was cut off (max_tokens) and only partly recovered
+    truncated: bool = False
+    # Failed on a transport error or 5xx, which counts against the engine's circuit
+    engine_fault: bool = False
@@ -23,6 +23,7 @@ from claimlens.services import (
 
 class ProcessDocumentInput(OpenIMISMutation.Input):
     uuid = graphene.UUID(required=True)
+    bypass_cache = graphene.Boolean(required=False)
 
 
 class CreateDocumentTypeInput(OpenIMISMutation.Input):
@@ -31,6 +32,7 @@ class CreateDocumentTypeInput(OpenIMISMutation.Input):
     extraction_template = graphene.JSONString(required=False)
     field_definitions = graphene.JSONString(required=False)
     classification_hints = graphene.String(required=False)
+    fused_extraction = graphene.Boolean(required=False)
     is_active = graphene.Boolean(required=False)
 
 
@@ -51,6 +53,10 @@ class CreateEngineConfigInput(OpenIMISMutation.Input):
     max_tokens = graphene.Int(required=False)
     temperature = graphene.Float(required=False)
     timeout_seconds = graphene.Int(required=False)
+    image_budget = graphene.JSONString(required=False)
+    requests_per_minute = graphene.Int(required=False)
+    tokens_per_minute = graphene.Int(required=False)
+    structured_output = graphene.Boolean(required=False)
 
 
 class UpdateEngineConfigInput(CreateEngineConfigInput):
@@ -178,7 +184,7 @@ class ProcessDocumentMutation(OpenIMISMutation):
             data.pop('client_mutation_label', None)
 
             service = DocumentService(user)
-            result = service.start_processing(data['uuid'])
+            result = service.start_processing(data['uuid'], bypass_cache=data.get('bypass_cache') or False)
             if not result.get('success'):
                 return [{"message": result.get('detail', 'Processing failed')}]
             return None
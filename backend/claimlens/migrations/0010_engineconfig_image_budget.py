@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claimlens', '0009_prompt_template'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='engineconfig',
+            name='image_budget',
+            field=models.JSONField(
+                blank=True, default=dict,
+                help_text='Image downscaling/re-encoding before upload, e.g. '
+                          '{"max_long_edge": 2048, "max_pixels": 4000000, "format": "jpeg", '
+                          '"quality": 85, "grayscale": false}. Empty = send images unchanged.',
+            ),
+        ),
+        # Keep the django-simple-history table in step with the model
+        migrations.RunSQL(
+            "ALTER TABLE IF EXISTS claimlens_historicalengineconfig "
+            "ADD COLUMN IF NOT EXISTS image_budget jsonb NOT NULL DEFAULT '{}'::jsonb",
+            "ALTER TABLE IF EXISTS claimlens_historicalengineconfig DROP COLUMN IF EXISTS image_budget",
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claimlens', '0010_engineconfig_image_budget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='engineconfig',
+            name='requests_per_minute',
+            field=models.PositiveIntegerField(
+                blank=True, null=True,
+                help_text='Provider request budget shared by all workers. Empty = unlimited.',
+            ),
+        ),
+        migrations.AddField(
+            model_name='engineconfig',
+            name='tokens_per_minute',
+            field=models.PositiveIntegerField(
+                blank=True, null=True,
+                help_text='Provider token budget shared by all workers. Empty = unlimited.',
+            ),
+        ),
+        # Keep the django-simple-history table in step with the model
+        migrations.RunSQL(
+            "ALTER TABLE IF EXISTS claimlens_historicalengineconfig "
+            "ADD COLUMN IF NOT EXISTS requests_per_minute integer NULL, "
+            "ADD COLUMN IF NOT EXISTS tokens_per_minute integer NULL",
+            "ALTER TABLE IF EXISTS claimlens_historicalengineconfig "
+            "DROP COLUMN IF EXISTS requests_per_minute, DROP COLUMN IF EXISTS tokens_per_minute",
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claimlens', '0011_engineconfig_rate_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttype',
+            name='fused_extraction',
+            field=models.BooleanField(
+                default=False,
+                help_text='Extract this type in the classification request (one LLM call instead of two).',
+            ),
+        ),
+        migrations.AlterField(
+            model_name='prompttemplate',
+            name='prompt_type',
+            field=models.CharField(
+                choices=[
+                    ('classification', 'Classification'),
+                    ('extraction', 'Extraction'),
+                    ('classify_extract', 'Classification + Extraction'),
+                ],
+                max_length=20,
+            ),
+        ),
+        # Keep the django-simple-history table in step with the model
+        migrations.RunSQL(
+            "ALTER TABLE IF EXISTS claimlens_historicaldocumenttype "
+            "ADD COLUMN IF NOT EXISTS fused_extraction boolean NOT NULL DEFAULT false",
+            "ALTER TABLE IF EXISTS claimlens_historicaldocumenttype DROP COLUMN IF EXISTS fused_extraction",
+        ),
+    ]
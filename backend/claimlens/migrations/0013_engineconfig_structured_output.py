@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claimlens', '0012_documenttype_fused_extraction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='engineconfig',
+            name='structured_output',
+            field=models.BooleanField(
+                default=False,
+                help_text='Send the extraction template as a JSON Schema response_format '
+                          '(provider must support structured outputs / guided decoding).',
+            ),
+        ),
+        # Keep the django-simple-history table in step with the model
+        migrations.RunSQL(
+            "ALTER TABLE IF EXISTS claimlens_historicalengineconfig "
+            "ADD COLUMN IF NOT EXISTS structured_output boolean NOT NULL DEFAULT false",
+            "ALTER TABLE IF EXISTS claimlens_historicalengineconfig "
+            "DROP COLUMN IF EXISTS structured_output",
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claimlens', '0013_engineconfig_structured_output'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='batch_id',
+            field=models.UUIDField(
+                blank=True, db_index=True, null=True,
+                help_text='Bulk upload this document arrived in',
+            ),
+        ),
+        # Keep the django-simple-history table in step with the model
+        migrations.RunSQL(
+            "ALTER TABLE IF EXISTS claimlens_historicaldocument "
+            "ADD COLUMN IF NOT EXISTS batch_id uuid NULL",
+            "ALTER TABLE IF EXISTS claimlens_historicaldocument "
+            "DROP COLUMN IF EXISTS batch_id",
+        ),
+    ]
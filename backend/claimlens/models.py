@@ -12,6 +12,10 @@ class DocumentType(HistoryModel):
     field_definitions = models.JSONField(default=dict, blank=True)
     classification_hints = models.TextField(blank=True, default="")
     is_active = models.BooleanField(default=True)
+    fused_extraction = models.BooleanField(
+        default=False,
+        help_text="Extract this type in the classification request (one LLM call instead of two)."
+    )
 
     def __str__(self):
         return f"{self.code} - {self.name}"
@@ -41,6 +45,25 @@ class EngineConfig(HistoryModel):
     max_tokens = models.IntegerField(default=4096)
     temperature = models.FloatField(default=0.1)
     timeout_seconds = models.IntegerField(default=120)
+    image_budget = models.JSONField(
+        default=dict, blank=True,
+        help_text="Image downscaling/re-encoding before upload, e.g. "
+                  '{"max_long_edge": 2048, "max_pixels": 4000000, "format": "jpeg", '
+                  '"quality": 85, "grayscale": false}. Empty = send images unchanged.'
+    )
+    requests_per_minute = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Provider request budget shared by all workers. Empty = unlimited."
+    )
+    tokens_per_minute = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Provider token budget shared by all workers. Empty = unlimited."
+    )
+    structured_output = models.BooleanField(
+        default=False,
+        help_text="Send the extraction template as a JSON Schema response_format "
+                  "(provider must support structured outputs / guided decoding)."
+    )
 
     def __str__(self):
         return f"{self.name} ({self.adapter})"
@@ -79,6 +102,8 @@ class Document(HistoryModel):
                                 help_text="ISO 639-1 language code detected during classification")
     claim_uuid = models.UUIDField(null=True, blank=True,
                                   help_text="UUID of linked openIMIS Claim (plain UUID, not FK)")
+    batch_id = models.UUIDField(null=True, blank=True, db_index=True,
+                                help_text="Bulk upload this document arrived in")
 
     def __str__(self):
         return f"{self.original_filename} ({self.status})"
@@ -335,6 +360,7 @@ class PromptTemplate(HistoryModel):
     class PromptType(models.TextChoices):
         CLASSIFICATION = 'classification', _('Classification')
         EXTRACTION = 'extraction', _('Extraction')
+        CLASSIFY_EXTRACT = 'classify_extract', _('Classification + Extraction')
 
     prompt_type = models.CharField(max_length=20, choices=PromptType.choices)
     content = models.TextField()
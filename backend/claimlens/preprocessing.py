@@ -1,8 +1,45 @@
 import logging
+import math
+import re
+from contextvars import ContextVar
 from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
+RENDER_DPI = 200
+RENDER_MIME_TYPE = 'image/png'
+# Pages sent to engines as their extracted text layer rather than an image
+TEXT_MIME_TYPE = 'text/plain'
+
+IMAGE_BUDGET_KEYS = ('max_long_edge', 'max_pixels', 'format', 'quality', 'grayscale')
+IMAGE_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+    'png': ('PNG', 'image/png'),
+}
+_MIME_FORMATS = {mime: name for name, (_pil, mime) in IMAGE_FORMATS.items()}
+# Sources scoring below this (see _compute_quality_score) are not degraded further
+LOW_QUALITY_SCORE = 0.5
+# Quality score of the document whose images are being sent to engines, as
+# analyze_image stored it in its preprocessing metadata; None when unknown
+source_quality = ContextVar('claimlens_source_quality', default=None)
+
+# Frequent short words per ISO 639-1 code, for language detection on text layers
+STOPWORDS = {
+    'en': {'the', 'and', 'of', 'to', 'in', 'for', 'is', 'with', 'on', 'by', 'date', 'name', 'patient', 'total'},
+    'fr': {'le', 'la', 'les', 'et', 'des', 'du', 'de', 'pour', 'est', 'avec', 'sur', 'par', 'nom', 'montant'},
+    'es': {'el', 'la', 'los', 'las', 'y', 'del', 'de', 'para', 'es', 'con', 'por', 'nombre', 'fecha', 'paciente'},
+    'pt': {'o', 'a', 'os', 'as', 'e', 'do', 'da', 'de', 'para', 'com', 'por', 'nome', 'data', 'paciente'},
+    'de': {'der', 'die', 'das', 'und', 'von', 'zu', 'mit', 'für', 'ist', 'auf', 'datum', 'betrag', 'patient'},
+    'sw': {'na', 'ya', 'wa', 'kwa', 'za', 'la', 'cha', 'katika', 'jina', 'tarehe', 'mgonjwa', 'jumla'},
+}
+# Scripts used by a single language in our deployments, as (first, last) code points
+SCRIPT_LANGUAGES = {
+    'ar': (0x0600, 0x06FF),
+    'am': (0x1200, 0x137F),
+}
+_WORD = re.compile(r"[^\W\d_]+")
+
 
 def analyze_image(file_bytes, mime_type):
     metadata = {
@@ -60,6 +97,184 @@ def _analyze_pdf_file(file_bytes):
     return result
 
 
+def render_pdf_page(pdf_bytes, page_number=0, dpi=RENDER_DPI):
+    """Rasterise one PDF page to PNG bytes for vision models."""
+    import fitz
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        pix = doc[page_number].get_pixmap(dpi=dpi)
+        return pix.tobytes("png")
+    finally:
+        doc.close()
+
+
+def render_pdf_pages(pdf_bytes, max_pages=None, dpi=RENDER_DPI):
+    """Rasterise the first ``max_pages`` pages of a PDF as PNG bytes, opening it once."""
+    import fitz
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        page_count = min(doc.page_count, max_pages) if max_pages else doc.page_count
+        return [doc[page_number].get_pixmap(dpi=dpi).tobytes("png") for page_number in range(page_count)]
+    finally:
+        doc.close()
+
+
+def perceptual_hash(image_bytes, hash_size=8):
+    """Difference hash of an image as a hex string; near-identical layouts differ in few bits.
+
+    The image is shrunk to ``hash_size + 1`` x ``hash_size`` grayscale pixels and
+    each bit records whether a pixel is brighter than its right neighbour. Large
+    images (full page renders, photos) are decoded at reduced size where the
+    format allows and reduced by whole factors before the final resample, which
+    is far cheaper than resampling every source pixel.
+    """
+    from PIL import Image
+    img = Image.open(BytesIO(image_bytes))
+    img.draft('L', (hash_size * 16, hash_size * 16))
+    img = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS, reducing_gap=4.0)
+    pixels = list(img.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def hash_distance(hash_a, hash_b):
+    """Number of differing bits between two perceptual hashes."""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+def render_storage_key(storage_key, page_number=0):
+    """Storage key of the rendered page image kept alongside the original."""
+    return f"{storage_key}.render/page-{page_number + 1}.png"
+
+
+def text_layer_storage_key(storage_key):
+    """Storage key of the JSON list of per-page text layers kept alongside the original."""
+    return f"{storage_key}.text/pages.json"
+
+
+def extract_pdf_text(pdf_bytes, max_pages=None):
+    """Return the embedded text layer of each page, one ``[x,y] text`` line per block.
+
+    Coordinates are the block's top-left corner in PDF points, so the model can
+    still reason about columns and tables. Scanned pages yield empty strings.
+    """
+    import fitz
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        page_count = min(doc.page_count, max_pages) if max_pages else doc.page_count
+        pages = []
+        for page_number in range(page_count):
+            lines = []
+            for x0, y0, _x1, _y1, text, _block_no, block_type in doc[page_number].get_text("blocks", sort=True):
+                text = text.strip()
+                if block_type != 0 or not text:
+                    continue
+                block_lines = text.splitlines()
+                lines.append(f"[{int(x0)},{int(y0)}] {block_lines[0]}")
+                lines.extend(f"    {line}" for line in block_lines[1:])
+            pages.append("\n".join(lines))
+        return pages
+    finally:
+        doc.close()
+
+
+def is_text_layer_usable(text, min_chars=200):
+    """A page's text layer is usable when it has enough content and little garbage.
+
+    Scanned pages have no text layer, and OCR-less PDFs with broken font maps
+    produce replacement or control characters instead of readable text.
+    """
+    content = ''.join(text.split())
+    if len(content) < min_chars:
+        return False
+    garbage = sum(1 for ch in content if ch == '\ufffd' or not ch.isprintable())
+    return garbage / len(content) < 0.05
+
+
+def detect_language(text, min_words=20):
+    """Guess the ISO 639-1 language of a text layer; return ``(code, confidence)`` or None.
+
+    Text mostly in a script listed in SCRIPT_LANGUAGES is attributed to that
+    language; Latin text is scored by its share of each language's stopwords.
+    Short texts, or scores too close to call, are inconclusive.
+    """
+    letters = [ch for ch in text if ch.isalpha()]
+    if not letters:
+        return None
+    for code, (first, last) in SCRIPT_LANGUAGES.items():
+        share = sum(1 for ch in letters if first <= ord(ch) <= last) / len(letters)
+        if share >= 0.5:
+            return code, round(share, 2)
+
+    words = [word.lower() for word in _WORD.findall(text)]
+    if len(words) < min_words:
+        return None
+    scores = {code: sum(1 for word in words if word in stopwords) for code, stopwords in STOPWORDS.items()}
+    ranked = sorted(scores.items(), key=lambda item: -item[1])
+    (best, best_hits), (_, runner_up_hits) = ranked[0], ranked[1]
+    if not best_hits or best_hits < 2 * runner_up_hits:
+        return None
+    return best, round(1 - runner_up_hits / best_hits, 2)
+
+
+def fit_image_to_budget(image_bytes, mime_type, budget, quality_score=None):
+    """Downscale and re-encode an image to an engine's ``image_budget``.
+
+    Returns ``(image_bytes, mime_type)``; the input is returned untouched when
+    the budget is empty or re-encoding would not make the payload smaller.
+    Low-quality sources (``quality_score`` from analyze_image below
+    LOW_QUALITY_SCORE) are never grayscaled and keep a lossy quality of at
+    least 90 so OCR accuracy is not traded away. The score is not recomputed
+    here: PDF renders carry no DPI and would all look like 72 DPI scans.
+    """
+    if not budget:
+        return image_bytes, mime_type
+
+    from PIL import Image, ImageOps
+    img = Image.open(BytesIO(image_bytes))
+    width, height = img.size
+    low_quality = quality_score is not None and quality_score < LOW_QUALITY_SCORE
+
+    scale = 1.0
+    max_long_edge = budget.get('max_long_edge')
+    if max_long_edge and max(width, height) > max_long_edge:
+        scale = max_long_edge / max(width, height)
+    max_pixels = budget.get('max_pixels')
+    if max_pixels and width * height * scale * scale > max_pixels:
+        scale = math.sqrt(max_pixels / (width * height))
+
+    grayscale = budget.get('grayscale') and not low_quality and img.mode not in ('1', 'L')
+    fmt = budget.get('format') or 'original'
+    if fmt == 'original':
+        fmt = _MIME_FORMATS.get(mime_type, 'png')
+    if scale >= 1.0 and not grayscale and IMAGE_FORMATS[fmt][1] == mime_type:
+        return image_bytes, mime_type
+
+    if scale < 1.0:
+        img = img.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+    if grayscale:
+        img = ImageOps.grayscale(img)
+
+    pil_format, out_mime = IMAGE_FORMATS[fmt]
+    quality = budget.get('quality') or 85
+    if low_quality:
+        quality = max(quality, 90)
+    if pil_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    buf = BytesIO()
+    img.save(buf, format=pil_format, quality=quality, optimize=True)
+    out = buf.getvalue()
+    if scale >= 1.0 and len(out) >= len(image_bytes) and mime_type in _MIME_FORMATS:
+        return image_bytes, mime_type
+    return out, out_mime
+
+
 def _get_pdf_page_count(file_bytes):
     try:
         content = file_bytes if isinstance(file_bytes, bytes) else file_bytes.read()
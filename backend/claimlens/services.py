@@ -1,16 +1,20 @@
 import logging
+import uuid as uuid_lib
 from datetime import datetime as py_datetime
 
 from cryptography.fernet import Fernet
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Count
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
 
 from core.services import BaseService
 from core.signals import register_service_signal
 from core.services.utils import check_authentication, output_exception, output_result_success, model_representation
 
 from claimlens.apps import ClaimlensConfig
+from claimlens.engine.prompt_cache import bump_prompt_version
 from claimlens.models import (
     Document, DocumentType, EngineConfig, AuditLog, ExtractionResult,
     EngineCapabilityScore, RoutingPolicy, ValidationRule, ValidationResult,
@@ -25,6 +29,22 @@ from claimlens.validations import (
 
 logger = logging.getLogger(__name__)
 
+# Statuses after which a document's pipeline has nothing left to do
+BATCH_FINAL_STATUSES = (
+    Document.Status.COMPLETED, Document.Status.REVIEW_REQUIRED, Document.Status.FAILED,
+)
+
+
+def _history_fields(user, now):
+    # HistoryModel.save() fills these; bulk inserts bypass it
+    return {
+        'id': uuid_lib.uuid4(),
+        'user_created': user,
+        'user_updated': user,
+        'date_created': now,
+        'date_updated': now,
+    }
+
 
 def _get_fernet():
     import base64
@@ -45,18 +65,23 @@ class DocumentService(BaseService):
         try:
             with transaction.atomic():
                 DocumentValidation.validate_upload(self.user, **obj_data)
+                # Checksum verified by a direct upload; recorded in the audit trail only
+                sha256 = obj_data.pop('sha256', None)
                 obj_data['status'] = Document.Status.PENDING
                 doc = Document(**obj_data)
                 doc.save(user=self.user)
 
+                details = {
+                    'filename': doc.original_filename,
+                    'mime_type': doc.mime_type,
+                    'file_size': doc.file_size,
+                }
+                if sha256:
+                    details['sha256'] = sha256
                 AuditLog(
                     document=doc,
                     action=AuditLog.Action.UPLOAD,
-                    details={
-                        'filename': doc.original_filename,
-                        'mime_type': doc.mime_type,
-                        'file_size': doc.file_size,
-                    },
+                    details=details,
                 ).save(user=self.user)
 
                 return output_result_success(dict_representation=model_representation(doc))
@@ -65,7 +90,7 @@ class DocumentService(BaseService):
 
     @check_authentication
     @register_service_signal('claimlens.document.start_processing')
-    def start_processing(self, document_uuid):
+    def start_processing(self, document_uuid, bypass_cache=False):
         try:
             with transaction.atomic():
                 doc = Document.objects.get(id=document_uuid, is_deleted=False)
@@ -79,23 +104,10 @@ class DocumentService(BaseService):
                     details={'from': Document.Status.PENDING, 'to': Document.Status.PREPROCESSING},
                 ).save(user=self.user)
 
-                from celery import chain as celery_chain
                 from kombu import Connection
-                from claimlens.tasks import preprocess_document, classify_document, extract_document
-
-                doc_id = str(doc.id)
-                user_id = str(self.user.id)
-                pipeline = celery_chain(
-                    preprocess_document.signature(
-                        args=(doc_id, user_id), queue='claimlens.preprocessing'
-                    ),
-                    classify_document.signature(
-                        args=(user_id,), queue='claimlens.classification'
-                    ),
-                    extract_document.signature(
-                        args=(user_id,), queue='claimlens.extraction'
-                    ),
-                )
+                from claimlens.tasks import processing_pipeline
+
+                pipeline = processing_pipeline(doc, str(self.user.id), bypass_cache)
                 broker_url = ClaimlensConfig.celery_broker_url
                 if broker_url:
                     with Connection(broker_url) as conn:
@@ -109,6 +121,140 @@ class DocumentService(BaseService):
         except Exception as exc:
             return output_exception(model_name='Document', method='start_processing', exception=exc)
 
+    @check_authentication
+    @register_service_signal('claimlens.document.upload_batch')
+    def upload_batch(self, batch_id, entries):
+        """Register many stored files at once; ``entries`` are ``upload`` payloads.
+
+        Documents and their upload audit entries are written with bulk inserts
+        (history rows included), tagged with ``batch_id``.
+        """
+        try:
+            with transaction.atomic():
+                now = py_datetime.now()
+                docs = []
+                logs = []
+                for obj_data in entries:
+                    DocumentValidation.validate_upload(self.user, **obj_data)
+                    details = {
+                        'filename': obj_data['original_filename'],
+                        'mime_type': obj_data['mime_type'],
+                        'file_size': obj_data['file_size'],
+                        'batch_id': str(batch_id),
+                    }
+                    doc = Document(
+                        **obj_data, status=Document.Status.PENDING, batch_id=batch_id,
+                        **_history_fields(self.user, now),
+                    )
+                    docs.append(doc)
+                    logs.append(AuditLog(
+                        document=doc, action=AuditLog.Action.UPLOAD, details=details,
+                        **_history_fields(self.user, now),
+                    ))
+                bulk_create_with_history(docs, Document, default_user=self.user, default_date=now)
+                bulk_create_with_history(logs, AuditLog, default_user=self.user, default_date=now)
+
+                return output_result_success(dict_representation={
+                    'batch_id': str(batch_id),
+                    'documents': [
+                        {'uuid': str(doc.id), 'original_filename': doc.original_filename}
+                        for doc in docs
+                    ],
+                })
+        except Exception as exc:
+            return output_exception(model_name='Document', method='upload_batch', exception=exc)
+
+    @check_authentication
+    @register_service_signal('claimlens.document.start_batch_processing')
+    def start_batch_processing(self, batch_id, bypass_cache=False):
+        """Start the pipelines of a batch's pending documents as one Celery group.
+
+        Task ids are assigned up front so the documents are updated first; the
+        group is only sent once that update commits, so no worker can pick up a
+        document whose status change is still uncommitted or rolled back.
+        """
+        try:
+            with transaction.atomic():
+                docs = list(
+                    Document.objects.select_for_update()
+                    .filter(batch_id=batch_id, status=Document.Status.PENDING, is_deleted=False)
+                )
+                if not docs:
+                    raise ValidationError(f"No pending documents in batch {batch_id}")
+
+                from celery import group
+                from claimlens.tasks import processing_pipeline
+
+                pipelines = group(processing_pipeline(doc, str(self.user.id), bypass_cache) for doc in docs)
+                result = pipelines.freeze()
+
+                now = py_datetime.now()
+                logs = []
+                for doc, doc_result in zip(docs, result.results):
+                    doc.status = Document.Status.PREPROCESSING
+                    doc.celery_task_id = doc_result.id
+                    doc.user_updated = self.user
+                    doc.date_updated = now
+                    doc.version += 1
+                    logs.append(AuditLog(
+                        document=doc,
+                        action=AuditLog.Action.STATUS_CHANGE,
+                        details={'from': Document.Status.PENDING, 'to': Document.Status.PREPROCESSING},
+                        **_history_fields(self.user, now),
+                    ))
+                bulk_update_with_history(
+                    docs, Document,
+                    ['status', 'celery_task_id', 'user_updated', 'date_updated', 'version'],
+                    default_user=self.user, default_date=now,
+                )
+                bulk_create_with_history(logs, AuditLog, default_user=self.user, default_date=now)
+
+                transaction.on_commit(lambda: self._dispatch_batch(batch_id, pipelines, docs))
+
+                return output_result_success(dict_representation={
+                    'batch_id': str(batch_id),
+                    'group_id': result.id,
+                    'started': len(docs),
+                })
+        except Exception as exc:
+            return output_exception(model_name='Document', method='start_batch_processing', exception=exc)
+
+    @staticmethod
+    def _dispatch_batch(batch_id, pipelines, docs):
+        from kombu import Connection
+
+        try:
+            broker_url = ClaimlensConfig.celery_broker_url
+            if broker_url:
+                with Connection(broker_url) as conn:
+                    pipelines.apply_async(connection=conn)
+            else:
+                pipelines.apply_async()
+        except Exception as exc:
+            # Put the documents back so the batch can be started again
+            logger.error("Failed to dispatch batch %s: %s", batch_id, exc)
+            Document.objects.filter(
+                id__in=[doc.id for doc in docs], status=Document.Status.PREPROCESSING,
+            ).update(status=Document.Status.PENDING, celery_task_id=None)
+
+    @staticmethod
+    def batch_progress(batch_id):
+        """Document counts per status of a batch, and the share that reached a final status."""
+        counts = dict(
+            Document.objects.filter(batch_id=batch_id, is_deleted=False)
+            .values_list('status')
+            .annotate(count=Count('id'))
+        )
+        total = sum(counts.values())
+        finished = sum(counts.get(status, 0) for status in BATCH_FINAL_STATUSES)
+        return {
+            'batch_id': str(batch_id),
+            'total': total,
+            'finished': finished,
+            'progress': round(finished / total, 4) if total else 0.0,
+            'statuses': counts,
+        }
+
     @staticmethod
     def update_status(doc, status, user, error_message=None):
         old_status = doc.status
@@ -237,6 +383,9 @@ class EngineCapabilityScoreService(BaseService):
         # Map processing_time_ms to speed score: <5s=100, >60s=0, linear between
         new_speed = max(0, min(100, int(100 - (processing_time_ms - 5000) / 550)))
 
+        # Feedback saves don't bump the routing version; workers pick the drift
+        # up when their routing table expires (engine_registry_ttl_seconds)
+        score._routing_feedback = True
         if created:
             score.accuracy_score = new_accuracy
             score.speed_score = new_speed
@@ -475,6 +624,7 @@ class PromptTemplateService:
                     change_summary=change_summary,
                 )
                 template.save(user=self.user)
+                transaction.on_commit(bump_prompt_version)
 
                 return output_result_success(dict_representation=model_representation(template))
         except Exception as exc:
@@ -495,6 +645,7 @@ class PromptTemplateService:
 
                 template.is_active = True
                 template.save(user=self.user)
+                transaction.on_commit(bump_prompt_version)
 
                 return output_result_success(dict_representation=model_representation(template))
         except Exception as exc:
@@ -513,6 +664,7 @@ class PromptTemplateService:
                 )
                 count = templates.count()
                 templates.update(is_deleted=True, is_active=False)
+                transaction.on_commit(bump_prompt_version)
 
                 return output_result_success(dict_representation={'deleted_count': count})
         except Exception as exc:
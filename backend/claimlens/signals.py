@@ -1,9 +1,11 @@
 import logging
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-from claimlens.models import Document
+from claimlens.models import (
+    Document, EngineConfig, EngineCapabilityScore, EngineRoutingRule, RoutingPolicy,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -53,3 +55,26 @@ def document_post_save(sender, instance, created, **kwargs):
 
     except Exception as e:
         logger.error("Failed to dispatch validation tasks for document %s: %s", instance.id, e)
+
+
+@receiver(post_save, sender=EngineConfig)
+@receiver(post_delete, sender=EngineConfig)
+def engine_config_changed(sender, instance, **kwargs):
+    """Force workers to reload their cached engine registry."""
+    from claimlens.engine.manager import bump_registry_version, ENGINES_SCOPE, ROUTING_SCOPE
+    bump_registry_version(ENGINES_SCOPE)
+    bump_registry_version(ROUTING_SCOPE)
+
+
+@receiver(post_save, sender=EngineCapabilityScore)
+@receiver(post_delete, sender=EngineCapabilityScore)
+@receiver(post_save, sender=EngineRoutingRule)
+@receiver(post_delete, sender=EngineRoutingRule)
+@receiver(post_save, sender=RoutingPolicy)
+@receiver(post_delete, sender=RoutingPolicy)
+def routing_config_changed(sender, instance, **kwargs):
+    """Routing inputs changed; engine instances themselves stay valid."""
+    if getattr(instance, '_routing_feedback', False):
+        return
+    from claimlens.engine.manager import bump_registry_version, ROUTING_SCOPE
+    bump_registry_version(ROUTING_SCOPE)
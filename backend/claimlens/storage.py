@@ -1,3 +1,4 @@
+import hashlib
 import logging
 from io import BytesIO
 
@@ -5,28 +6,56 @@ from django.core.files.base import ContentFile
 from storages.backends.s3boto3 import S3Boto3Storage
 
 from claimlens.apps import ClaimlensConfig
+from claimlens.storage_cache import get_disk_cache
 
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_body(body, chunk_size):
+    try:
+        yield from body.iter_chunks(chunk_size)
+    finally:
+        body.close()
+
 
 class ClaimlensStorage:
 
     def __init__(self):
         self._storage = None
+        self._public_storage = None
+
+    @staticmethod
+    def _make_storage(endpoint_url):
+        return S3Boto3Storage(
+            bucket_name=ClaimlensConfig.storage_bucket_name,
+            endpoint_url=endpoint_url,
+            access_key=ClaimlensConfig.storage_access_key,
+            secret_key=ClaimlensConfig.storage_secret_key,
+            default_acl=None,
+            file_overwrite=False,
+        )
 
     @property
     def storage(self):
         if self._storage is None:
-            self._storage = S3Boto3Storage(
-                bucket_name=ClaimlensConfig.storage_bucket_name,
-                endpoint_url=ClaimlensConfig.storage_endpoint_url,
-                access_key=ClaimlensConfig.storage_access_key,
-                secret_key=ClaimlensConfig.storage_secret_key,
-                default_acl=None,
-                file_overwrite=False,
-            )
+            self._storage = self._make_storage(ClaimlensConfig.storage_endpoint_url)
         return self._storage
 
+    @property
+    def public_storage(self):
+        # Presigned URLs sign the host, so they must be made for the endpoint browsers reach
+        if not ClaimlensConfig.storage_public_endpoint_url:
+            return self.storage
+        if self._public_storage is None:
+            self._public_storage = self._make_storage(ClaimlensConfig.storage_public_endpoint_url)
+        return self._public_storage
+
+    @property
+    def client(self):
+        return self.storage.connection.meta.client
+
     def save(self, key, content, content_type=None):
         if isinstance(content, bytes):
             file_obj = ContentFile(content)
@@ -35,25 +64,121 @@ class ClaimlensStorage:
         else:
             file_obj = ContentFile(content)
 
-        self.storage.save(key, file_obj)
-        logger.info("Saved object: %s", key)
+        name = self.storage.save(key, file_obj)
+        logger.info("Saved object: %s", name)
+        # Renders and text layers are read back by the next stage, often on this host
+        disk_cache = get_disk_cache()
+        if disk_cache and isinstance(content, bytes):
+            disk_cache.put(name, content)
+        return name
 
     def read(self, key):
+        disk_cache = get_disk_cache()
+        if disk_cache:
+            data = disk_cache.get(key)
+            if data is not None:
+                return data
         f = self.storage.open(key, 'rb')
         data = f.read()
         f.close()
+        if disk_cache:
+            disk_cache.put(key, data)
         return data
 
     def delete(self, key):
         self.storage.delete(key)
+        disk_cache = get_disk_cache()
+        if disk_cache:
+            disk_cache.delete(key)
         logger.info("Deleted object: %s", key)
 
     def exists(self, key):
         return self.storage.exists(key)
 
+    def stat(self, key):
+        """Return ``(size, etag)`` of an object without reading it."""
+        head = self.client.head_object(Bucket=self.storage.bucket_name, Key=key)
+        return head['ContentLength'], head['ETag']
+
+    def stream(self, key, start=None, end=None, chunk_size=None):
+        """Iterate over an object's bytes ``start``..``end`` (inclusive) without buffering it.
+
+        The object is requested before returning, so a missing key or an
+        unreachable store raises here rather than halfway through a response.
+        """
+        params = {'Bucket': self.storage.bucket_name, 'Key': key}
+        if start is not None:
+            params['Range'] = f"bytes={start}-{'' if end is None else end}"
+        body = self.client.get_object(**params)['Body']
+        return _iter_body(body, chunk_size or STREAM_CHUNK_SIZE)
+
+    def presigned_url(self, key, expires_in, filename=None, content_type=None):
+        """Short-lived URL from which a client downloads the object directly."""
+        params = {'Bucket': self.storage.bucket_name, 'Key': key}
+        if filename:
+            params['ResponseContentDisposition'] = f'inline; filename="{filename}"'
+        if content_type:
+            params['ResponseContentType'] = content_type
+        return self.public_storage.connection.meta.client.generate_presigned_url(
+            'get_object', Params=params, ExpiresIn=expires_in,
+        )
+
+    def presigned_upload_url(self, key, expires_in, content_type=None, content_length=None):
+        """Short-lived URL to which a client PUTs the object directly.
+
+        The content type and length are signed in, so storage rejects a PUT
+        of any other size rather than accepting it until confirmation.
+        """
+        params = {'Bucket': self.storage.bucket_name, 'Key': key}
+        if content_type:
+            params['ContentType'] = content_type
+        if content_length is not None:
+            params['ContentLength'] = content_length
+        return self.public_storage.connection.meta.client.generate_presigned_url(
+            'put_object', Params=params, ExpiresIn=expires_in,
+        )
+
+    def sha256(self, key, chunk_size=None):
+        """Hex SHA-256 of an object, hashed as it streams from storage."""
+        digest = hashlib.sha256()
+        for chunk in self.stream(key, chunk_size=chunk_size):
+            digest.update(chunk)
+        return digest.hexdigest()
+
     def health_check(self):
         try:
             self.storage.connection
             return True
         except Exception:
             return False
+
+
+class BufferedStorage:
+    """Keeps every object read or written through it in memory, in front of a ClaimlensStorage.
+
+    Meant for the lifetime of one fused pipeline run, where later stages read
+    back the original and the renders the earlier stages just handled.
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._objects = {}
+
+    def save(self, key, content, content_type=None):
+        name = self._storage.save(key, content, content_type=content_type)
+        if isinstance(content, bytes):
+            self._objects[name] = content
+        return name
+
+    def read(self, key):
+        data = self._objects.get(key)
+        if data is None:
+            data = self._objects[key] = self._storage.read(key)
+        return data
+
+    def delete(self, key):
+        self._objects.pop(key, None)
+        self._storage.delete(key)
+
+    def exists(self, key):
+        return key in self._objects or self._storage.exists(key)
@@ -0,0 +1,215 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'claimlens:storage_cache:{name}'
+STATS_NAMES = ('hits', 'misses', 'corrupt')
+_DIGEST_SIZE = hashlib.sha256().digest_size
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class DiskCache:
+    """Size-limited LRU cache of storage objects on local disk, shared by the worker processes of a host.
+
+    Each entry is one file named after the storage key's hash, holding the
+    SHA-256 of the content followed by the content; an entry whose content
+    does not match is dropped and counted as corrupt. Entries are written to a
+    temporary file and renamed into place, so concurrent prefork children never
+    see a partial file. Reads refresh the entry's atime, and the least recently
+    used entries are evicted once the directory exceeds ``max_bytes``; each
+    process sweeps after writing a twentieth of that, so the overshoot stays
+    small.
+
+    Storage keys are never overwritten (uploads and renders get unique names),
+    so an entry stays valid until the object is deleted. ``delete`` only drops
+    this host's copy, so entries also expire ``max_age`` seconds after they
+    were written (their mtime), which bounds how long a deleted document
+    lingers on the other hosts. The directory holds document content and is
+    restricted to the worker user.
+    """
+
+    def __init__(self, directory, max_bytes, max_object_bytes=None, max_age=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes or max_bytes
+        self.max_age = max_age
+        self._written = 0
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.chmod(directory, 0o700)
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                written_at = os.fstat(f.fileno()).st_mtime
+                blob = f.read()
+        except OSError:
+            _count('misses')
+            return None
+        if self._expired(written_at):
+            self._remove(path)
+            _count('misses')
+            return None
+        digest, data = blob[:_DIGEST_SIZE], blob[_DIGEST_SIZE:]
+        if hashlib.sha256(data).digest() != digest:
+            logger.warning("Dropping corrupt storage cache entry for %s", key)
+            self._remove(path)
+            _count('corrupt')
+            _count('misses')
+            return None
+        try:
+            os.utime(path, (time.time(), written_at))
+        except OSError:
+            pass
+        _count('hits')
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_object_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(hashlib.sha256(data).digest())
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Storage cache write failed for %s: %s", key, e)
+            return
+        self._written += len(data)
+        if self._written >= self.max_bytes // 20:
+            self._written = 0
+            self.evict()
+
+    def delete(self, key):
+        self._remove(self._path(key))
+
+    def evict(self):
+        """Remove expired entries, then least recently used ones until the cache fits ``max_bytes``.
+
+        One process sweeps at a time; the others skip the sweep rather than wait.
+        """
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            if fcntl:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+            entries, total = self._entries()
+            live = []
+            for entry in entries:
+                if self._expired(entry[1]):
+                    self._remove(entry[3])
+                    total -= entry[2]
+                else:
+                    live.append(entry)
+            if total <= self.max_bytes:
+                return
+            for atime, mtime, size, path in sorted(live):
+                self._remove(path)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def _expired(self, written_at):
+        return bool(self.max_age) and time.time() - written_at > self.max_age
+
+    def _entries(self):
+        entries = []
+        total = 0
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.startswith('.tmp-'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_atime, stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        return entries, total
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _count(name):
+    # Shared across workers through the Django cache; counting must never fail a read
+    from django.core.cache import cache
+    key = STATS_KEY.format(name=name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+    except Exception:
+        pass
+
+
+def get_disk_cache():
+    """Return this process's DiskCache, or None when the storage cache is disabled.
+
+    The cache needs an explicit ``storage_cache_dir``; it is never placed in
+    the shared system temp directory.
+    """
+    global _cache
+    from claimlens.apps import ClaimlensConfig
+
+    if not ClaimlensConfig.storage_cache_enabled:
+        return None
+    if not ClaimlensConfig.storage_cache_dir:
+        logger.warning("storage_cache_enabled is set without storage_cache_dir; storage cache disabled")
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskCache(
+                    ClaimlensConfig.storage_cache_dir,
+                    max_bytes=(ClaimlensConfig.storage_cache_max_mb or 512) * 1024 * 1024,
+                    max_object_bytes=(ClaimlensConfig.storage_cache_max_object_mb or 50) * 1024 * 1024,
+                    max_age=(ClaimlensConfig.storage_cache_max_age_hours or 24) * 3600,
+                )
+    return _cache
+
+
+def reset_disk_cache():
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def get_storage_cache_stats():
+    """Hit, miss and corrupt-entry counts of every worker.
+
+    Disk usage is not reported: measuring it scans the whole cache directory,
+    which is too slow for the health endpoint.
+    """
+    from django.core.cache import cache
+
+    try:
+        counts = cache.get_many([STATS_KEY.format(name=name) for name in STATS_NAMES])
+    except Exception:
+        counts = {}
+    return {name: counts.get(STATS_KEY.format(name=name), 0) for name in STATS_NAMES}
@@ -1,264 +1,736 @@
+import json
 import logging
+import random
 
 from celery import shared_task
+from celery.signals import worker_process_shutdown, worker_shutdown
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from core.models import User
 
 logger = logging.getLogger(__name__)
 
+# Form titles and headings are near the top; the rest of the page adds nothing to hint matching
+HINT_TEXT_MAX_CHARS = 4000
 
-@shared_task(bind=True, max_retries=2)
-def preprocess_document(self, doc_uuid, user_id):
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def close_engine_clients(**kwargs):
+    """Close pooled LLM HTTP connections when a worker (or prefork child) exits."""
+    from claimlens.engine.base import close_all_clients
+    from claimlens.engine.event_loop import stop_event_loop
+    close_all_clients()
+    stop_event_loop()
+
+
+def _retry_countdown(retries):
+    """Exponential backoff with jitter between task retries, so a failing stage does not re-run at once."""
+    from claimlens.apps import ClaimlensConfig
+    base = ClaimlensConfig.celery_retry_backoff_seconds or 10
+    cap = ClaimlensConfig.celery_retry_max_backoff_seconds or 600
+    delay = min(cap, base * 2 ** retries)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _multipage_mode():
+    from claimlens.apps import ClaimlensConfig
+    return ClaimlensConfig.multipage_extraction_mode or 'off'
+
+
+def _store_render(storage, doc, file_bytes, metadata):
+    """Rasterise a PDF once and keep the page images next to the original for later stages.
+
+    Returns the PNG bytes of the rendered pages, or None when nothing was rendered.
+    """
+    from claimlens.apps import ClaimlensConfig
+    from claimlens.preprocessing import render_pdf_pages, render_storage_key, RENDER_MIME_TYPE
+
+    if doc.mime_type != 'application/pdf':
+        return None
+    max_pages = 1 if _multipage_mode() == 'off' else (ClaimlensConfig.multipage_max_pages or 10)
+    try:
+        pages = render_pdf_pages(file_bytes, max_pages=max_pages)
+        keys = [
+            storage.save(render_storage_key(doc.storage_key, n), png_bytes, content_type=RENDER_MIME_TYPE)
+            for n, png_bytes in enumerate(pages)
+        ]
+        if keys:
+            metadata['render_key'] = keys[0]
+            metadata['page_render_keys'] = keys
+            metadata['render_mime_type'] = RENDER_MIME_TYPE
+        return pages
+    except Exception as e:
+        # Engines rasterise the PDF themselves when no render is available
+        logger.warning("PDF render failed for document %s: %s", doc.id, e)
+        return None
+
+
+def _store_text_layer(storage, doc, file_bytes, metadata):
+    """Keep the PDF's embedded text so born-digital pages can skip vision entirely.
+
+    Returns the extracted per-page texts, or None when nothing was extracted.
+    """
+    from claimlens.apps import ClaimlensConfig
+    from claimlens.preprocessing import extract_pdf_text, is_text_layer_usable, text_layer_storage_key
+
+    if doc.mime_type != 'application/pdf' or (ClaimlensConfig.text_layer_mode or 'off') == 'off':
+        return None
+    max_pages = 1 if _multipage_mode() == 'off' else (ClaimlensConfig.multipage_max_pages or 10)
+    min_chars = ClaimlensConfig.text_layer_min_chars or 200
+    try:
+        pages = extract_pdf_text(file_bytes, max_pages=max_pages)
+        usable = [is_text_layer_usable(text, min_chars) for text in pages]
+        metadata['text_layer_pages'] = usable
+        if any(usable):
+            texts = [text if ok else None for text, ok in zip(pages, usable)]
+            metadata['text_layer_key'] = storage.save(
+                text_layer_storage_key(doc.storage_key),
+                json.dumps(texts).encode('utf-8'), content_type='application/json',
+            )
+        return pages
+    except Exception as e:
+        logger.warning("Text layer extraction failed for document %s: %s", doc.id, e)
+        return None
+
+
+def _store_language(doc, file_bytes, metadata, pages=None):
+    """Detect the document language before classification so it can be routed by language.
+
+    Uses the PDF text layer (extracting the first page if preprocessing did not);
+    scanned documents get ``default_document_language`` when one is configured.
+    """
+    from claimlens.apps import ClaimlensConfig
+    from claimlens.preprocessing import detect_language, extract_pdf_text
+
+    if doc.language:
+        # Given as a hint at upload
+        metadata['language'] = doc.language
+        metadata['language_source'] = 'hint'
+        return
+    if not ClaimlensConfig.language_detection_enabled:
+        return
+    detected = None
+    try:
+        if pages is None and doc.mime_type == 'application/pdf':
+            pages = extract_pdf_text(file_bytes, max_pages=1)
+        text = '\n'.join(page for page in pages or [] if page)
+        if text:
+            detected = detect_language(text, min_words=ClaimlensConfig.language_detection_min_words or 20)
+    except Exception as e:
+        logger.warning("Language detection failed for document %s: %s", doc.id, e)
+    if detected:
+        metadata['language'], metadata['language_confidence'] = detected
+        metadata['language_source'] = 'text_layer'
+    elif ClaimlensConfig.default_document_language:
+        metadata['language'] = ClaimlensConfig.default_document_language
+        metadata['language_source'] = 'default'
+
+
+def _first_page_text(doc, file_bytes):
+    """Embedded text of a PDF's first page, for when preprocessing keeps no text layer."""
+    from claimlens.preprocessing import extract_pdf_text
+
+    try:
+        return extract_pdf_text(file_bytes, max_pages=1)
+    except Exception as e:
+        logger.warning("First page text extraction failed for document %s: %s", doc.id, e)
+        return []
+
+
+def _store_hint_text(metadata, pages):
+    """Keep the first page's text for the keyword tier of local classification."""
+    from claimlens.apps import ClaimlensConfig
+
+    if ClaimlensConfig.local_classification_enabled and pages and pages[0]:
+        metadata['hint_text'] = pages[0][:HINT_TEXT_MAX_CHARS]
+
+
+def _store_perceptual_hash(doc, file_bytes, metadata, rendered_pages=None):
+    """Fingerprint the first page so later uploads of the same form can be classified locally.
+
+    PDFs are hashed from the first page ``_store_render`` already rasterised.
+    """
+    from claimlens.apps import ClaimlensConfig
+    from claimlens.preprocessing import perceptual_hash
+
+    if not ClaimlensConfig.local_classification_enabled:
+        return
+    try:
+        if doc.mime_type == 'application/pdf':
+            if not rendered_pages:
+                return
+            file_bytes = rendered_pages[0]
+        elif not doc.mime_type.startswith('image/'):
+            return
+        metadata['phash'] = perceptual_hash(file_bytes)
+    except Exception as e:
+        logger.warning("Perceptual hash failed for document %s: %s", doc.id, e)
+
+
+def _read_text_layer(storage, doc):
+    """Return the per-page text list (None for scanned pages), or None if there is no text layer."""
+    key = (doc.preprocessing_metadata or {}).get('text_layer_key')
+    if not key:
+        return None
+    try:
+        return json.loads(storage.read(key))
+    except Exception as e:
+        logger.warning("Text layer %s unavailable for document %s: %s", key, doc.id, e)
+        return None
+
+
+def _page_count(doc):
+    """Number of pages extraction sends separately (1 unless multi-page extraction applies)."""
+    if _multipage_mode() == 'off':
+        return 1
+    return max(len((doc.preprocessing_metadata or {}).get('page_render_keys') or []), 1)
+
+
+def _quality_score(doc):
+    """Source quality analyze_image measured at preprocessing, for the engines' image budgets."""
+    return (doc.preprocessing_metadata or {}).get('quality_score')
+
+
+def _read_page_inputs(storage, doc):
+    """Return [(bytes, mime_type), ...] per page, or None if the document is not multi-page.
+
+    Pages with a usable text layer are sent as text; scanned pages use their render.
+    """
+    from claimlens.preprocessing import TEXT_MIME_TYPE
+
+    metadata = doc.preprocessing_metadata or {}
+    if _page_count(doc) < 2:
+        return None
+    keys = metadata['page_render_keys']
+    mime_type = metadata.get('render_mime_type', 'image/png')
+    texts = _read_text_layer(storage, doc) or []
+    try:
+        pages = []
+        for n, key in enumerate(keys):
+            text = texts[n] if n < len(texts) else None
+            if text:
+                pages.append((text.encode('utf-8'), TEXT_MIME_TYPE))
+            else:
+                pages.append((storage.read(key), mime_type))
+        return pages
+    except Exception as e:
+        logger.warning("Page renders unavailable for document %s: %s", doc.id, e)
+        return None
+
+
+def _read_document_input(storage, doc):
+    """Return (bytes, mime_type) for the first page: its text layer, its render or the original."""
+    from claimlens.preprocessing import TEXT_MIME_TYPE
+
+    texts = _read_text_layer(storage, doc)
+    if texts and texts[0]:
+        return texts[0].encode('utf-8'), TEXT_MIME_TYPE
+
+    metadata = doc.preprocessing_metadata or {}
+    render_key = metadata.get('render_key')
+    if render_key:
+        try:
+            return storage.read(render_key), metadata.get('render_mime_type', 'image/png')
+        except Exception as e:
+            logger.warning("Render %s unavailable for document %s: %s", render_key, doc.id, e)
+    return storage.read(doc.storage_key), doc.mime_type
+
+
+@transaction.atomic
+def _store_extraction(doc, user, result, routed_config, fused=False):
+    """Persist a successful extraction response and move the document to its final status.
+
+    Atomic, so a failure leaves no ExtractionResult behind for a retry to skip over.
+    """
+    from claimlens.apps import ClaimlensConfig
+    from claimlens.models import Document, ExtractionResult, AuditLog
+    from claimlens.services import DocumentService
+
+    fields = result.data.get('fields', {})
+    field_confidences = {}
+    structured_data = {}
+    for k, v in fields.items():
+        field_confidences[k] = v.get('confidence', 0.0)
+        value = v.get('value')
+        if isinstance(value, list):
+            cleaned = []
+            for item in value:
+                if isinstance(item, dict):
+                    cleaned.append({ik: iv for ik, iv in item.items() if ik != 'confidence'})
+                else:
+                    cleaned.append(item)
+            structured_data[k] = cleaned
+        else:
+            structured_data[k] = value
+    aggregate_confidence = result.data.get('aggregate_confidence', result.confidence)
+    if result.truncated and 'aggregate_confidence' not in result.data:
+        # The cut-off answer never got to its aggregate; rate what was recovered
+        aggregate_confidence = sum(field_confidences.values()) / len(field_confidences) if fields else 0.0
+
+    extraction = ExtractionResult(
+        document=doc,
+        structured_data=structured_data,
+        field_confidences=field_confidences,
+        aggregate_confidence=aggregate_confidence,
+        raw_llm_response=result.raw_response,
+        processing_time_ms=result.processing_time_ms,
+        tokens_used=result.tokens_used,
+    )
+    extraction.save(user=user)
+
+    auto_threshold = ClaimlensConfig.auto_approve_threshold or 0.90
+    review_threshold = ClaimlensConfig.review_threshold or 0.60
+
+    if aggregate_confidence >= auto_threshold:
+        final_status = Document.Status.COMPLETED
+    elif aggregate_confidence >= review_threshold:
+        final_status = Document.Status.REVIEW_REQUIRED
+    else:
+        final_status = Document.Status.FAILED
+    # Fields past the cut-off are missing, so a truncated extraction always needs a reviewer
+    if result.truncated and final_status == Document.Status.COMPLETED:
+        final_status = Document.Status.REVIEW_REQUIRED
+
+    # Locally classified documents reach here without an engine; record the one that extracted
+    engine_config = routed_config or doc.engine_config
+    if engine_config is None:
+        from claimlens.engine.manager import get_engine_manager
+        engine_config = get_engine_manager().get_primary_engine_config()
+    if engine_config and engine_config != doc.engine_config:
+        doc.engine_config = engine_config
+        doc.save(user=user)
+
+    DocumentService.update_status(doc, final_status, user)
+
+    AuditLog(
+        document=doc,
+        action=AuditLog.Action.EXTRACT,
+        details={
+            'aggregate_confidence': aggregate_confidence,
+            'field_count': len(fields),
+            'final_status': final_status,
+            'engine': result.engine_name,
+            'tokens_used': result.tokens_used,
+            'processing_time_ms': result.processing_time_ms,
+            'routed': routed_config is not None,
+            'cached': result.cached,
+            'hedge': result.hedge,
+            'truncated': result.truncated,
+            'fused': fused,
+        },
+        engine_config=doc.engine_config,
+    ).save(user=user)
+
+    # Auto-update capability scores with extraction feedback (a cache hit says nothing new)
+    if doc.language and doc.engine_config and not result.cached:
+        from claimlens.services import EngineCapabilityScoreService
+        EngineCapabilityScoreService.record_extraction_result(
+            engine_config=doc.engine_config,
+            language=doc.language,
+            document_type=doc.document_type,
+            confidence=aggregate_confidence,
+            processing_time_ms=result.processing_time_ms,
+            user=user,
+        )
+
+    return final_status
+
+
+def _classify_locally(storage, doc, type_rows):
+    """Classify without an engine when the answer is already known or cheaply inferable.
+
+    Returns ``(code, confidence, method)`` or None when the local tier is
+    inconclusive: a type set by the uploader is trusted, then the text
+    of the first page is matched against the hint keywords, then its perceptual
+    hash against documents already classified with high confidence.
+    """
+    from claimlens.apps import ClaimlensConfig
+    from claimlens.classification import (
+        EXPLICIT, HINTS, PERCEPTUAL_HASH, match_hints, match_perceptual_hash,
+    )
+    from claimlens.models import AuditLog, Document
+
+    active_codes = {row['code'] for row in type_rows}
+    # A type without a classification confidence was set at upload, not by a classifier
+    explicit = doc.document_type if doc.document_type_id and doc.classification_confidence is None else None
+    if explicit and explicit.code in active_codes:
+        return doc.document_type.code, 1.0, EXPLICIT
+    if not ClaimlensConfig.local_classification_enabled:
+        return None
+
+    text = (doc.preprocessing_metadata or {}).get('hint_text')
+    if text is None:
+        # Preprocessed before the hint text was kept
+        texts = _read_text_layer(storage, doc)
+        text = texts[0] if texts else None
+    if text:
+        match = match_hints(
+            text, type_rows,
+            min_score=ClaimlensConfig.local_classification_hint_min_score or 0.6,
+            min_matches=ClaimlensConfig.local_classification_hint_min_matches or 2,
+        )
+        if match:
+            return match[0], match[1], HINTS
+
+    phash = (doc.preprocessing_metadata or {}).get('phash')
+    if phash:
+        # Only engine or uploader classifications seed matches, so a wrong local
+        # guess cannot spread to the near-duplicates of what it classified
+        local_guess = AuditLog.objects.filter(
+            document=OuterRef('pk'), action=AuditLog.Action.CLASSIFY,
+            details__method__in=[HINTS, PERCEPTUAL_HASH],
+        )
+        candidates = (
+            Document.objects
+            .filter(
+                is_deleted=False, document_type__isnull=False,
+                classification_confidence__gte=ClaimlensConfig.local_classification_phash_min_confidence or 0.9,
+                preprocessing_metadata__has_key='phash',
+            )
+            .exclude(id=doc.id)
+            .exclude(Exists(local_guess))
+            .order_by('-date_created')
+            .values_list('preprocessing_metadata__phash', 'document_type__code')
+            [:ClaimlensConfig.local_classification_phash_candidates or 1000]
+        )
+        match = match_perceptual_hash(
+            phash, [(other, code) for other, code in candidates if code in active_codes],
+            max_distance=ClaimlensConfig.local_classification_phash_max_distance or 6,
+            min_votes=ClaimlensConfig.local_classification_phash_min_votes or 3,
+        )
+        if match:
+            return match[0], ClaimlensConfig.local_classification_phash_min_confidence or 0.9, PERCEPTUAL_HASH
+    return None
+
+
+def _fused_document_types(type_rows):
+    """Document types for a fused classify+extract request, or None when fused mode does not apply.
+
+    Every type stays a classification candidate; only the types enabled for
+    fused mode (all of them with ``fused_classify_extract_enabled``) carry
+    their extraction template, and only while the templates fit the size limit.
+    """
+    from claimlens.apps import ClaimlensConfig
+
+    fuse_all = bool(ClaimlensConfig.fused_classify_extract_enabled)
+    fused_codes = {row['code'] for row in type_rows if fuse_all or row['fused_extraction']}
+    templates_size = sum(
+        len(json.dumps(row['extraction_template'])) for row in type_rows if row['code'] in fused_codes
+    )
+    if not fused_codes or templates_size > (ClaimlensConfig.fused_max_template_chars or 8000):
+        return None
+    return [
+        {
+            'code': row['code'],
+            'name': row['name'],
+            'classification_hints': row['classification_hints'],
+            'extraction_template': row['extraction_template'] if row['code'] in fused_codes else {},
+        }
+        for row in type_rows
+    ]
+
+
+def _record_failure(doc_uuid, user_id, stage, exc):
+    """Mark the document failed and audit the error; never raises."""
     from claimlens.models import Document, AuditLog
     from claimlens.services import DocumentService
-    from claimlens.storage import ClaimlensStorage
-    from claimlens.preprocessing import analyze_image
 
     try:
-        user = User.objects.get(id=user_id)
         doc = Document.objects.get(id=doc_uuid)
+        user = User.objects.get(id=user_id)
+        DocumentService.update_status(doc, Document.Status.FAILED, user, str(exc))
+        AuditLog(
+            document=doc,
+            action=AuditLog.Action.ERROR,
+            details={'stage': stage, 'error': str(exc)},
+        ).save(user=user)
+    except Exception:
+        pass
 
-        storage = ClaimlensStorage()
-        file_bytes = storage.read(doc.storage_key)
 
-        metadata = analyze_image(file_bytes, doc.mime_type)
-        doc.preprocessing_metadata = metadata
-        doc.save(user=user)
+def _preprocess(doc, user, storage):
+    from claimlens.models import AuditLog
+    from claimlens.preprocessing import analyze_image
+
+    file_bytes = storage.read(doc.storage_key)
+
+    metadata = analyze_image(file_bytes, doc.mime_type)
+    rendered_pages = _store_render(storage, doc, file_bytes, metadata)
+    pages = _store_text_layer(storage, doc, file_bytes, metadata)
+    if pages is None and doc.mime_type == 'application/pdf':
+        # Language detection and hint matching need the words even with the text layer off
+        pages = _first_page_text(doc, file_bytes)
+    _store_language(doc, file_bytes, metadata, pages)
+    _store_hint_text(metadata, pages)
+    _store_perceptual_hash(doc, file_bytes, metadata, rendered_pages)
+    doc.preprocessing_metadata = metadata
+    doc.save(user=user)
+
+    AuditLog(
+        document=doc,
+        action=AuditLog.Action.PREPROCESS,
+        details={key: value for key, value in metadata.items() if key != 'hint_text'},
+    ).save(user=user)
+
+
+def _classify(doc, user, storage, bypass_cache=False):
+    from claimlens.models import Document, DocumentType, AuditLog, ExtractionResult
+    from claimlens.services import DocumentService
+    from claimlens.engine.manager import get_engine_manager
+    from claimlens.preprocessing import source_quality
+
+    if ExtractionResult.objects.filter(document=doc).exists():
+        # A retry after a fused request already stored the fields
+        logger.info("Document %s already extracted by the fused classification request", doc.id)
+        return
+
+    DocumentService.update_status(doc, Document.Status.CLASSIFYING, user)
 
+    type_rows = list(
+        DocumentType.objects.filter(is_active=True, is_deleted=False).values(
+            'code', 'name', 'classification_hints', 'extraction_template', 'fused_extraction'
+        )
+    )
+
+    if not type_rows:
+        logger.warning("No document types configured, skipping classification")
+        return
+
+    # Detected at preprocessing; the engine's classification may still correct it
+    language = doc.language or (doc.preprocessing_metadata or {}).get('language')
+
+    local = _classify_locally(storage, doc, type_rows)
+    if local:
+        code, confidence, method = local
+        doc.document_type = DocumentType.objects.get(code=code, is_active=True, is_deleted=False)
+        doc.classification_confidence = confidence
+        doc.language = language
+        doc.save(user=user)
         AuditLog(
             document=doc,
-            action=AuditLog.Action.PREPROCESS,
-            details=metadata,
+            action=AuditLog.Action.CLASSIFY,
+            details={
+                'document_type_code': code,
+                'confidence': confidence,
+                'method': method,
+                'language': language,
+                'engine': None,
+                'tokens_used': 0,
+            },
         ).save(user=user)
+        logger.info("Document %s classified locally as %s (%s)", doc.id, code, method)
+        return
+
+    file_bytes, mime_type = _read_document_input(storage, doc)
+    manager = get_engine_manager()
+    document_type_code = doc.document_type.code if doc.document_type else None
+    # Fused requests carry one input; multi-page documents keep their per-page extraction
+    fused_types = _fused_document_types(type_rows) if _page_count(doc) < 2 else None
+    quality_token = source_quality.set(_quality_score(doc))
+    try:
+        if fused_types:
+            result, routed_config = manager.classify_extract_routed(
+                file_bytes, mime_type, fused_types, language=language,
+                document_type_code=document_type_code, use_cache=not bypass_cache,
+            )
+        else:
+            doc_types = [
+                {'code': row['code'], 'name': row['name'], 'classification_hints': row['classification_hints']}
+                for row in type_rows
+            ]
+            result, routed_config = manager.classify_routed(
+                file_bytes, mime_type, doc_types, language=language,
+                document_type_code=document_type_code, use_cache=not bypass_cache,
+            )
+    finally:
+        source_quality.reset(quality_token)
+
+    if not result.success:
+        logger.warning("Classification failed: %s", result.error)
+        return
+
+    code = result.data.get('document_type_code')
+    detected_language = result.data.get('language') or language
+
+    doc_type = DocumentType.objects.filter(
+        code=code, is_active=True, is_deleted=False
+    ).first()
+
+    if doc_type:
+        doc.document_type = doc_type
+        doc.classification_confidence = result.confidence
+    if detected_language:
+        doc.language = detected_language
+    doc.engine_config = routed_config or manager.get_primary_engine_config()
+    doc.save(user=user)
+
+    AuditLog(
+        document=doc,
+        action=AuditLog.Action.CLASSIFY,
+        details={
+            'document_type_code': code,
+            'confidence': result.confidence,
+            'method': 'engine',
+            'language': detected_language,
+            'engine': result.engine_name,
+            'tokens_used': result.tokens_used,
+            'routed': routed_config is not None,
+            'cached': result.cached,
+            'hedge': result.hedge,
+            'fused': fused_types is not None,
+        },
+        engine_config=doc.engine_config,
+    ).save(user=user)
+
+    # Fused mode: the same response carries the fields, so extraction is done here
+    fused_codes = {dt['code'] for dt in fused_types or [] if dt['extraction_template']}
+    if doc_type and doc_type.code in fused_codes and result.data.get('fields'):
+        _store_extraction(doc, user, result, routed_config, fused=True)
+
+
+def _extract(doc, user, storage, bypass_cache=False):
+    """Run extraction; return the final status, or None if the document was already extracted."""
+    from claimlens.models import Document, ExtractionResult, AuditLog
+    from claimlens.services import DocumentService
+    from claimlens.engine.manager import get_engine_manager
+    from claimlens.preprocessing import source_quality
 
-        logger.info("Preprocessing complete for document %s", doc_uuid)
-        return str(doc_uuid)
+    if ExtractionResult.objects.filter(document=doc).exists():
+        logger.info("Document %s already extracted by the fused classification request", doc.id)
+        return None
 
-    except Exception as exc:
-        logger.error("Preprocessing failed for %s: %s", doc_uuid, exc)
-        try:
-            doc = Document.objects.get(id=doc_uuid)
-            user = User.objects.get(id=user_id)
-            DocumentService.update_status(doc, Document.Status.FAILED, user, str(exc))
-            AuditLog(
-                document=doc,
-                action=AuditLog.Action.ERROR,
-                details={'stage': 'preprocessing', 'error': str(exc)},
-            ).save(user=user)
-        except Exception:
-            pass
-        raise self.retry(exc=exc)
+    DocumentService.update_status(doc, Document.Status.EXTRACTING, user)
+
+    pages = _read_page_inputs(storage, doc)
+
+    extraction_template = {}
+    if doc.document_type and doc.document_type.extraction_template:
+        extraction_template = doc.document_type.extraction_template
+
+    doc_type_code = doc.document_type.code if doc.document_type else None
+    manager = get_engine_manager()
+    quality_token = source_quality.set(_quality_score(doc))
+    try:
+        if pages:
+            result, routed_config = manager.extract_pages_routed(
+                pages, extraction_template, mode=_multipage_mode(),
+                language=doc.language, document_type=doc.document_type,
+                document_type_code=doc_type_code, use_cache=not bypass_cache,
+            )
+        else:
+            file_bytes, mime_type = _read_document_input(storage, doc)
+            result, routed_config = manager.extract_routed(
+                file_bytes, mime_type, extraction_template,
+                language=doc.language, document_type=doc.document_type,
+                document_type_code=doc_type_code, use_cache=not bypass_cache,
+            )
+    finally:
+        source_quality.reset(quality_token)
+
+    if not result.success:
+        DocumentService.update_status(doc, Document.Status.FAILED, user, result.error)
+        AuditLog(
+            document=doc,
+            action=AuditLog.Action.ERROR,
+            details={'stage': 'extraction', 'error': result.error},
+        ).save(user=user)
+        return Document.Status.FAILED
+
+    return _store_extraction(doc, user, result, routed_config)
 
 
 @shared_task(bind=True, max_retries=2)
-def classify_document(self, doc_uuid, user_id):
-    from claimlens.models import Document, DocumentType, AuditLog
-    from claimlens.services import DocumentService
+def preprocess_document(self, doc_uuid, user_id):
+    from claimlens.models import Document
     from claimlens.storage import ClaimlensStorage
-    from claimlens.engine.manager import EngineManager
 
     try:
         user = User.objects.get(id=user_id)
         doc = Document.objects.get(id=doc_uuid)
 
-        DocumentService.update_status(doc, Document.Status.CLASSIFYING, user)
+        _preprocess(doc, user, ClaimlensStorage())
 
-        storage = ClaimlensStorage()
-        file_bytes = storage.read(doc.storage_key)
+        logger.info("Preprocessing complete for document %s", doc_uuid)
+        return str(doc_uuid)
 
-        doc_types = list(
-            DocumentType.objects.filter(is_active=True, is_deleted=False).values(
-                'code', 'name', 'classification_hints'
-            )
-        )
+    except Exception as exc:
+        logger.error("Preprocessing failed for %s: %s", doc_uuid, exc)
+        _record_failure(doc_uuid, user_id, 'preprocessing', exc)
+        raise self.retry(exc=exc, countdown=_retry_countdown(self.request.retries))
 
-        if not doc_types:
-            logger.warning("No document types configured, skipping classification")
-            return str(doc_uuid)
 
-        manager = EngineManager()
-        result, routed_config = manager.classify_routed(
-            file_bytes, doc.mime_type, doc_types,
-            document_type_code=doc.document_type.code if doc.document_type else None,
-        )
+@shared_task(bind=True, max_retries=2)
+def classify_document(self, doc_uuid, user_id, bypass_cache=False):
+    from claimlens.models import Document
+    from claimlens.storage import ClaimlensStorage
 
-        if result.success:
-            code = result.data.get('document_type_code')
-            detected_language = result.data.get('language')
-
-            doc_type = DocumentType.objects.filter(
-                code=code, is_active=True, is_deleted=False
-            ).first()
-
-            if doc_type:
-                doc.document_type = doc_type
-                doc.classification_confidence = result.confidence
-            if detected_language:
-                doc.language = detected_language
-            doc.engine_config = routed_config or manager.get_primary_engine_config()
-            doc.save(user=user)
-
-            AuditLog(
-                document=doc,
-                action=AuditLog.Action.CLASSIFY,
-                details={
-                    'document_type_code': code,
-                    'confidence': result.confidence,
-                    'language': detected_language,
-                    'engine': result.engine_name,
-                    'tokens_used': result.tokens_used,
-                    'routed': routed_config is not None,
-                },
-                engine_config=doc.engine_config,
-            ).save(user=user)
-        else:
-            logger.warning("Classification failed: %s", result.error)
+    try:
+        user = User.objects.get(id=user_id)
+        doc = Document.objects.get(id=doc_uuid)
+
+        _classify(doc, user, ClaimlensStorage(), bypass_cache)
 
         logger.info("Classification complete for document %s", doc_uuid)
         return str(doc_uuid)
 
     except Exception as exc:
         logger.error("Classification failed for %s: %s", doc_uuid, exc)
-        try:
-            doc = Document.objects.get(id=doc_uuid)
-            user = User.objects.get(id=user_id)
-            DocumentService.update_status(doc, Document.Status.FAILED, user, str(exc))
-            AuditLog(
-                document=doc,
-                action=AuditLog.Action.ERROR,
-                details={'stage': 'classification', 'error': str(exc)},
-            ).save(user=user)
-        except Exception:
-            pass
-        raise self.retry(exc=exc)
+        _record_failure(doc_uuid, user_id, 'classification', exc)
+        raise self.retry(exc=exc, countdown=_retry_countdown(self.request.retries))
 
 
 @shared_task(bind=True, max_retries=2)
-def extract_document(self, doc_uuid, user_id):
-    from claimlens.models import Document, ExtractionResult, AuditLog
-    from claimlens.services import DocumentService
+def extract_document(self, doc_uuid, user_id, bypass_cache=False):
+    from claimlens.models import Document
     from claimlens.storage import ClaimlensStorage
-    from claimlens.engine.manager import EngineManager
-    from claimlens.apps import ClaimlensConfig
 
     try:
         user = User.objects.get(id=user_id)
         doc = Document.objects.get(id=doc_uuid)
 
-        DocumentService.update_status(doc, Document.Status.EXTRACTING, user)
+        final_status = _extract(doc, user, ClaimlensStorage(), bypass_cache)
 
-        storage = ClaimlensStorage()
-        file_bytes = storage.read(doc.storage_key)
-
-        extraction_template = {}
-        if doc.document_type and doc.document_type.extraction_template:
-            extraction_template = doc.document_type.extraction_template
-
-        doc_type_code = doc.document_type.code if doc.document_type else None
-        manager = EngineManager()
-        result, routed_config = manager.extract_routed(
-            file_bytes, doc.mime_type, extraction_template,
-            language=doc.language, document_type=doc.document_type,
-            document_type_code=doc_type_code,
-        )
-
-        if not result.success:
-            DocumentService.update_status(doc, Document.Status.FAILED, user, result.error)
-            AuditLog(
-                document=doc,
-                action=AuditLog.Action.ERROR,
-                details={'stage': 'extraction', 'error': result.error},
-            ).save(user=user)
-            return str(doc_uuid)
-
-        fields = result.data.get('fields', {})
-        field_confidences = {}
-        structured_data = {}
-        for k, v in fields.items():
-            field_confidences[k] = v.get('confidence', 0.0)
-            value = v.get('value')
-            if isinstance(value, list):
-                cleaned = []
-                for item in value:
-                    if isinstance(item, dict):
-                        cleaned.append({ik: iv for ik, iv in item.items() if ik != 'confidence'})
-                    else:
-                        cleaned.append(item)
-                structured_data[k] = cleaned
-            else:
-                structured_data[k] = value
-        aggregate_confidence = result.data.get('aggregate_confidence', result.confidence)
-
-        extraction = ExtractionResult(
-            document=doc,
-            structured_data=structured_data,
-            field_confidences=field_confidences,
-            aggregate_confidence=aggregate_confidence,
-            raw_llm_response=result.raw_response,
-            processing_time_ms=result.processing_time_ms,
-            tokens_used=result.tokens_used,
-        )
-        extraction.save(user=user)
+        if final_status:
+            logger.info("Extraction complete for document %s → %s", doc_uuid, final_status)
+        return str(doc_uuid)
 
-        auto_threshold = ClaimlensConfig.auto_approve_threshold or 0.90
-        review_threshold = ClaimlensConfig.review_threshold or 0.60
+    except Exception as exc:
+        logger.error("Extraction failed for %s: %s", doc_uuid, exc)
+        _record_failure(doc_uuid, user_id, 'extraction', exc)
+        raise self.retry(exc=exc, countdown=_retry_countdown(self.request.retries))
 
-        if aggregate_confidence >= auto_threshold:
-            final_status = Document.Status.COMPLETED
-        elif aggregate_confidence >= review_threshold:
-            final_status = Document.Status.REVIEW_REQUIRED
-        else:
-            final_status = Document.Status.FAILED
 
-        if routed_config and routed_config != doc.engine_config:
-            doc.engine_config = routed_config
-            doc.save(user=user)
+@shared_task(bind=True, max_retries=2)
+def process_document(self, doc_uuid, user_id, bypass_cache=False):
+    """Fused pipeline: preprocess, classify and extract in one task.
 
-        DocumentService.update_status(doc, final_status, user)
+    The user and document are loaded once and every object read or written
+    in storage (original, renders, text layer) stays in memory, so the file
+    is downloaded once and there are no broker hops between the stages.
+    """
+    from claimlens.models import Document
+    from claimlens.storage import ClaimlensStorage, BufferedStorage
 
-        AuditLog(
-            document=doc,
-            action=AuditLog.Action.EXTRACT,
-            details={
-                'aggregate_confidence': aggregate_confidence,
-                'field_count': len(fields),
-                'final_status': final_status,
-                'engine': result.engine_name,
-                'tokens_used': result.tokens_used,
-                'processing_time_ms': result.processing_time_ms,
-                'routed': routed_config is not None,
-            },
-            engine_config=doc.engine_config,
-        ).save(user=user)
+    stage = 'preprocessing'
+    try:
+        user = User.objects.get(id=user_id)
+        doc = Document.objects.get(id=doc_uuid)
+        storage = BufferedStorage(ClaimlensStorage())
 
-        # Auto-update capability scores with extraction feedback
-        if doc.language:
-            from claimlens.services import EngineCapabilityScoreService
-            EngineCapabilityScoreService.record_extraction_result(
-                engine_config=doc.engine_config,
-                language=doc.language,
-                document_type=doc.document_type,
-                confidence=aggregate_confidence,
-                processing_time_ms=result.processing_time_ms,
-                user=user,
-            )
+        _preprocess(doc, user, storage)
+        stage = 'classification'
+        _classify(doc, user, storage, bypass_cache)
+        stage = 'extraction'
+        final_status = _extract(doc, user, storage, bypass_cache)
 
-        logger.info("Extraction complete for document %s → %s", doc_uuid, final_status)
+        logger.info("Fused pipeline complete for document %s → %s", doc_uuid, final_status or doc.status)
         return str(doc_uuid)
 
     except Exception as exc:
-        logger.error("Extraction failed for %s: %s", doc_uuid, exc)
-        try:
-            doc = Document.objects.get(id=doc_uuid)
-            user = User.objects.get(id=user_id)
-            DocumentService.update_status(doc, Document.Status.FAILED, user, str(exc))
-            AuditLog(
-                document=doc,
-                action=AuditLog.Action.ERROR,
-                details={'stage': 'extraction', 'error': str(exc)},
-            ).save(user=user)
-        except Exception:
-            pass
-        raise self.retry(exc=exc)
+        logger.error("Fused pipeline failed at %s for %s: %s", stage, doc_uuid, exc)
+        _record_failure(doc_uuid, user_id, stage, exc)
+        raise self.retry(exc=exc, countdown=_retry_countdown(self.request.retries))
 
 
 @shared_task(bind=True, max_retries=1)
@@ -278,7 +750,7 @@ def validate_upstream(self, doc_uuid, user_id):
 
     except Exception as exc:
         logger.error("Upstream validation failed for %s: %s", doc_uuid, exc)
-        raise self.retry(exc=exc)
+        raise self.retry(exc=exc, countdown=_retry_countdown(self.request.retries))
 
 
 @shared_task(bind=True, max_retries=1)
@@ -298,22 +770,62 @@ def validate_downstream(self, doc_uuid, user_id):
 
     except Exception as exc:
         logger.error("Downstream validation failed for %s: %s", doc_uuid, exc)
-        raise self.retry(exc=exc)
+        raise self.retry(exc=exc, countdown=_retry_countdown(self.request.retries))
 
 
 @shared_task(bind=True, max_retries=2)
-def run_processing_pipeline(self, doc_uuid, user_id):
+def delete_unconfirmed_upload(self, storage_key):
+    """Delete a direct upload whose token expired without it being confirmed."""
+    from claimlens.models import Document
+    from claimlens.storage import ClaimlensStorage
+
+    if Document.objects.filter(storage_key=storage_key).exists():
+        return
+    try:
+        storage = ClaimlensStorage()
+        if storage.exists(storage_key):
+            storage.delete(storage_key)
+            logger.info("Deleted unconfirmed upload %s", storage_key)
+    except Exception as exc:
+        logger.error("Failed to delete unconfirmed upload %s: %s", storage_key, exc)
+        raise self.retry(exc=exc, countdown=_retry_countdown(self.request.retries))
+
+
+def processing_pipeline(doc, user_id, bypass_cache=False):
+    """Celery signature processing ``doc``: the three-queue chain, or the fused task.
+
+    ``processing_pipeline_mode`` "chain" keeps one queue per stage so each can
+    be scaled on its own, "fused" runs every stage in one extraction worker,
+    and "auto" fuses documents up to ``fused_pipeline_max_file_size_mb``.
+    """
     from celery import chain
-    pipeline = chain(
+    from claimlens.apps import ClaimlensConfig
+
+    doc_id = str(doc.id)
+    mode = ClaimlensConfig.processing_pipeline_mode or 'chain'
+    if mode == 'auto':
+        max_bytes = (ClaimlensConfig.fused_pipeline_max_file_size_mb or 2) * 1024 * 1024
+        mode = 'fused' if doc.file_size <= max_bytes else 'chain'
+    if mode == 'fused':
+        return process_document.signature(
+            args=(doc_id, user_id), kwargs={'bypass_cache': bypass_cache}, queue='claimlens.extraction',
+        )
+    return chain(
         preprocess_document.signature(
-            args=(doc_uuid, user_id), queue='claimlens.preprocessing'
+            args=(doc_id, user_id), queue='claimlens.preprocessing'
         ),
         classify_document.signature(
-            args=(user_id,), queue='claimlens.classification'
+            args=(user_id,), kwargs={'bypass_cache': bypass_cache}, queue='claimlens.classification'
         ),
         extract_document.signature(
-            args=(user_id,), queue='claimlens.extraction'
+            args=(user_id,), kwargs={'bypass_cache': bypass_cache}, queue='claimlens.extraction'
         ),
     )
+
+
+@shared_task(bind=True, max_retries=2)
+def run_processing_pipeline(self, doc_uuid, user_id, bypass_cache=False):
+    from claimlens.models import Document
+    pipeline = processing_pipeline(Document.objects.get(id=doc_uuid), user_id, bypass_cache)
     pipeline.apply_async()
     logger.info("Processing pipeline started for document %s", doc_uuid)
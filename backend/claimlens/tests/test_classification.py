@@ -0,0 +1,48 @@
+from django.test import TestCase
+
+from claimlens.classification import hint_keywords, match_hints, match_perceptual_hash
+
+
+class HintMatchTest(TestCase):
+
+    document_types = [
+        {'code': 'CLAIM_FORM', 'classification_hints': '"Claim Form", "Patient ID", "Diagnosis"'},
+        {'code': 'INVOICE', 'classification_hints': 'invoice number, total due, vat'},
+        {'code': 'PRESCRIPTION', 'classification_hints': 'medical prescription document with dosage instructions'},
+    ]
+
+    def test_hint_keywords(self):
+        self.assertEqual(hint_keywords('"Claim  Form", \'Patient ID\''), ['claim form', 'patient id'])
+        self.assertEqual(hint_keywords('invoice number, total due'), ['invoice number', 'total due'])
+        # Sentences are descriptions for the LLM, not keywords
+        self.assertEqual(hint_keywords('medical prescription document with dosage instructions'), [])
+
+    def test_single_type_matches(self):
+        text = '[72,90] HEALTH CLAIM FORM\n[72,120] Patient ID: 123\n[72,150] Diagnosis: flu'
+        self.assertEqual(match_hints(text, self.document_types), ('CLAIM_FORM', 1.0))
+
+    def test_ambiguous_text_is_inconclusive(self):
+        text = 'Claim Form Patient ID Invoice number Total due VAT'
+        self.assertIsNone(match_hints(text, self.document_types))
+
+    def test_too_few_keywords_is_inconclusive(self):
+        self.assertIsNone(match_hints('Claim form', self.document_types))
+
+
+class PerceptualHashMatchTest(TestCase):
+
+    def test_near_duplicates_agree(self):
+        candidates = [('ffff0000ffff0000', 'CLAIM_FORM'), ('ffff0000ffff0001', 'CLAIM_FORM'),
+                      ('0000ffff0000ffff', 'INVOICE')]
+        self.assertEqual(match_perceptual_hash('ffff0000ffff0003', candidates, min_votes=2), ('CLAIM_FORM', 2))
+
+    def test_too_few_votes_is_inconclusive(self):
+        candidates = [('ffff0000ffff0000', 'CLAIM_FORM'), ('ffff0000ffff0001', 'CLAIM_FORM')]
+        self.assertIsNone(match_perceptual_hash('ffff0000ffff0003', candidates))
+
+    def test_conflicting_neighbours_are_inconclusive(self):
+        candidates = [('ffff0000ffff0000', 'CLAIM_FORM'), ('ffff0000ffff0001', 'INVOICE')]
+        self.assertIsNone(match_perceptual_hash('ffff0000ffff0000', candidates))
+
+    def test_no_neighbours(self):
+        self.assertIsNone(match_perceptual_hash('ffff0000ffff0000', [('0000ffff0000ffff', 'INVOICE')]))
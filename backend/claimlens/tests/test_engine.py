@@ -1,13 +1,34 @@
+import time
 from unittest.mock import patch, MagicMock
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-from claimlens.engine.base import ADAPTER_REGISTRY
+from claimlens.engine.base import ADAPTER_REGISTRY, BaseLLMEngine, close_all_clients
 from claimlens.engine.types import LLMResponse
-from claimlens.engine.manager import EngineManager
+import claimlens.engine.manager as manager_module
+from claimlens.engine.manager import (
+    EngineManager, get_engine_manager, bump_registry_version, ENGINES_SCOPE, ROUTING_SCOPE,
+)
 from claimlens.engine.adapters.openai_compatible import OpenAICompatibleEngine
 from claimlens.tests.data import ClaimlensTestDataMixin
 
 
+class MinimalEngine(BaseLLMEngine):
+    """Adapter implementing only the required methods, to exercise the base class defaults."""
+
+    def classify(self, image_bytes, mime_type, document_types, document_type_code=None):
+        return LLMResponse(
+            success=True, data={'document_type_code': 'CLAIM_FORM'}, confidence=0.9,
+            tokens_used=5, processing_time_ms=50, engine_name=self.name,
+        )
+
+    def extract(self, image_bytes, mime_type, extraction_template, document_type_code=None):
+        item = {'code': image_bytes.decode()}
+        return LLMResponse(
+            success=True, engine_name=self.name, tokens_used=10, processing_time_ms=100,
+            data={'fields': {'items': {'value': [item], 'confidence': 0.9}}, 'aggregate_confidence': 0.9},
+        )
+
+
 class AdapterRegistryTest(TestCase):
 
     def test_all_adapters_registered(self):
@@ -80,6 +101,57 @@ class OpenAICompatibleEngineTest(TestCase, ClaimlensTestDataMixin):
         self.assertIsNotNone(result.error)
 
 
+class PooledClientTest(TestCase):
+
+    def setUp(self):
+        self.engine = OpenAICompatibleEngine({
+            'name': 'test-pooled',
+            'endpoint_url': 'https://openrouter.ai/api',
+            'api_key': 'test-key',
+            'model_name': 'test-model',
+            'pool_max_connections': 5,
+            'pool_max_keepalive_connections': 2,
+        })
+
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_client_reused_across_calls(self, mock_client_cls):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '{"document_type_code": "CLAIM_FORM", "confidence": 0.9}'}}],
+            'usage': {'total_tokens': 10},
+        }
+        mock_client = MagicMock()
+        mock_client.is_closed = False
+        mock_client.post.return_value = mock_response
+        mock_client_cls.return_value = mock_client
+
+        self.engine.classify(b'img', 'image/jpeg', [])
+        self.engine.classify(b'img', 'image/jpeg', [])
+        self.engine.health_check()
+
+        self.assertEqual(mock_client_cls.call_count, 1)
+        self.assertEqual(mock_client.post.call_count, 2)
+        limits = mock_client_cls.call_args.kwargs['limits']
+        self.assertEqual(limits.max_connections, 5)
+        self.assertEqual(limits.max_keepalive_connections, 2)
+
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_close_all_clients(self, mock_client_cls):
+        mock_client = MagicMock()
+        mock_client.is_closed = False
+        mock_client_cls.return_value = mock_client
+
+        self.engine.health_check()
+        close_all_clients()
+
+        mock_client.close.assert_called_once()
+        self.assertIsNone(self.engine._client)
+
+        # A closed engine transparently reopens on next use
+        self.engine.health_check()
+        self.assertEqual(mock_client_cls.call_count, 2)
+
+
 class EngineManagerTest(TestCase):
 
     @patch('claimlens.engine.manager.EngineConfig')
@@ -122,3 +194,991 @@ class EngineManagerTest(TestCase):
         manager = EngineManager()
         manager.load_engines()
         self.assertEqual(len(manager._engines), 2)
+
+
+def _fake_load_engines(manager):
+    manager._loaded_at = time.monotonic()
+
+
+@patch('claimlens.engine.manager.EngineManager.load_engines', autospec=True, side_effect=_fake_load_engines)
+class EngineRegistryTest(TestCase):
+
+    def setUp(self):
+        manager_module._shared_manager = None
+
+    def tearDown(self):
+        manager_module._shared_manager = None
+
+    def test_manager_reused_across_calls(self, mock_load):
+        first = get_engine_manager()
+        second = get_engine_manager()
+        self.assertIs(first, second)
+        self.assertEqual(mock_load.call_count, 1)
+
+    def test_engine_change_reloads(self, mock_load):
+        first = get_engine_manager()
+        bump_registry_version(ENGINES_SCOPE)
+        second = get_engine_manager()
+        self.assertIsNot(first, second)
+        self.assertEqual(mock_load.call_count, 2)
+
+    def test_routing_change_keeps_engines(self, mock_load):
+        first = get_engine_manager()
+        bump_registry_version(ROUTING_SCOPE)
+        self.assertIs(get_engine_manager(), first)
+        self.assertEqual(mock_load.call_count, 1)
+
+
+class MultiPageExtractionTest(TestCase):
+
+    def test_merge_concatenates_arrays_and_picks_confident_scalars(self):
+        from claimlens.engine.merge import merge_page_extractions
+        merged = merge_page_extractions([
+            {
+                'fields': {
+                    'patient_name': {'value': 'J. Doe', 'confidence': 0.6},
+                    'total': {'value': None, 'confidence': 0.0},
+                    'items': {'value': [{'code': 'A'}], 'confidence': 0.9},
+                },
+                'aggregate_confidence': 0.8,
+            },
+            {
+                'fields': {
+                    'patient_name': {'value': 'John Doe', 'confidence': 0.95},
+                    'total': {'value': 120, 'confidence': 0.7},
+                    'items': {'value': [{'code': 'B'}, {'code': 'C'}], 'confidence': 0.7},
+                },
+                'aggregate_confidence': 0.6,
+            },
+        ])
+        fields = merged['fields']
+        self.assertEqual(fields['patient_name']['value'], 'John Doe')
+        self.assertEqual(fields['total']['value'], 120)
+        self.assertEqual([i['code'] for i in fields['items']['value']], ['A', 'B', 'C'])
+        self.assertAlmostEqual(fields['items']['confidence'], 0.8)
+        self.assertAlmostEqual(merged['aggregate_confidence'], 0.7)
+
+    def test_merge_responses_penalises_failed_pages(self):
+        from claimlens.engine.merge import merge_page_responses
+        ok = LLMResponse(
+            success=True, data={'fields': {}, 'aggregate_confidence': 0.9},
+            tokens_used=10, processing_time_ms=100, engine_name='e',
+        )
+        failed = LLMResponse(success=False, error='timeout')
+        result = merge_page_responses([ok, failed])
+        self.assertTrue(result.success)
+        self.assertEqual(result.data['failed_pages'], [2])
+        self.assertAlmostEqual(result.confidence, 0.45)
+
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_extract_pages_sends_all_images_in_one_request(self, mock_client_cls):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '{"fields": {}, "aggregate_confidence": 0.9}'}}],
+            'usage': {'total_tokens': 300},
+        }
+        mock_client = MagicMock()
+        mock_client.post.return_value = mock_response
+        mock_client_cls.return_value = mock_client
+
+        engine = OpenAICompatibleEngine({
+            'name': 'multi', 'endpoint_url': 'https://api.test', 'model_name': 'm',
+        })
+        with patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}'):
+            result = engine.extract_pages([(b'p1', 'image/png'), (b'p2', 'image/png')], {'items': {'type': 'array'}})
+
+        self.assertTrue(result.success)
+        content = mock_client.post.call_args.kwargs['json']['messages'][0]['content']
+        self.assertEqual([part['type'] for part in content], ['text', 'image_url', 'image_url'])
+        self.assertIn('2 pages', content[0]['text'])
+
+    def test_default_extract_pages_merges_single_page_extractions(self):
+        engine = MinimalEngine({'name': 'single', 'endpoint_url': 'https://api.test', 'model_name': 'm'})
+        result = engine.extract_pages([(b'p1', 'image/png'), (b'p2', 'image/png')], {'items': {'type': 'array'}})
+
+        self.assertTrue(result.success)
+        self.assertEqual(result.data['fields']['items']['value'], [{'code': 'p1'}, {'code': 'p2'}])
+        self.assertEqual((result.tokens_used, result.processing_time_ms), (20, 200))
+
+    def test_default_classify_extract_classifies_then_extracts(self):
+        engine = MinimalEngine({'name': 'minimal', 'endpoint_url': 'https://api.test', 'model_name': 'm'})
+        document_types = [
+            {'code': 'CLAIM_FORM', 'extraction_template': {'items': {'type': 'array'}}},
+            {'code': 'INVOICE', 'extraction_template': {}},
+        ]
+
+        result = engine.classify_extract(b'p1', 'image/png', document_types)
+
+        self.assertTrue(result.success)
+        self.assertEqual(result.data['document_type_code'], 'CLAIM_FORM')
+        self.assertEqual(result.data['fields']['items']['value'], [{'code': 'p1'}])
+        self.assertEqual((result.confidence, result.tokens_used), (0.9, 15))
+
+
+class ImageBudgetTest(TestCase):
+
+    def _png(self, size=(3000, 2000)):
+        from io import BytesIO
+        from PIL import Image
+        buf = BytesIO()
+        Image.new('RGB', size, (255, 255, 255)).save(buf, format='PNG', dpi=(300, 300))
+        return buf.getvalue()
+
+    def test_empty_budget_is_noop(self):
+        from claimlens.preprocessing import fit_image_to_budget
+        png = self._png()
+        self.assertEqual(fit_image_to_budget(png, 'image/png', {}), (png, 'image/png'))
+
+    def test_downscale_and_reencode(self):
+        from io import BytesIO
+        from PIL import Image
+        from claimlens.preprocessing import fit_image_to_budget
+
+        data, mime_type = fit_image_to_budget(
+            self._png(), 'image/png', {'max_long_edge': 1500, 'format': 'jpeg', 'quality': 80},
+        )
+        self.assertEqual(mime_type, 'image/jpeg')
+        self.assertEqual(Image.open(BytesIO(data)).size, (1500, 1000))
+
+    def test_max_pixels(self):
+        from io import BytesIO
+        from PIL import Image
+        from claimlens.preprocessing import fit_image_to_budget
+
+        data, _mime = fit_image_to_budget(self._png(), 'image/png', {'max_pixels': 1_500_000})
+        width, height = Image.open(BytesIO(data)).size
+        self.assertLessEqual(width * height, 1_500_000)
+
+    def test_low_quality_source_not_grayscaled(self):
+        from io import BytesIO
+        from PIL import Image
+        from claimlens.preprocessing import fit_image_to_budget
+
+        buf = BytesIO()
+        Image.new('RGB', (400, 300), (200, 10, 10)).save(buf, format='PNG')
+        data, _mime = fit_image_to_budget(
+            buf.getvalue(), 'image/png', {'format': 'webp', 'grayscale': True}, quality_score=0.2,
+        )
+        self.assertEqual(Image.open(BytesIO(data)).mode, 'RGB')
+
+    def test_render_without_dpi_not_treated_as_low_quality(self):
+        from io import BytesIO
+        from PIL import Image
+        from claimlens.preprocessing import fit_image_to_budget
+
+        # PDF renders carry no DPI; only the analysed quality score counts
+        noise = Image.effect_noise((400, 300), 64)
+        buf = BytesIO()
+        Image.merge('RGB', (noise, noise, noise)).save(buf, format='PNG')
+        data, mime_type = fit_image_to_budget(
+            buf.getvalue(), 'image/png', {'format': 'jpeg', 'grayscale': True}, quality_score=0.85,
+        )
+        self.assertEqual(mime_type, 'image/jpeg')
+        self.assertEqual(Image.open(BytesIO(data)).mode, 'L')
+
+    @patch('claimlens.preprocessing.fit_image_to_budget', return_value=(b'small', 'image/jpeg'))
+    def test_engine_applies_budget(self, mock_fit):
+        engine = OpenAICompatibleEngine({
+            'name': 'budget', 'endpoint_url': 'https://api.test', 'model_name': 'm',
+            'image_budget': {'max_long_edge': 1024},
+        })
+        from claimlens.preprocessing import source_quality
+
+        token = source_quality.set(0.3)
+        try:
+            self.assertTrue(engine._encode_image(b'big', 'image/png').startswith('data:image/jpeg;base64,'))
+        finally:
+            source_quality.reset(token)
+        mock_fit.assert_called_once_with(b'big', 'image/png', {'max_long_edge': 1024}, quality_score=0.3)
+
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_text_layer_pages_sent_as_text(self, mock_client_cls):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '{"fields": {}, "aggregate_confidence": 0.9}'}}],
+        }
+        mock_client = MagicMock()
+        mock_client.post.return_value = mock_response
+        mock_client_cls.return_value = mock_client
+
+        engine = OpenAICompatibleEngine({'name': 'text', 'endpoint_url': 'https://api.test', 'model_name': 'm'})
+        with patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}'):
+            engine.extract(b'[72,90] Total: 120.00', 'text/plain', {'total': {'type': 'decimal'}})
+
+        content = mock_client.post.call_args.kwargs['json']['messages'][0]['content']
+        self.assertEqual([part['type'] for part in content], ['text', 'text'])
+        self.assertIn('Total: 120.00', content[1]['text'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResponseCacheTest(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from claimlens.engine.cache import ResponseCache
+        cache.clear()
+        self.manager = EngineManager()
+        self.manager.response_cache = ResponseCache(enabled=True)
+        self.engine = OpenAICompatibleEngine({
+            'name': 'cached', 'endpoint_url': 'https://api.test', 'model_name': 'm',
+        })
+        self.response = LLMResponse(
+            success=True, data={'fields': {}, 'aggregate_confidence': 0.9},
+            confidence=0.9, tokens_used=500, engine_name='cached',
+        )
+
+    def _extract(self, image_bytes=b'doc', use_cache=True):
+        return self.manager._call_engine(
+            self.engine, 'extract', (image_bytes, 'image/png', {'total': {'type': 'decimal'}}),
+            use_cache=use_cache,
+        )
+
+    @patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}')
+    def test_identical_request_served_from_cache(self, _prompt):
+        with patch.object(OpenAICompatibleEngine, 'extract', return_value=self.response) as mock_extract:
+            first = self._extract()
+            second = self._extract()
+        self.assertEqual(mock_extract.call_count, 1)
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual(second.tokens_used, 500)
+
+    @patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}')
+    def test_different_content_or_bypass_misses(self, _prompt):
+        with patch.object(OpenAICompatibleEngine, 'extract', return_value=self.response) as mock_extract:
+            self._extract(b'doc-1')
+            self._extract(b'doc-2')
+            self._extract(b'doc-1', use_cache=False)
+        self.assertEqual(mock_extract.call_count, 3)
+
+    @patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}')
+    def test_structured_output_and_schema_in_key(self, _prompt):
+        def key(template):
+            return self.manager._response_cache_key(self.engine, 'extract', (b'doc', 'image/png', template), {})
+
+        template = {'total': {'type': 'decimal'}}
+        free_form = key(template)
+        self.engine.structured_output = True
+        guided = key(template)
+        # The prompt lists the fields either way; the schema also pins their types
+        self.assertNotEqual(free_form, guided)
+        self.assertNotEqual(guided, key({'total': {'type': 'string'}}))
+
+    @patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}')
+    def test_unreadable_entry_is_a_miss(self, _prompt):
+        from django.core.cache import cache
+
+        with patch.object(OpenAICompatibleEngine, 'extract', return_value=self.response):
+            self._extract()
+        key = self.manager._response_cache_key(
+            self.engine, 'extract', (b'doc', 'image/png', {'total': {'type': 'decimal'}}), {},
+        )
+        cache.set(key, '{"success": true, "retired_field": 1}')
+
+        self.assertIsNone(self.manager.response_cache.get(key))
+        self.assertIsNone(cache.get(key))
+
+    @patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}')
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_prompt_rendered_once_per_call(self, mock_client_cls, mock_resolve):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '{"fields": {}, "aggregate_confidence": 0.9}'}}],
+            'usage': {'total_tokens': 300},
+        }
+        mock_client_cls.return_value.post.return_value = mock_response
+
+        result = self._extract()
+
+        self.assertTrue(result.success)
+        self.assertEqual(mock_resolve.call_count, 1)
+
+    @patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}')
+    def test_failures_not_cached(self, _prompt):
+        failed = LLMResponse(success=False, error='boom')
+        with patch.object(OpenAICompatibleEngine, 'extract', return_value=failed) as mock_extract:
+            self._extract()
+            self._extract()
+        self.assertEqual(mock_extract.call_count, 2)
+
+
+class AsyncEngineTest(TestCase):
+
+    @patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}')
+    @patch('claimlens.engine.base.httpx.AsyncClient')
+    def test_aextract_uses_async_client(self, mock_client_cls, _prompt):
+        from unittest.mock import AsyncMock
+        from asgiref.sync import async_to_sync
+
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '{"fields": {}, "aggregate_confidence": 0.8}'}}],
+            'usage': {'total_tokens': 120},
+        }
+        mock_client = MagicMock()
+        mock_client.is_closed = False
+        mock_client.post = AsyncMock(return_value=mock_response)
+        mock_client.aclose = AsyncMock()
+        mock_client_cls.return_value = mock_client
+
+        engine = OpenAICompatibleEngine({
+            'name': 'async', 'endpoint_url': 'https://api.test', 'model_name': 'm',
+        })
+
+        async def run():
+            try:
+                return await engine.aextract(b'img', 'image/png', {'total': {'type': 'decimal'}})
+            finally:
+                await engine.aclose()
+
+        result = async_to_sync(run)()
+        self.assertTrue(result.success)
+        self.assertEqual(result.tokens_used, 120)
+        mock_client.post.assert_awaited_once()
+        mock_client.aclose.assert_awaited_once()
+
+    @patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}')
+    @patch('claimlens.engine.base.httpx.AsyncClient')
+    def test_async_prompt_rendering_closes_stale_connections(self, mock_client_cls, _prompt):
+        from unittest.mock import AsyncMock
+        from asgiref.sync import async_to_sync
+
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '{"fields": {}, "aggregate_confidence": 0.8}'}}],
+            'usage': {'total_tokens': 120},
+        }
+        mock_client = mock_client_cls.return_value
+        mock_client.is_closed = False
+        mock_client.post = AsyncMock(return_value=mock_response)
+
+        manager = EngineManager()
+        manager.response_cache.enabled = True
+        engine = OpenAICompatibleEngine({'name': 'db', 'endpoint_url': 'https://api.test', 'model_name': 'm'})
+
+        with patch('django.db.close_old_connections') as close_old_connections, \
+                patch.object(manager.response_cache, 'get', return_value=None), \
+                patch.object(manager.response_cache, 'set'):
+            result = async_to_sync(manager._acall_engine)(
+                engine, 'extract', (b'img', 'image/png', {'total': {'type': 'decimal'}}),
+            )
+
+        self.assertTrue(result.success)
+        # Around the cache key, the cache read and write, and the engine's own prompt rendering
+        self.assertEqual(close_old_connections.call_count, 8)
+
+    def test_per_engine_semaphore_bounds_in_flight_requests(self):
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from claimlens.apps import ClaimlensConfig
+
+        class SlowEngine:
+            name, endpoint_url, model_name = 'slow', 'https://slow.test', 'm'
+            in_flight = peak = 0
+
+            async def aextract(self, *args, **kwargs):
+                SlowEngine.in_flight += 1
+                SlowEngine.peak = max(SlowEngine.peak, SlowEngine.in_flight)
+                await asyncio.sleep(0.01)
+                SlowEngine.in_flight -= 1
+                return LLMResponse(success=True, data={}, engine_name=self.name)
+
+        manager = EngineManager()
+        manager.response_cache.enabled = False
+        engine = SlowEngine()
+
+        async def run():
+            return await asyncio.gather(*(
+                manager._acall_engine(engine, 'extract', (b'img', 'image/png', {}))
+                for _ in range(6)
+            ))
+
+        with patch.object(ClaimlensConfig, 'llm_async_max_concurrency_per_engine', 2):
+            results = async_to_sync(run)()
+        self.assertTrue(all(r.success for r in results))
+        self.assertEqual(SlowEngine.peak, 2)
+
+    def test_run_async_shares_one_loop_across_threads(self):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        from claimlens.apps import ClaimlensConfig
+        from claimlens.engine.event_loop import get_event_loop
+
+        class SlowEngine:
+            name, endpoint_url, model_name = 'shared', 'https://shared.test', 'm'
+            in_flight = peak = 0
+            loops = set()
+
+            async def aextract(self, *args, **kwargs):
+                SlowEngine.loops.add(asyncio.get_running_loop())
+                SlowEngine.in_flight += 1
+                SlowEngine.peak = max(SlowEngine.peak, SlowEngine.in_flight)
+                await asyncio.sleep(0.02)
+                SlowEngine.in_flight -= 1
+                return LLMResponse(success=True, data={}, engine_name=self.name)
+
+        manager = EngineManager()
+        manager.response_cache.enabled = False
+        engine = SlowEngine()
+
+        # Separate tasks (threads) calling in: the engine's slots bound them all
+        with patch.object(ClaimlensConfig, 'llm_async_max_concurrency_per_engine', 2), \
+                ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(
+                lambda _: manager.run_async(manager._acall_engine, engine, 'extract', (b'img', 'image/png', {})),
+                range(6),
+            ))
+        self.assertTrue(all(r.success for r in results))
+        self.assertEqual(SlowEngine.peak, 2)
+        self.assertEqual(SlowEngine.loops, {get_event_loop()})
+
+
+class RateLimitTest(TestCase):
+
+    def setUp(self):
+        from claimlens.engine.ratelimit import LocalTokenBucket
+        self.limiter = LocalTokenBucket()
+        patcher = patch('claimlens.engine.ratelimit.get_rate_limiter', return_value=self.limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bucket_grants_budget_then_asks_to_wait(self):
+        buckets = [('rpm', 60, 1)]
+        for _ in range(60):
+            self.assertEqual(self.limiter.take(buckets), 0)
+        # 60 rpm refills one request per second
+        self.assertAlmostEqual(self.limiter.take(buckets), 1.0, places=1)
+
+    def test_take_is_all_or_nothing(self):
+        self.assertEqual(self.limiter.take([('tpm', 1000, 900)]), 0)
+        self.assertGreater(self.limiter.take([('rpm', 60, 1), ('tpm', 1000, 500)]), 0)
+        # The request bucket was not charged by the refused call
+        self.assertEqual(self.limiter.take([('rpm', 60, 60)]), 0)
+
+    def test_acquire_raises_when_wait_exceeds_limit(self):
+        from claimlens.apps import ClaimlensConfig
+        from claimlens.engine.ratelimit import EngineRateLimit, RateLimitExceeded
+
+        limit = EngineRateLimit('limited', requests_per_minute=1)
+        with patch.object(ClaimlensConfig, 'llm_rate_limit_max_wait_seconds', 0):
+            limit.acquire(100)
+            with self.assertRaises(RateLimitExceeded):
+                limit.acquire(100)
+
+    def test_settle_returns_unused_tokens(self):
+        from claimlens.engine.ratelimit import EngineRateLimit
+
+        limit = EngineRateLimit('settled', tokens_per_minute=1000)
+        limit.acquire(800)
+        limit.settle(800, 200)
+        self.assertEqual(self.limiter.take(limit._buckets(700)), 0)
+
+    def test_aacquire_takes_off_the_event_loop(self):
+        import threading
+        from asgiref.sync import async_to_sync
+        from claimlens.engine.ratelimit import EngineRateLimit
+
+        callers = []
+        take = self.limiter.take
+
+        def tracking_take(buckets, force=False):
+            callers.append(threading.get_ident())
+            return take(buckets, force)
+
+        async def acquire():
+            await EngineRateLimit('async', requests_per_minute=60).aacquire(100)
+            return threading.get_ident()
+
+        with patch.object(self.limiter, 'take', side_effect=tracking_take):
+            loop_thread = async_to_sync(acquire)()
+
+        self.assertEqual(len(callers), 1)
+        self.assertNotEqual(callers[0], loop_thread)
+
+    @patch('claimlens.engine.health.EngineHealth.refresh_async')
+    def test_manager_reroutes_without_opening_circuit(self, _refresh):
+        from claimlens.engine.health import get_engine_health, reset_engine_health
+        from claimlens.engine.ratelimit import RateLimitExceeded
+        self.addCleanup(reset_engine_health)
+
+        limited, spare = MagicMock(), MagicMock()
+        limited.name, limited.endpoint_url, limited.model_name = 'limited', 'https://a.test', 'm'
+        spare.name, spare.endpoint_url, spare.model_name = 'spare', 'https://b.test', 'm'
+        limited.extract.side_effect = RateLimitExceeded('limited', 30)
+        spare.extract.return_value = LLMResponse(success=True, data={}, engine_name='spare')
+
+        manager = EngineManager()
+        manager.response_cache.enabled = False
+        manager._engines = [(MagicMock(), limited), (MagicMock(), spare)]
+        result = manager.extract(b'img', 'image/png', {})
+
+        self.assertTrue(result.success)
+        self.assertEqual(result.engine_name, 'spare')
+        self.assertEqual(get_engine_health(limited).consecutive_failures, 0)
+
+    @patch('claimlens.engine.health.EngineHealth.refresh_async')
+    def test_malformed_answers_do_not_open_circuit(self, _refresh):
+        from claimlens.engine.health import get_engine_health, reset_engine_health
+        self.addCleanup(reset_engine_health)
+
+        engine = MagicMock()
+        engine.name, engine.endpoint_url, engine.model_name = 'garbled', 'https://a.test', 'm'
+        engine.extract.return_value = LLMResponse(success=False, error='Expecting value', engine_name='garbled')
+
+        manager = EngineManager()
+        manager.response_cache.enabled = False
+        manager._engines = [(MagicMock(), engine)]
+        for _ in range(5):
+            manager.extract(b'img', 'image/png', {})
+
+        self.assertEqual(get_engine_health(engine).consecutive_failures, 0)
+        self.assertEqual(get_engine_health(engine).state, 'closed')
+
+    @patch('claimlens.engine.health.EngineHealth.refresh_async')
+    def test_only_engine_called_claims_its_probe(self, _refresh):
+        from claimlens.engine.health import get_engine_health, reset_engine_health
+        self.addCleanup(reset_engine_health)
+
+        first, second = MagicMock(), MagicMock()
+        first.name, first.endpoint_url, first.model_name = 'first', 'https://a.test', 'm'
+        second.name, second.endpoint_url, second.model_name = 'second', 'https://b.test', 'm'
+        first.extract.return_value = LLMResponse(success=True, data={}, engine_name='first')
+        for engine in (first, second):
+            health = get_engine_health(engine)
+            health.state, health.opened_at = health.OPEN, 0.0
+
+        manager = EngineManager()
+        manager.response_cache.enabled = False
+        manager._engines = [(MagicMock(), first), (MagicMock(), second)]
+        self.assertTrue(manager.extract(b'img', 'image/png', {}).success)
+
+        second.extract.assert_not_called()
+        self.assertIsNone(get_engine_health(second).probe_started_at)
+        self.assertTrue(get_engine_health(second).is_available())
+
+
+class RetryPolicyTest(TestCase):
+
+    def _status_error(self, status_code, headers=None):
+        import httpx
+        request = httpx.Request('POST', 'https://api.test/v1/chat/completions')
+        response = httpx.Response(status_code, headers=headers or {}, request=request)
+        return httpx.HTTPStatusError('error', request=request, response=response)
+
+    def test_classifies_errors(self):
+        import httpx
+        from claimlens.engine.retry import is_transient
+        self.assertTrue(is_transient(self._status_error(429)))
+        self.assertTrue(is_transient(self._status_error(503)))
+        self.assertTrue(is_transient(httpx.ReadTimeout('slow')))
+        self.assertFalse(is_transient(self._status_error(400)))
+        self.assertFalse(is_transient(self._status_error(401)))
+        self.assertFalse(is_transient(ValueError('bad json')))
+
+    def test_only_transport_and_server_errors_are_engine_faults(self):
+        import httpx
+        from claimlens.engine.retry import is_engine_fault
+        self.assertTrue(is_engine_fault(self._status_error(502)))
+        self.assertTrue(is_engine_fault(httpx.ConnectError('refused')))
+        self.assertTrue(is_engine_fault(httpx.ReadTimeout('slow')))
+        self.assertFalse(is_engine_fault(self._status_error(429)))
+        self.assertFalse(is_engine_fault(self._status_error(400)))
+        self.assertFalse(is_engine_fault(ValueError('bad json')))
+
+    def test_backoff_is_bounded_and_honours_retry_after(self):
+        from claimlens.engine.retry import RetryPolicy
+        policy = RetryPolicy(max_retries=3, backoff=1.0, max_backoff=5.0)
+        for attempt in range(3):
+            delay = policy.next_delay(attempt, self._status_error(503))
+            self.assertTrue(0 <= delay <= min(5.0, 2 ** attempt))
+        self.assertIsNone(policy.next_delay(3, self._status_error(503)))
+        self.assertEqual(policy.next_delay(0, self._status_error(429, {'Retry-After': '2'})), 2.0)
+        # Too long to wait locally: give up so the manager can reroute
+        self.assertIsNone(policy.next_delay(0, self._status_error(429, {'Retry-After': '120'})))
+
+    @patch('claimlens.engine.base.time.sleep')
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_make_request_retries_transient_errors(self, mock_client_cls, mock_sleep):
+        ok = MagicMock()
+        ok.json.return_value = {'usage': {'total_tokens': 1}}
+        throttled = MagicMock()
+        throttled.raise_for_status.side_effect = self._status_error(429, {'Retry-After': '1'})
+        mock_client = MagicMock()
+        mock_client.post.side_effect = [throttled, ok]
+        mock_client_cls.return_value = mock_client
+
+        engine = OpenAICompatibleEngine({
+            'name': 'retry', 'endpoint_url': 'https://api.test', 'model_name': 'm', 'max_retries': 2,
+        })
+        data, _ = engine._make_request('https://api.test/v1/chat/completions', {}, {})
+        self.assertEqual(data, {'usage': {'total_tokens': 1}})
+        self.assertEqual(mock_client.post.call_count, 2)
+        mock_sleep.assert_called_once_with(1.0)
+
+    @patch('claimlens.engine.base.time.sleep')
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_make_request_does_not_retry_permanent_errors(self, mock_client_cls, mock_sleep):
+        import httpx
+        rejected = MagicMock()
+        rejected.raise_for_status.side_effect = self._status_error(400)
+        mock_client = MagicMock()
+        mock_client.post.return_value = rejected
+        mock_client_cls.return_value = mock_client
+
+        engine = OpenAICompatibleEngine({
+            'name': 'retry', 'endpoint_url': 'https://api.test', 'model_name': 'm',
+        })
+        with self.assertRaises(httpx.HTTPStatusError):
+            engine._make_request('https://api.test/v1/chat/completions', {}, {})
+        self.assertEqual(mock_client.post.call_count, 1)
+        mock_sleep.assert_not_called()
+
+
+class HedgedRequestTest(TestCase):
+
+    def setUp(self):
+        import asyncio
+        from types import SimpleNamespace
+        from claimlens.apps import ClaimlensConfig
+        from claimlens.engine.latency import get_latency_window, reset_latency_windows
+
+        class FakeEngine:
+            def __init__(self, name, delay):
+                self.name, self.endpoint_url, self.model_name = name, f'https://{name}.test', 'm'
+                self.delay = delay
+                self.cancelled = False
+
+            def health_check(self):
+                return True
+
+            async def aextract(self, *args, **kwargs):
+                try:
+                    await asyncio.sleep(self.delay)
+                except asyncio.CancelledError:
+                    self.cancelled = True
+                    raise
+                return LLMResponse(success=True, data={}, tokens_used=100, engine_name=self.name)
+
+            async def aclose(self):
+                pass
+
+        self.addCleanup(reset_latency_windows)
+        for name, value in (('llm_hedging_enabled', True), ('llm_hedge_min_samples', 5)):
+            patcher = patch.object(ClaimlensConfig, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.primary = (SimpleNamespace(id=1, name='primary'), FakeEngine('primary', 1.0))
+        self.backup = (SimpleNamespace(id=2, name='backup'), FakeEngine('backup', 0.01))
+        for _ in range(5):
+            get_latency_window(self.primary[1], 'extract').record(0.05)
+
+        self.manager = EngineManager()
+        self.manager.response_cache.enabled = False
+        self.manager._engines = [self.primary, self.backup]
+
+    def test_slow_primary_is_hedged_and_cancelled(self):
+        with patch.object(EngineManager, 'select_engine', return_value=self.primary):
+            result, config = self.manager.extract_routed(b'img', 'image/png', {}, language='en')
+
+        self.assertEqual(config.name, 'backup')
+        self.assertEqual(result.hedge['winner'], 'backup')
+        self.assertEqual(result.hedge['delay_ms'], 50)
+        self.assertTrue(result.hedge['loser_cancelled'])
+        self.assertTrue(self.primary[1].cancelled)
+
+    def test_fused_request_is_hedged(self):
+        from claimlens.engine.latency import get_latency_window
+        for _, engine in (self.primary, self.backup):
+            engine.aclassify_extract = engine.aextract
+        for _ in range(5):
+            get_latency_window(self.primary[1], 'classify_extract').record(0.05)
+
+        with patch.object(EngineManager, 'select_engine', return_value=self.primary):
+            result, config = self.manager.classify_extract_routed(b'img', 'image/png', [], language='en')
+
+        self.assertEqual(config.name, 'backup')
+        self.assertEqual(result.hedge['winner'], 'backup')
+
+    def test_fast_primary_not_hedged(self):
+        self.primary[1].delay = 0
+        with patch.object(EngineManager, 'select_engine', return_value=self.primary):
+            result, config = self.manager.extract_routed(b'img', 'image/png', {}, language='en')
+
+        self.assertEqual(config.name, 'primary')
+        self.assertIsNone(result.hedge)
+
+
+class AdaptiveTimeoutTest(TestCase):
+
+    def setUp(self):
+        from claimlens.engine.latency import reset_latency_windows
+        self.addCleanup(reset_latency_windows)
+        self.engine = OpenAICompatibleEngine({
+            'name': 'adaptive', 'endpoint_url': 'https://api.test', 'model_name': 'm', 'timeout_seconds': 120,
+        })
+
+    def _record(self, seconds, document_type_code=None, count=20):
+        for _ in range(count):
+            EngineManager._record_latency(self.engine, 'extract', document_type_code, seconds)
+
+    def test_no_timeout_without_samples(self):
+        from claimlens.engine.latency import adaptive_timeout
+        self.assertIsNone(adaptive_timeout(self.engine, 'extract'))
+
+    def test_timeout_from_percentile_with_floor_and_cap(self):
+        from claimlens.engine.latency import adaptive_timeout, reset_latency_windows
+        self._record(8.0)
+        self.assertEqual(adaptive_timeout(self.engine, 'extract'), 16.0)
+
+        reset_latency_windows()
+        self._record(1.0)
+        self.assertEqual(adaptive_timeout(self.engine, 'extract'), 10)
+
+        reset_latency_windows()
+        self._record(90.0)
+        self.assertEqual(adaptive_timeout(self.engine, 'extract'), 120)
+
+    def test_document_type_window_preferred(self):
+        from claimlens.engine.latency import adaptive_timeout
+        self._record(8.0, document_type_code='CLAIM_FORM')
+        self._record(30.0, document_type_code='LONG_INVOICE')
+        self.assertEqual(adaptive_timeout(self.engine, 'extract', 'CLAIM_FORM'), 16.0)
+        self.assertEqual(adaptive_timeout(self.engine, 'extract', 'LONG_INVOICE'), 60.0)
+        # Unseen document types fall back to the engine-wide window
+        self.assertEqual(adaptive_timeout(self.engine, 'extract', 'UNKNOWN'), 60.0)
+
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_request_uses_adaptive_timeout(self, mock_client_cls):
+        from claimlens.engine.latency import request_timeout
+        mock_client = MagicMock()
+        mock_client.post.return_value.json.return_value = {}
+        mock_client_cls.return_value = mock_client
+
+        token = request_timeout.set(16.0)
+        try:
+            self.engine._make_request('https://api.test/v1/chat/completions', {}, {})
+        finally:
+            request_timeout.reset(token)
+        self.assertEqual(mock_client.post.call_args.kwargs['timeout'], 16.0)
+
+    @patch('claimlens.engine.base.time.sleep')
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_adaptive_timeout_not_retried_locally(self, mock_client_cls, mock_sleep):
+        import httpx
+        from claimlens.engine.latency import request_timeout
+        mock_client = MagicMock()
+        mock_client.post.side_effect = httpx.ReadTimeout('slow')
+        mock_client_cls.return_value = mock_client
+
+        token = request_timeout.set(16.0)
+        try:
+            with self.assertRaises(httpx.ReadTimeout):
+                self.engine._make_request('https://api.test/v1/chat/completions', {}, {})
+        finally:
+            request_timeout.reset(token)
+        self.assertEqual(mock_client.post.call_count, 1)
+
+    @patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}')
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_timeout_grows_after_lasting_slowdown(self, mock_client_cls, _prompt):
+        import httpx
+        from claimlens.engine.latency import adaptive_timeout
+
+        self._record(4.0)
+        self.assertEqual(adaptive_timeout(self.engine, 'extract'), 10)
+
+        # The engine is now slower than the adaptive limit: every request times out
+        mock_client_cls.return_value.post.side_effect = httpx.ReadTimeout('slow')
+        manager = EngineManager()
+        manager.response_cache.enabled = False
+        for _ in range(3):
+            result = manager._call_engine(self.engine, 'extract', (b'img', 'image/png', {}))
+            self.assertFalse(result.success)
+
+        timeouts = [c.kwargs['timeout'] for c in mock_client_cls.return_value.post.call_args_list]
+        self.assertEqual(timeouts, [10, 20, 40])
+        self.assertEqual(adaptive_timeout(self.engine, 'extract'), 80)
+
+    @patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}')
+    @patch('claimlens.engine.base.time.sleep')
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_latency_sampled_per_attempt(self, mock_client_cls, mock_sleep, _prompt):
+        import threading
+        import httpx
+        from claimlens.engine.latency import get_latency_window
+
+        request = httpx.Request('POST', 'https://api.test/v1/chat/completions')
+        unavailable = httpx.HTTPStatusError(
+            'unavailable', request=request, response=httpx.Response(503, request=request),
+        )
+        ok = MagicMock()
+        ok.json.return_value = {
+            'choices': [{'message': {'content': '{"fields": {}, "aggregate_confidence": 0.9}'}}],
+            'usage': {'total_tokens': 300},
+        }
+        mock_client_cls.return_value.post.side_effect = [unavailable, ok]
+        # time.sleep itself is patched; the backoff must not count as engine latency
+        mock_sleep.side_effect = lambda seconds: threading.Event().wait(0.2)
+
+        manager = EngineManager()
+        manager.response_cache.enabled = False
+        result = manager._call_engine(self.engine, 'extract', (b'img', 'image/png', {}))
+
+        self.assertTrue(result.success)
+        self.assertEqual(mock_client_cls.return_value.post.call_count, 2)
+        window = get_latency_window(self.engine, 'extract')
+        self.assertEqual(len(window), 1)
+        self.assertLess(window.percentile(100), 0.2)
+
+
+class StructuredOutputTest(TestCase):
+
+    template = {
+        'patient_name': {'type': 'string', 'required': True},
+        'medications': {
+            'type': 'array',
+            'required': True,
+            'items': {'name': 'string: medication name', 'quantity': 'integer: units dispensed'},
+        },
+    }
+
+    def test_schema_from_template(self):
+        from claimlens.engine.schema import compile_extraction_schema
+        schema = compile_extraction_schema(self.template)
+
+        self.assertEqual(schema['required'], ['fields', 'aggregate_confidence'])
+        fields = schema['properties']['fields']
+        self.assertEqual(fields['required'], ['patient_name', 'medications'])
+        self.assertFalse(fields['additionalProperties'])
+        name = fields['properties']['patient_name']['properties']['value']
+        self.assertEqual(name['type'], ['string', 'null'])
+        items = fields['properties']['medications']['properties']['value']['items']
+        self.assertEqual(items['required'], ['name', 'quantity'])
+        self.assertEqual(items['properties']['name']['description'], 'medication name')
+
+    def test_schema_cached_per_template_version(self):
+        from claimlens.engine.schema import extraction_schema
+        self.assertIs(extraction_schema(self.template), extraction_schema(dict(self.template)))
+        changed = dict(self.template, claim_date={'type': 'date'})
+        self.assertIn('claim_date', extraction_schema(changed)['properties']['fields']['properties'])
+
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_response_format_sent_only_when_enabled(self, mock_client_cls):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': '{"fields": {}, "aggregate_confidence": 0.9}'}}],
+            'usage': {'total_tokens': 100},
+        }
+        mock_client_cls.return_value.post.return_value = mock_response
+        config = {'name': 'schema', 'endpoint_url': 'https://api.test', 'model_name': 'm'}
+
+        with patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}'):
+            OpenAICompatibleEngine(config).extract(b'img', 'image/png', self.template)
+            payload = mock_client_cls.return_value.post.call_args.kwargs['json']
+            self.assertNotIn('response_format', payload)
+
+            OpenAICompatibleEngine(dict(config, structured_output=True)).extract(b'img', 'image/png', self.template)
+            payload = mock_client_cls.return_value.post.call_args.kwargs['json']
+            self.assertEqual(payload['response_format']['type'], 'json_schema')
+            self.assertTrue(payload['response_format']['json_schema']['strict'])
+
+
+class TruncatedResponseTest(TestCase):
+
+    full = (
+        '{"fields": {"patient_name": {"value": "John", "confidence": 0.9}, '
+        '"items": {"value": [{"name": "a"}, {"name": "b"}, {"name": "c"}], "confidence": 0.8}}, '
+        '"aggregate_confidence": 0.85}'
+    )
+
+    def test_partial_parser_keeps_complete_fields_and_items(self):
+        from claimlens.engine.json_repair import parse_partial_json
+        value, truncated = parse_partial_json(self.full[:self.full.index('"c"') + 2])
+
+        self.assertTrue(truncated)
+        self.assertEqual(value['fields']['patient_name'], {'value': 'John', 'confidence': 0.9})
+        self.assertEqual(value['fields']['items']['value'], [{'name': 'a'}, {'name': 'b'}])
+
+    def test_partial_parser_tolerates_missing_and_trailing_commas(self):
+        from claimlens.engine.json_repair import parse_partial_json
+        value, truncated = parse_partial_json('```json\n{"a": 1 "b": [1, 2,], }')
+        self.assertEqual(value, {'a': 1, 'b': [1, 2]})
+        self.assertFalse(truncated)
+
+    def test_number_at_cut_off_is_dropped(self):
+        from claimlens.engine.json_repair import parse_partial_json
+        self.assertEqual(parse_partial_json('{"a": "x", "b": 12'), ({'a': 'x'}, True))
+
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_cut_off_output_is_continued(self, mock_client_cls):
+        cut = self.full.index('"c"') + 2
+
+        def reply(content, finish_reason):
+            response = MagicMock()
+            response.json.return_value = {
+                'choices': [{'message': {'content': content}, 'finish_reason': finish_reason}],
+                'usage': {'total_tokens': 100},
+            }
+            return response
+
+        mock_client = mock_client_cls.return_value
+        mock_client.post.side_effect = [reply(self.full[:cut], 'length'), reply(self.full[cut:], 'stop')]
+        engine = OpenAICompatibleEngine({'name': 'cont', 'endpoint_url': 'https://api.test', 'model_name': 'm'})
+
+        with patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}'):
+            result = engine.extract(b'img', 'image/png', {'items': {'type': 'array'}})
+
+        self.assertTrue(result.success)
+        self.assertFalse(result.truncated)
+        self.assertEqual(len(result.data['fields']['items']['value']), 3)
+        self.assertEqual(result.tokens_used, 200)
+        messages = mock_client.post.call_args.kwargs['json']['messages']
+        self.assertEqual([m['role'] for m in messages], ['user', 'assistant', 'user'])
+
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_structured_output_continued_without_response_format(self, mock_client_cls):
+        cut = self.full.index('"c"') + 2
+
+        def reply(content, finish_reason):
+            response = MagicMock()
+            response.json.return_value = {
+                'choices': [{'message': {'content': content}, 'finish_reason': finish_reason}],
+                'usage': {'total_tokens': 100},
+            }
+            return response
+
+        mock_client = mock_client_cls.return_value
+        mock_client.post.side_effect = [reply(self.full[:cut], 'length'), reply(self.full[cut:], 'stop')]
+        engine = OpenAICompatibleEngine({
+            'name': 'strict', 'endpoint_url': 'https://api.test', 'model_name': 'm', 'structured_output': True,
+        })
+
+        with patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}'):
+            result = engine.extract(b'img', 'image/png', {'items': {'type': 'array'}})
+
+        self.assertTrue(result.success)
+        self.assertFalse(result.truncated)
+        first, continuation = [c.kwargs['json'] for c in mock_client.post.call_args_list]
+        self.assertIn('response_format', first)
+        self.assertNotIn('response_format', continuation)
+
+    @patch('claimlens.engine.base.httpx.Client')
+    def test_truncated_result_marked_when_not_continued(self, mock_client_cls):
+        response = MagicMock()
+        response.json.return_value = {
+            'choices': [{'message': {'content': self.full[:-40]}, 'finish_reason': 'length'}],
+            'usage': {'total_tokens': 100},
+        }
+        mock_client_cls.return_value.post.return_value = response
+        engine = OpenAICompatibleEngine({
+            'name': 'cut', 'endpoint_url': 'https://api.test', 'model_name': 'm', 'max_continuations': 0,
+        })
+
+        with patch('claimlens.engine.base._resolve_prompt', return_value='{fields_text}{array_instructions}'):
+            result = engine.extract(b'img', 'image/png', {'items': {'type': 'array'}})
+
+        self.assertTrue(result.success)
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.data['fields']['patient_name']['value'], 'John')
+        self.assertEqual(mock_client_cls.return_value.post.call_count, 1)
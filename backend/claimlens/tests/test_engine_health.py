@@ -0,0 +1,109 @@
+from unittest.mock import patch, MagicMock
+
+from django.test import TestCase
+
+from claimlens.engine.health import EngineHealth, get_engine_health, reset_engine_health
+
+
+class EngineHealthTest(TestCase):
+
+    def setUp(self):
+        self.engine = MagicMock()
+        self.engine.name = 'test-engine'
+        self.health = EngineHealth(self.engine, ttl=30, failure_threshold=2, cooldown=60)
+
+    def test_available_without_inline_probe(self):
+        with patch.object(EngineHealth, 'refresh_async') as mock_refresh:
+            self.assertTrue(self.health.is_available())
+            mock_refresh.assert_called_once()
+        self.engine.health_check.assert_not_called()
+
+    def test_fresh_state_not_reprobed(self):
+        self.health.record_success()
+        with patch.object(EngineHealth, 'refresh_async') as mock_refresh:
+            self.assertTrue(self.health.is_available())
+            mock_refresh.assert_not_called()
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        self.health.record_failure()
+        self.assertTrue(self.health.is_available())
+        self.health.record_failure()
+        self.assertEqual(self.health.state, EngineHealth.OPEN)
+        self.assertFalse(self.health.is_available())
+
+    def test_success_resets_failure_count(self):
+        self.health.record_failure()
+        self.health.record_success()
+        self.health.record_failure()
+        self.assertEqual(self.health.state, EngineHealth.CLOSED)
+
+    @patch('claimlens.engine.health.time.monotonic')
+    def test_half_open_after_cooldown(self, mock_time):
+        mock_time.return_value = 1000.0
+        self.health.record_failure()
+        self.health.record_failure()
+        self.assertFalse(self.health.is_available())
+
+        mock_time.return_value = 1061.0
+        with patch.object(EngineHealth, 'refresh_async'):
+            self.assertTrue(self.health.is_available())
+        self.assertEqual(self.health.state, EngineHealth.OPEN)
+        self.assertTrue(self.health.try_acquire_probe())
+        self.assertEqual(self.health.state, EngineHealth.HALF_OPEN)
+
+        # A single failure while half-open reopens the circuit
+        self.health.record_failure()
+        self.assertEqual(self.health.state, EngineHealth.OPEN)
+        self.assertFalse(self.health.is_available())
+
+    @patch('claimlens.engine.health.time.monotonic')
+    def test_half_open_lets_one_probe_through(self, mock_time):
+        mock_time.return_value = 1000.0
+        self.health.record_failure()
+        self.health.record_failure()
+
+        mock_time.return_value = 1061.0
+        with patch.object(EngineHealth, 'refresh_async'):
+            # Checking availability claims nothing
+            self.assertTrue(self.health.is_available())
+            self.assertTrue(self.health.is_available())
+
+            self.assertTrue(self.health.try_acquire_probe())
+            self.assertFalse(self.health.is_available())
+            self.assertFalse(self.health.try_acquire_probe())
+
+            # A probe that never reports back is given up after a cooldown
+            mock_time.return_value = 1122.0
+            self.assertTrue(self.health.try_acquire_probe())
+
+            self.health.release_probe()
+            self.assertTrue(self.health.try_acquire_probe())
+
+        self.health.record_success()
+        self.assertEqual(self.health.state, EngineHealth.CLOSED)
+        self.assertTrue(self.health.try_acquire_probe())
+
+    def test_refresh_records_probe_result(self):
+        self.engine.health_check.return_value = False
+        self.assertFalse(self.health.refresh())
+        self.assertEqual(self.health.consecutive_failures, 1)
+
+        self.engine.health_check.return_value = True
+        self.assertTrue(self.health.refresh())
+        self.assertEqual(self.health.consecutive_failures, 0)
+
+
+class EngineHealthRegistryTest(TestCase):
+
+    def tearDown(self):
+        reset_engine_health()
+
+    def test_shared_per_engine(self):
+        engine = MagicMock()
+        engine.name, engine.endpoint_url, engine.model_name = 'a', 'https://a.test', 'm'
+        reloaded = MagicMock()
+        reloaded.name, reloaded.endpoint_url, reloaded.model_name = 'a', 'https://a.test', 'm'
+
+        health = get_engine_health(engine)
+        self.assertIs(get_engine_health(reloaded), health)
+        self.assertIs(health.engine, reloaded)
@@ -1,3 +1,4 @@
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
 
 from django.test import TestCase
@@ -7,6 +8,7 @@ from claimlens.models import (
     EngineConfig, EngineCapabilityScore, RoutingPolicy, DocumentType,
 )
 from claimlens.engine.manager import EngineManager
+from claimlens.engine.routing import RoutingTable
 from claimlens.tests.data import ClaimlensTestDataMixin
 
 
@@ -53,6 +55,21 @@ class EngineCapabilityScoreModelTest(TestCase, ClaimlensTestDataMixin):
                 language='en', accuracy_score=85, speed_score=75,
             ).save(user=self.user)
 
+    def test_feedback_updates_do_not_bump_routing_version(self):
+        from claimlens.engine.manager import get_registry_version, ROUTING_SCOPE
+        from claimlens.services import EngineCapabilityScoreService
+
+        config = self._create_engine_config()
+        version = get_registry_version(ROUTING_SCOPE)
+        EngineCapabilityScoreService.record_extraction_result(config, 'en', None, 0.9, 3000, self.user)
+        EngineCapabilityScoreService.record_extraction_result(config, 'en', None, 0.2, 3000, self.user)
+        self.assertEqual(get_registry_version(ROUTING_SCOPE), version)
+
+        score = EngineCapabilityScore.objects.get(engine_config=config, language='en')
+        score.accuracy_score = 95
+        score.save(user=self.user)
+        self.assertNotEqual(get_registry_version(ROUTING_SCOPE), version)
+
 
 class RoutingPolicySingletonTest(TestCase, ClaimlensTestDataMixin):
 
@@ -129,3 +146,81 @@ class EngineManagerSelectEngineTest(TestCase, ClaimlensTestDataMixin):
         manager = EngineManager()
         result = manager.select_engine(language='sw')
         self.assertIsNone(result)
+
+
+def _rule(name, config_id, language=None, document_type_id=None, priority=50, min_confidence=0.0):
+    return SimpleNamespace(
+        name=name, engine_config_id=config_id, language=language,
+        document_type_id=document_type_id, priority=priority, min_confidence=min_confidence,
+    )
+
+
+def _score(config_id, language, document_type_id=None, accuracy=50, cost=0, speed=50):
+    return SimpleNamespace(
+        engine_config_id=config_id, language=language, document_type_id=document_type_id,
+        accuracy_score=accuracy, cost_per_page=cost, speed_score=speed,
+    )
+
+
+class RoutingTableTest(TestCase):
+
+    def test_rules_ordered_by_priority(self):
+        table = RoutingTable([
+            _rule('any language', 'a', priority=10),
+            _rule('french', 'b', language='fr', priority=90),
+            _rule('english', 'c', language='en', priority=100),
+        ], [])
+        entry = table.lookup('fr')
+        self.assertEqual([r.config_id for r in entry.rules], ['b', 'a'])
+
+    def test_rules_filtered_by_document_type(self):
+        table = RoutingTable([
+            _rule('invoices', 'a', document_type_id='invoice'),
+            _rule('claims', 'b', document_type_id='claim'),
+            _rule('all', 'c'),
+        ], [])
+        entry = table.lookup('en', 'invoice')
+        self.assertEqual({r.config_id for r in entry.rules}, {'a', 'c'})
+
+    def test_min_confidence_uses_accuracy(self):
+        table = RoutingTable(
+            [_rule('strict', 'a', min_confidence=0.9), _rule('lenient', 'b', min_confidence=0.5)],
+            [_score('a', 'en', accuracy=80), _score('b', 'en', accuracy=80)],
+        )
+        self.assertEqual([r.config_id for r in table.lookup('en').rules], ['b'])
+
+    def test_scores_ranked_by_composite(self):
+        table = RoutingTable([], [
+            _score('a', 'en', accuracy=90, cost=0.05, speed=80),
+            _score('b', 'en', accuracy=70, cost=0.02, speed=95),
+        ], weights=(0.5, 0.3, 0.2))
+        ranked = table.lookup('en').scores
+        self.assertEqual([c.config_id for c in ranked], ['b', 'a'])
+        self.assertGreater(ranked[0].composite, ranked[1].composite)
+
+    def test_typed_scores_preferred_over_wildcard(self):
+        table = RoutingTable([], [
+            _score('a', 'en', accuracy=99),
+            _score('b', 'en', document_type_id='invoice', accuracy=10),
+        ])
+        self.assertEqual([c.config_id for c in table.lookup('en', 'invoice').scores], ['b'])
+        self.assertEqual([c.config_id for c in table.lookup('en', 'claim').scores], ['a'])
+
+    def test_lookup_memoised(self):
+        table = RoutingTable([_rule('r', 'a')], [_score('a', 'en')])
+        self.assertIs(table.lookup('en'), table.lookup('en'))
+
+    @patch('claimlens.engine.manager.RoutingTable.load')
+    def test_manager_reuses_table_until_routing_changes(self, mock_load):
+        from claimlens.engine.manager import bump_registry_version, ROUTING_SCOPE
+
+        mock_load.return_value = RoutingTable([], [])
+        manager = EngineManager()
+        manager._engines = [(MagicMock(), MagicMock())]
+        manager.select_engine(language='en')
+        manager.select_engine(language='en')
+        self.assertEqual(mock_load.call_count, 1)
+
+        bump_registry_version(ROUTING_SCOPE)
+        manager.select_engine(language='en')
+        self.assertEqual(mock_load.call_count, 2)
@@ -1,8 +1,13 @@
-from django.test import TestCase
+import uuid
+from unittest.mock import patch, MagicMock
+
+from django.test import TestCase, override_settings
 
 from core.test_helpers import LogInHelper
-from claimlens.models import Document, DocumentType, EngineConfig
-from claimlens.services import DocumentService, DocumentTypeService, EngineConfigService
+from claimlens.models import AuditLog, Document, DocumentType, EngineConfig
+from claimlens.services import (
+    DocumentService, DocumentTypeService, EngineConfigService, PromptTemplateService,
+)
 from claimlens.tests.data import ClaimlensTestDataMixin
 
 
@@ -106,3 +111,143 @@ class DocumentServiceTest(TestCase, ClaimlensTestDataMixin):
         payload.pop('storage_key')
         result = self.service.upload(payload)
         self.assertFalse(result.get('success'))
+
+
+
+class DocumentBatchServiceTest(TestCase, ClaimlensTestDataMixin):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = LogInHelper().get_or_create_user_api()
+        cls.service = DocumentService(cls.user)
+
+    def _payloads(self, count):
+        return [
+            {**self.document_payload, 'storage_key': f'documents/batch-{i}/claim.pdf', 'language': 'fr'}
+            for i in range(count)
+        ]
+
+    def test_upload_batch_bulk_creates_documents_and_audit_logs(self):
+        batch_id = uuid.uuid4()
+        result = self.service.upload_batch(batch_id, self._payloads(3))
+        self.assertTrue(result.get('success'))
+
+        docs = Document.objects.filter(batch_id=batch_id)
+        self.assertEqual(docs.count(), 3)
+        self.assertTrue(all(doc.status == Document.Status.PENDING and doc.language == 'fr' for doc in docs))
+        self.assertEqual(AuditLog.objects.filter(document__batch_id=batch_id).count(), 3)
+        self.assertEqual(Document.history.filter(batch_id=batch_id).count(), 3)
+
+    def test_upload_batch_is_all_or_nothing(self):
+        batch_id = uuid.uuid4()
+        payloads = self._payloads(2)
+        payloads[1]['mime_type'] = 'text/plain'
+        result = self.service.upload_batch(batch_id, payloads)
+        self.assertFalse(result.get('success'))
+        self.assertFalse(Document.objects.filter(batch_id=batch_id).exists())
+
+    @patch('claimlens.apps.ClaimlensConfig.celery_broker_url', '')
+    @patch('claimlens.tasks.processing_pipeline')
+    @patch('celery.group')
+    def test_start_batch_processing_dispatches_group(self, mock_group, _pipeline):
+        batch_id = uuid.uuid4()
+        self.service.upload_batch(batch_id, self._payloads(2))
+        mock_group.return_value.freeze.return_value = MagicMock(
+            id='group-1', results=[MagicMock(id='task-1'), MagicMock(id='task-2')],
+        )
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            result = self.service.start_batch_processing(batch_id)
+        mock_group.return_value.apply_async.assert_not_called()
+        for callback in callbacks:
+            callback()
+        mock_group.return_value.apply_async.assert_called_once()
+
+        self.assertTrue(result.get('success'))
+        self.assertEqual(result['data']['started'], 2)
+        docs = Document.objects.filter(batch_id=batch_id)
+        self.assertEqual({doc.status for doc in docs}, {Document.Status.PREPROCESSING})
+        self.assertEqual({doc.celery_task_id for doc in docs}, {'task-1', 'task-2'})
+
+        progress = DocumentService.batch_progress(batch_id)
+        self.assertEqual(progress['total'], 2)
+        self.assertEqual(progress['finished'], 0)
+        self.assertEqual(progress['statuses'], {Document.Status.PREPROCESSING: 2})
+
+    @patch('claimlens.apps.ClaimlensConfig.celery_broker_url', '')
+    @patch('claimlens.tasks.processing_pipeline')
+    @patch('celery.group')
+    def test_failed_batch_dispatch_returns_documents_to_pending(self, mock_group, _pipeline):
+        batch_id = uuid.uuid4()
+        self.service.upload_batch(batch_id, self._payloads(2))
+        mock_group.return_value.freeze.return_value = MagicMock(
+            id='group-1', results=[MagicMock(id='task-1'), MagicMock(id='task-2')],
+        )
+        mock_group.return_value.apply_async.side_effect = ConnectionError("broker down")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.start_batch_processing(batch_id)
+
+        docs = Document.objects.filter(batch_id=batch_id)
+        self.assertEqual({doc.status for doc in docs}, {Document.Status.PENDING})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PromptTemplateCacheTest(TestCase, ClaimlensTestDataMixin):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = LogInHelper().get_or_create_user_api()
+
+    def setUp(self):
+        from django.core.cache import cache
+        from claimlens.engine.adapters.openai_compatible import OpenAICompatibleEngine
+        from claimlens.engine.prompt_cache import reset_prompt_registry
+        cache.clear()
+        reset_prompt_registry()
+        self.service = PromptTemplateService(self.user)
+        self.engine = OpenAICompatibleEngine({
+            'name': 'prompt', 'endpoint_url': 'https://api.test', 'model_name': 'm',
+        })
+        self.template = self.document_type_payload['extraction_template']
+
+    def _save(self, content, document_type_id=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.service.save_version('extraction', content, 'test', document_type_id)
+        self.assertTrue(result.get('success'))
+        return result['data']['id']
+
+    def test_warm_prompt_costs_no_queries(self):
+        self._save('v1 {fields_text}{array_instructions}')
+        self.engine._build_extraction_prompt(self.template)
+        with self.assertNumQueries(0):
+            prompt = self.engine._build_extraction_prompt(self.template)
+        self.assertTrue(prompt.startswith('v1 '))
+
+    def test_save_and_activate_invalidate(self):
+        first_id = self._save('v1 {fields_text}{array_instructions}')
+        self.engine._build_extraction_prompt(self.template)
+
+        self._save('v2 {fields_text}{array_instructions}')
+        self.assertTrue(self.engine._build_extraction_prompt(self.template).startswith('v2 '))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.activate_version(first_id)
+        self.assertTrue(self.engine._build_extraction_prompt(self.template).startswith('v1 '))
+
+    def test_delete_override_falls_back_to_global(self):
+        doc_type = DocumentType(**self.document_type_payload)
+        doc_type.save(user=self.user)
+        self._save('global {fields_text}{array_instructions}')
+        self._save('override {fields_text}{array_instructions}', document_type_id=doc_type.id)
+        self.assertTrue(
+            self.engine._build_extraction_prompt(self.template, document_type_code='CLAIM_FORM').startswith('override ')
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.delete_override('extraction', doc_type.id)
+        self.assertTrue(
+            self.engine._build_extraction_prompt(self.template, document_type_code='CLAIM_FORM').startswith('global ')
+        )
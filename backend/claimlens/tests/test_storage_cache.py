@@ -0,0 +1,80 @@
+import os
+import stat
+import tempfile
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from claimlens.storage_cache import DiskCache, get_disk_cache, get_storage_cache_stats
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class DiskCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(self.tmp.name, max_bytes=1000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_and_counters(self):
+        self.assertIsNone(self.cache.get('documents/a/claim.pdf'))
+        self.cache.put('documents/a/claim.pdf', b'%PDF-bytes')
+        self.assertEqual(self.cache.get('documents/a/claim.pdf'), b'%PDF-bytes')
+
+        stats = get_storage_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_corrupt_entry_is_dropped(self):
+        self.cache.put('k', b'original')
+        path = self.cache._path('k')
+        with open(path, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b'X')
+
+        self.assertIsNone(self.cache.get('k'))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(get_storage_cache_stats()['corrupt'], 1)
+
+    def test_least_recently_used_evicted(self):
+        for name in ('a', 'b', 'c'):
+            self.cache.put(name, b'x' * 300)
+        # Make "a" the most recently used before the sweep
+        os.utime(self.cache._path('b'), (1, 1))
+        os.utime(self.cache._path('c'), (2, 2))
+        self.cache.put('d', b'x' * 300)
+
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertLessEqual(self.cache._entries()[1], 1000)
+
+    def test_expired_entry_is_dropped(self):
+        aging = DiskCache(self.tmp.name, max_bytes=1000, max_age=3600)
+        aging.put('k', b'content')
+        path = aging._path('k')
+        os.utime(path, (1, 1))
+
+        self.assertIsNone(aging.get('k'))
+        self.assertFalse(os.path.exists(path))
+
+    def test_directory_private_to_worker_user(self):
+        directory = os.path.join(self.tmp.name, 'cache')
+        DiskCache(directory, max_bytes=1000).put('k', b'content')
+        self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+        bucket = os.path.dirname(DiskCache(directory, max_bytes=1000)._path('k'))
+        self.assertEqual(stat.S_IMODE(os.stat(bucket).st_mode) & 0o077, 0)
+
+    @patch('claimlens.apps.ClaimlensConfig.storage_cache_dir', '')
+    @patch('claimlens.apps.ClaimlensConfig.storage_cache_enabled', True)
+    def test_disabled_without_explicit_directory(self):
+        self.assertIsNone(get_disk_cache())
+
+    def test_oversized_objects_not_cached(self):
+        small = DiskCache(self.tmp.name, max_bytes=1000, max_object_bytes=10)
+        small.put('big', b'x' * 11)
+        self.assertIsNone(small.get('big'))
@@ -1,8 +1,10 @@
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, patch, MagicMock
 from django.test import TestCase
 
 from core.test_helpers import LogInHelper
-from claimlens.models import Document, DocumentType, ExtractionResult, AuditLog
+from claimlens.models import (
+    Document, DocumentType, ExtractionResult, AuditLog, EngineConfig, EngineCapabilityScore,
+)
 from claimlens.engine.types import LLMResponse
 from claimlens.tests.data import ClaimlensTestDataMixin
 
@@ -44,7 +46,7 @@ class ClassifyDocumentTaskTest(TestCase, ClaimlensTestDataMixin):
         super().setUpClass()
         cls.user = LogInHelper().get_or_create_user_api()
 
-    @patch('claimlens.tasks.EngineManager')
+    @patch('claimlens.engine.manager.get_engine_manager')
     @patch('claimlens.tasks.ClaimlensStorage')
     def test_classify_success(self, mock_storage_cls, mock_manager_cls):
         dt = DocumentType(**self.document_type_payload)
@@ -76,6 +78,49 @@ class ClassifyDocumentTaskTest(TestCase, ClaimlensTestDataMixin):
         self.assertEqual(doc.document_type, dt)
         self.assertEqual(doc.classification_confidence, 0.95)
 
+    @patch('claimlens.engine.manager.get_engine_manager')
+    @patch('claimlens.tasks.ClaimlensStorage')
+    def test_explicit_type_skips_engine(self, mock_storage_cls, mock_manager_cls):
+        dt = DocumentType(**self.document_type_payload)
+        dt.save(user=self.user)
+
+        doc = Document(**self.document_payload, status=Document.Status.PREPROCESSING, document_type=dt)
+        doc.save(user=self.user)
+
+        from claimlens.tasks import classify_document
+        classify_document(str(doc.id), str(self.user.id))
+
+        mock_manager_cls.return_value.classify_routed.assert_not_called()
+        mock_storage_cls.return_value.read.assert_not_called()
+        doc.refresh_from_db()
+        self.assertEqual(doc.document_type, dt)
+        self.assertEqual(doc.classification_confidence, 1.0)
+        audit = AuditLog.objects.get(document=doc, action=AuditLog.Action.CLASSIFY)
+        self.assertEqual(audit.details['method'], 'explicit')
+
+    @patch('claimlens.engine.manager.get_engine_manager')
+    @patch('claimlens.tasks.ClaimlensStorage')
+    def test_classification_routed_by_detected_language(self, mock_storage_cls, mock_manager_cls):
+        DocumentType(**self.document_type_payload).save(user=self.user)
+        doc = Document(
+            **self.document_payload, status=Document.Status.PREPROCESSING,
+            preprocessing_metadata={'language': 'fr', 'language_source': 'text_layer'},
+        )
+        doc.save(user=self.user)
+
+        mock_storage_cls.return_value.read.return_value = b'fake-file-bytes'
+        mock_manager = mock_manager_cls.return_value
+        mock_manager.classify_routed.return_value = (
+            LLMResponse(success=True, data={'document_type_code': 'CLAIM_FORM'}, confidence=0.9), None,
+        )
+
+        from claimlens.tasks import classify_document
+        classify_document(str(doc.id), str(self.user.id))
+
+        self.assertEqual(mock_manager.classify_routed.call_args.kwargs['language'], 'fr')
+        doc.refresh_from_db()
+        self.assertEqual(doc.language, 'fr')
+
 
 class ExtractDocumentTaskTest(TestCase, ClaimlensTestDataMixin):
 
@@ -84,7 +129,7 @@ class ExtractDocumentTaskTest(TestCase, ClaimlensTestDataMixin):
         super().setUpClass()
         cls.user = LogInHelper().get_or_create_user_api()
 
-    @patch('claimlens.tasks.EngineManager')
+    @patch('claimlens.engine.manager.get_engine_manager')
     @patch('claimlens.tasks.ClaimlensStorage')
     def test_extract_high_confidence_completes(self, mock_storage_cls, mock_manager_cls):
         dt = DocumentType(**self.document_type_payload)
@@ -117,7 +162,7 @@ class ExtractDocumentTaskTest(TestCase, ClaimlensTestDataMixin):
         self.assertEqual(doc.status, Document.Status.COMPLETED)
         self.assertTrue(ExtractionResult.objects.filter(document=doc).exists())
 
-    @patch('claimlens.tasks.EngineManager')
+    @patch('claimlens.engine.manager.get_engine_manager')
     @patch('claimlens.tasks.ClaimlensStorage')
     def test_extract_low_confidence_fails(self, mock_storage_cls, mock_manager_cls):
         doc = Document(**self.document_payload, status=Document.Status.CLASSIFYING)
@@ -152,7 +197,7 @@ class ExtractDocumentTaskTest(TestCase, ClaimlensTestDataMixin):
         doc.refresh_from_db()
         self.assertEqual(doc.status, Document.Status.FAILED)
 
-    @patch('claimlens.tasks.EngineManager')
+    @patch('claimlens.engine.manager.get_engine_manager')
     @patch('claimlens.tasks.ClaimlensStorage')
     def test_extract_medium_confidence_review_required(self, mock_storage_cls, mock_manager_cls):
         doc = Document(**self.document_payload, status=Document.Status.CLASSIFYING)
@@ -186,3 +231,361 @@ class ExtractDocumentTaskTest(TestCase, ClaimlensTestDataMixin):
 
         doc.refresh_from_db()
         self.assertEqual(doc.status, Document.Status.REVIEW_REQUIRED)
+
+
+    @patch('claimlens.engine.manager.get_engine_manager')
+    @patch('claimlens.tasks.ClaimlensStorage')
+    def test_locally_classified_document_scored_against_extracting_engine(self, mock_storage_cls, mock_manager_cls):
+        dt = DocumentType(**self.document_type_payload)
+        dt.save(user=self.user)
+        engine = EngineConfig(**self.engine_config_payload)
+        engine.save(user=self.user)
+        # Classified locally: a type and language, but no engine
+        doc = Document(
+            **self.document_payload, document_type=dt, language='fr',
+            classification_confidence=1.0, status=Document.Status.CLASSIFYING,
+        )
+        doc.save(user=self.user)
+
+        mock_storage_cls.return_value.read.return_value = b'fake-file-bytes'
+        mock_manager = mock_manager_cls.return_value
+        mock_manager.get_primary_engine_config.return_value = engine
+        mock_manager.extract_routed.return_value = (
+            LLMResponse(
+                success=True, data=self.sample_llm_extraction_response, confidence=0.95,
+                processing_time_ms=1500, engine_name='test',
+            ),
+            None,
+        )
+
+        from claimlens.tasks import extract_document
+        extract_document(str(doc.id), str(self.user.id))
+
+        doc.refresh_from_db()
+        self.assertEqual(doc.status, Document.Status.COMPLETED)
+        self.assertEqual(doc.engine_config, engine)
+        self.assertTrue(
+            EngineCapabilityScore.objects.filter(engine_config=engine, language='fr', document_type=dt).exists()
+        )
+
+
+class RenderArtifactTest(TestCase):
+
+    def _doc(self, mime_type='application/pdf', metadata=None):
+        doc = MagicMock()
+        doc.id = 'doc-1'
+        doc.mime_type = mime_type
+        doc.storage_key = 'documents/x/claim.pdf'
+        doc.preprocessing_metadata = metadata or {}
+        return doc
+
+    @patch('claimlens.apps.ClaimlensConfig.multipage_extraction_mode', 'off')
+    @patch('claimlens.preprocessing.render_pdf_pages', return_value=[b'png-bytes'])
+    def test_store_render_saves_png_once(self, mock_render):
+        from claimlens.tasks import _store_render
+        storage = MagicMock()
+        storage.save.return_value = 'documents/x/claim.pdf.render/page-1.png'
+        metadata = {}
+
+        pages = _store_render(storage, self._doc(), b'%PDF', metadata)
+
+        mock_render.assert_called_once_with(b'%PDF', max_pages=1)
+        storage.save.assert_called_once()
+        self.assertEqual(pages, [b'png-bytes'])
+        self.assertEqual(metadata['render_key'], 'documents/x/claim.pdf.render/page-1.png')
+        self.assertEqual(metadata['render_mime_type'], 'image/png')
+
+    @patch('claimlens.preprocessing.render_pdf_pages')
+    def test_store_render_skips_images(self, mock_render):
+        from claimlens.tasks import _store_render
+        metadata = {}
+        _store_render(MagicMock(), self._doc(mime_type='image/jpeg'), b'jpeg', metadata)
+        mock_render.assert_not_called()
+        self.assertNotIn('render_key', metadata)
+
+    @patch('claimlens.apps.ClaimlensConfig.local_classification_enabled', True)
+    @patch('claimlens.preprocessing.perceptual_hash', return_value='ffff0000ffff0000')
+    @patch('claimlens.preprocessing.render_pdf_page')
+    def test_perceptual_hash_reuses_first_page_render(self, mock_render, mock_hash):
+        from claimlens.tasks import _store_perceptual_hash
+        metadata = {}
+
+        _store_perceptual_hash(self._doc(), b'%PDF', metadata, [b'page-1', b'page-2'])
+
+        mock_hash.assert_called_once_with(b'page-1')
+        mock_render.assert_not_called()
+        self.assertEqual(metadata['phash'], 'ffff0000ffff0000')
+
+    def test_read_document_input_prefers_render(self):
+        from claimlens.tasks import _read_document_input
+        storage = MagicMock()
+        storage.read.return_value = b'png-bytes'
+        doc = self._doc(metadata={'render_key': 'r.png', 'render_mime_type': 'image/png'})
+
+        data, mime_type = _read_document_input(storage, doc)
+
+        storage.read.assert_called_once_with('r.png')
+        self.assertEqual((data, mime_type), (b'png-bytes', 'image/png'))
+
+    def test_read_document_input_falls_back_to_original(self):
+        from claimlens.tasks import _read_document_input
+        storage = MagicMock()
+        storage.read.side_effect = [Exception('missing'), b'%PDF']
+        doc = self._doc(metadata={'render_key': 'r.png'})
+
+        data, mime_type = _read_document_input(storage, doc)
+
+        self.assertEqual((data, mime_type), (b'%PDF', 'application/pdf'))
+
+    def test_read_document_input_prefers_text_layer(self):
+        import json
+        from claimlens.tasks import _read_document_input
+        storage = MagicMock()
+        storage.read.return_value = json.dumps(['Invoice text', None]).encode()
+        doc = self._doc(metadata={'render_key': 'r.png', 'text_layer_key': 't.json'})
+
+        data, mime_type = _read_document_input(storage, doc)
+
+        storage.read.assert_called_once_with('t.json')
+        self.assertEqual((data, mime_type), (b'Invoice text', 'text/plain'))
+
+    @patch('claimlens.tasks._multipage_mode', return_value='combined')
+    def test_read_page_inputs_mixes_text_and_scanned_pages(self, _mode):
+        import json
+        from claimlens.tasks import _read_page_inputs
+        reads = {'t.json': json.dumps(['Page one text', None]).encode(), 'p2.png': b'png-2'}
+        storage = MagicMock()
+        storage.read.side_effect = reads.__getitem__
+        doc = self._doc(metadata={
+            'page_render_keys': ['p1.png', 'p2.png'], 'render_mime_type': 'image/png',
+            'text_layer_key': 't.json',
+        })
+
+        pages = _read_page_inputs(storage, doc)
+
+        self.assertEqual(pages, [(b'Page one text', 'text/plain'), (b'png-2', 'image/png')])
+
+
+class TextLayerTest(TestCase):
+
+    def test_usable_text_layer(self):
+        from claimlens.preprocessing import is_text_layer_usable
+        self.assertTrue(is_text_layer_usable('[72,90] Patient: John Doe ' * 20))
+        self.assertFalse(is_text_layer_usable('[72,90] p.1'))
+        self.assertFalse(is_text_layer_usable('�' * 300))
+
+    def test_detect_language(self):
+        from claimlens.preprocessing import detect_language
+        french = ('Nom du patient: Jean Dupont. La demande de remboursement pour le traitement du '
+                  'paludisme est présentée par le médecin avec le montant total de la facture des soins')
+        self.assertEqual(detect_language(french)[0], 'fr')
+        self.assertEqual(detect_language('اسم المريض محمد علي تاريخ الزيارة')[0], 'ar')
+        self.assertIsNone(detect_language('Invoice 2024-001'))
+
+
+class HintTextTest(TestCase):
+    document_types = [
+        {'code': 'CLAIM_FORM', 'classification_hints': '"Claim Form", "Patient ID", "Diagnosis"'},
+        {'code': 'INVOICE', 'classification_hints': 'invoice number, total due, vat'},
+    ]
+
+    @patch('claimlens.apps.ClaimlensConfig.local_classification_enabled', True)
+    @patch('claimlens.apps.ClaimlensConfig.language_detection_enabled', False)
+    @patch('claimlens.apps.ClaimlensConfig.text_layer_mode', 'off')
+    @patch('claimlens.models.AuditLog')
+    @patch('claimlens.tasks._store_perceptual_hash')
+    @patch('claimlens.tasks._store_render')
+    @patch('claimlens.preprocessing.extract_pdf_text', return_value=['[72,40] Claim Form\n[72,90] Patient ID: 42'])
+    @patch('claimlens.preprocessing.analyze_image', return_value={'quality_score': 0.9})
+    def test_hint_text_kept_with_text_layer_off(self, _analyze, mock_extract, _render, _phash, mock_audit):
+        from claimlens.tasks import _preprocess
+        doc = MagicMock()
+        doc.mime_type = 'application/pdf'
+        doc.language = None
+
+        _preprocess(doc, MagicMock(), MagicMock())
+
+        mock_extract.assert_called_once_with(ANY, max_pages=1)
+        self.assertEqual(doc.preprocessing_metadata['hint_text'], '[72,40] Claim Form\n[72,90] Patient ID: 42')
+        self.assertNotIn('text_layer_key', doc.preprocessing_metadata)
+        self.assertNotIn('hint_text', mock_audit.call_args.kwargs['details'])
+
+    @patch('claimlens.apps.ClaimlensConfig.local_classification_enabled', True)
+    def test_hints_matched_without_text_layer(self):
+        from claimlens.classification import HINTS
+        from claimlens.tasks import _classify_locally
+        doc = MagicMock()
+        doc.document_type_id = None
+        doc.preprocessing_metadata = {'hint_text': '[72,40] Claim Form\n[72,90] Patient ID: 42\n[72,140] Diagnosis'}
+        storage = MagicMock()
+
+        self.assertEqual(_classify_locally(storage, doc, self.document_types), ('CLAIM_FORM', 1.0, HINTS))
+        storage.read.assert_not_called()
+
+
+class FusedDocumentTypesTest(TestCase):
+
+    def _rows(self, fused_extraction=False, template=None):
+        return [
+            {'code': 'CLAIM_FORM', 'name': 'Claim form', 'classification_hints': '',
+             'extraction_template': template or {'patient_name': {'type': 'string'}},
+             'fused_extraction': fused_extraction},
+            {'code': 'INVOICE', 'name': 'Invoice', 'classification_hints': '',
+             'extraction_template': {'total': {'type': 'decimal'}}, 'fused_extraction': False},
+        ]
+
+    def test_not_fused_without_flags(self):
+        from claimlens.tasks import _fused_document_types
+        self.assertIsNone(_fused_document_types(self._rows()))
+
+    def test_only_fused_types_carry_templates(self):
+        from claimlens.tasks import _fused_document_types
+        types = _fused_document_types(self._rows(fused_extraction=True))
+
+        self.assertEqual([dt['code'] for dt in types], ['CLAIM_FORM', 'INVOICE'])
+        self.assertEqual(types[0]['extraction_template'], {'patient_name': {'type': 'string'}})
+        self.assertEqual(types[1]['extraction_template'], {})
+
+    @patch('claimlens.apps.ClaimlensConfig.fused_max_template_chars', 100)
+    def test_oversized_templates_fall_back(self):
+        from claimlens.tasks import _fused_document_types
+        template = {f'field_{i}': {'type': 'string'} for i in range(20)}
+        self.assertIsNone(_fused_document_types(self._rows(fused_extraction=True, template=template)))
+
+
+class FusedClassificationTest(TestCase, ClaimlensTestDataMixin):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = LogInHelper().get_or_create_user_api()
+
+    @patch('claimlens.apps.ClaimlensConfig.multipage_extraction_mode', 'combined')
+    @patch('claimlens.apps.ClaimlensConfig.fused_classify_extract_enabled', True)
+    @patch('claimlens.engine.manager.get_engine_manager')
+    @patch('claimlens.tasks.ClaimlensStorage')
+    def test_multipage_document_not_fused(self, mock_storage_cls, mock_manager_cls):
+        DocumentType(**self.document_type_payload).save(user=self.user)
+        doc = Document(
+            **self.document_payload, status=Document.Status.PREPROCESSING,
+            preprocessing_metadata={'page_render_keys': ['p1.png', 'p2.png', 'p3.png'], 'render_key': 'p1.png'},
+        )
+        doc.save(user=self.user)
+
+        mock_storage_cls.return_value.read.return_value = b'png'
+        mock_manager = mock_manager_cls.return_value
+        mock_manager.get_primary_engine_config.return_value = None
+        mock_manager.classify_routed.return_value = (
+            LLMResponse(success=True, data={'document_type_code': 'CLAIM_FORM'}, confidence=0.95), None,
+        )
+
+        from claimlens.tasks import classify_document
+        classify_document(str(doc.id), str(self.user.id))
+
+        mock_manager.classify_extract_routed.assert_not_called()
+        self.assertFalse(ExtractionResult.objects.filter(document=doc).exists())
+
+    @patch('claimlens.engine.manager.get_engine_manager')
+    @patch('claimlens.tasks.ClaimlensStorage')
+    def test_classification_skipped_once_extracted(self, mock_storage_cls, mock_manager_cls):
+        DocumentType(**self.document_type_payload).save(user=self.user)
+        doc = Document(**self.document_payload, status=Document.Status.COMPLETED)
+        doc.save(user=self.user)
+        ExtractionResult(document=doc, structured_data={}, field_confidences={}).save(user=self.user)
+
+        from claimlens.tasks import classify_document
+        classify_document(str(doc.id), str(self.user.id))
+
+        mock_manager_cls.return_value.classify_extract_routed.assert_not_called()
+        mock_manager_cls.return_value.classify_routed.assert_not_called()
+        doc.refresh_from_db()
+        self.assertEqual(doc.status, Document.Status.COMPLETED)
+
+
+class FusedPipelineTest(TestCase, ClaimlensTestDataMixin):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = LogInHelper().get_or_create_user_api()
+
+    def test_buffered_storage_keeps_objects_in_memory(self):
+        from claimlens.storage import BufferedStorage
+        backend = MagicMock()
+        backend.read.return_value = b'original'
+        backend.save.side_effect = lambda key, content, content_type=None: key
+        storage = BufferedStorage(backend)
+
+        self.assertEqual(storage.read('doc.pdf'), b'original')
+        self.assertEqual(storage.read('doc.pdf'), b'original')
+        storage.save('doc.pdf.render/page-1.png', b'png', content_type='image/png')
+        self.assertEqual(storage.read('doc.pdf.render/page-1.png'), b'png')
+
+        backend.read.assert_called_once_with('doc.pdf')
+
+    def test_pipeline_mode(self):
+        from claimlens.tasks import processing_pipeline, process_document
+        doc = MagicMock(id='doc-1', file_size=1024)
+
+        with patch('claimlens.apps.ClaimlensConfig.processing_pipeline_mode', 'chain'):
+            self.assertEqual(len(processing_pipeline(doc, 'user-1').tasks), 3)
+        with patch('claimlens.apps.ClaimlensConfig.processing_pipeline_mode', 'auto'):
+            self.assertEqual(processing_pipeline(doc, 'user-1').task, process_document.name)
+            doc.file_size = 50 * 1024 * 1024
+            self.assertEqual(len(processing_pipeline(doc, 'user-1').tasks), 3)
+
+    @patch('claimlens.engine.manager.get_engine_manager')
+    @patch('claimlens.preprocessing.analyze_image', return_value={'quality_score': 0.9})
+    @patch('claimlens.storage.ClaimlensStorage')
+    def test_fused_task_downloads_once(self, mock_storage_cls, _analyze, mock_manager_cls):
+        dt = DocumentType(**self.document_type_payload)
+        dt.save(user=self.user)
+        doc = Document(
+            **dict(self.document_payload, mime_type='image/jpeg'),
+            status=Document.Status.PREPROCESSING, document_type=dt,
+        )
+        doc.save(user=self.user)
+
+        mock_storage_cls.return_value.read.return_value = b'jpeg-bytes'
+        mock_manager_cls.return_value.get_primary_engine_config.return_value = None
+        mock_manager_cls.return_value.extract_routed.return_value = (
+            LLMResponse(
+                success=True, confidence=0.95, engine_name='test',
+                data={'fields': {'patient_name': {'value': 'John', 'confidence': 0.95}},
+                      'aggregate_confidence': 0.95},
+            ),
+            None,
+        )
+
+        from claimlens.tasks import process_document
+        process_document(str(doc.id), str(self.user.id))
+
+        mock_storage_cls.return_value.read.assert_called_once_with(doc.storage_key)
+        doc.refresh_from_db()
+        self.assertEqual(doc.status, Document.Status.COMPLETED)
+        self.assertTrue(ExtractionResult.objects.filter(document=doc).exists())
+
+
+class DeleteUnconfirmedUploadTest(TestCase, ClaimlensTestDataMixin):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = LogInHelper().get_or_create_user_api()
+
+    @patch('claimlens.storage.ClaimlensStorage')
+    def test_unconfirmed_upload_deleted(self, mock_storage_cls):
+        from claimlens.tasks import delete_unconfirmed_upload
+
+        mock_storage_cls.return_value.exists.return_value = True
+        delete_unconfirmed_upload('documents/abandoned/claim.pdf')
+        mock_storage_cls.return_value.delete.assert_called_once_with('documents/abandoned/claim.pdf')
+
+    @patch('claimlens.storage.ClaimlensStorage')
+    def test_confirmed_upload_kept(self, mock_storage_cls):
+        from claimlens.tasks import delete_unconfirmed_upload
+
+        doc = Document(**self.document_payload)
+        doc.save(user=self.user)
+        delete_unconfirmed_upload(doc.storage_key)
+        mock_storage_cls.return_value.delete.assert_not_called()
@@ -1,3 +1,7 @@
+import hashlib
+import json
+import uuid
+import zipfile
 from dataclasses import dataclass
 from io import BytesIO
 from unittest.mock import patch, MagicMock
@@ -10,6 +14,8 @@ from core.models import User
 from core.test_helpers import create_test_interactive_user
 from graphql_jwt.shortcuts import get_token
 
+from claimlens.models import AuditLog, Document
+from claimlens.services import DocumentService
 from claimlens.tests.data import ClaimlensTestDataMixin
 
 
@@ -85,6 +91,275 @@ class UploadViewTest(TestCase, ClaimlensTestDataMixin):
         self.assertEqual(response.status_code, 500)
 
 
+@override_settings(ROOT_URLCONF='claimlens.tests.test_views')
+class DownloadViewTest(TestCase, ClaimlensTestDataMixin):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = create_test_interactive_user(username='claimlens_download_test')
+        cls.token = get_token(cls.user, DummyContext(user=cls.user))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.doc = Document(**self.document_payload)
+        self.doc.save(user=self.user)
+        self.url = f'/api/claimlens/documents/{self.doc.uuid}/download/'
+
+    def _mock_storage(self, mock_storage_cls, content=b'%PDF-1.4 0123456789'):
+        mock_storage = MagicMock()
+        mock_storage.stat.return_value = (len(content), '"abc123"')
+
+        def stream(key, start=None, end=None, chunk_size=None):
+            return iter([content[start or 0:(end + 1) if end is not None else None]])
+
+        mock_storage.stream.side_effect = stream
+        mock_storage_cls.return_value = mock_storage
+        return mock_storage
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_streams_whole_document(self, mock_storage_cls):
+        mock_storage = self._mock_storage(mock_storage_cls)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 0123456789')
+        self.assertEqual(response['ETag'], '"abc123"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        mock_storage.read.assert_not_called()
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_range_request(self, mock_storage_cls):
+        self._mock_storage(mock_storage_cls)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=9-')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 9-18/19')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_unsatisfiable_range(self, mock_storage_cls):
+        self._mock_storage(mock_storage_cls)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-200')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */19')
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_if_none_match_not_modified(self, mock_storage_cls):
+        mock_storage = self._mock_storage(mock_storage_cls)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"abc123"')
+
+        self.assertEqual(response.status_code, 304)
+        mock_storage.stream.assert_not_called()
+
+    @patch('claimlens.apps.ClaimlensConfig.download_presigned_urls', True)
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_presigned_redirect(self, mock_storage_cls):
+        mock_storage = self._mock_storage(mock_storage_cls)
+        mock_storage.presigned_url.return_value = 'http://minio:9000/claimlens/doc?X-Amz-Signature=sig'
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], 'http://minio:9000/claimlens/doc?X-Amz-Signature=sig')
+        mock_storage.stream.assert_not_called()
+
+
+@override_settings(ROOT_URLCONF='claimlens.tests.test_views')
+class DirectUploadViewTest(TestCase, ClaimlensTestDataMixin):
+
+    content = b'%PDF-1.4 direct upload'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = create_test_interactive_user(username='claimlens_direct_upload_test')
+        cls.token = get_token(cls.user, DummyContext(user=cls.user))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def _presign(self, mock_storage_cls, **overrides):
+        mock_storage = MagicMock()
+        mock_storage.presigned_upload_url.return_value = 'http://minio:9000/claimlens/put?X-Amz-Signature=sig'
+        mock_storage_cls.return_value = mock_storage
+        payload = {
+            'filename': 'claim.pdf',
+            'mime_type': 'application/pdf',
+            'file_size': len(self.content),
+            'sha256': hashlib.sha256(self.content).hexdigest(),
+            **overrides,
+        }
+        with patch('claimlens.tasks.delete_unconfirmed_upload.apply_async') as mock_cleanup:
+            response = self.client.post('/api/claimlens/upload/presign/', payload, format='json')
+        self.cleanup = mock_cleanup
+        return mock_storage, response
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_presign_and_confirm(self, mock_storage_cls):
+        mock_storage, response = self._presign(mock_storage_cls)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['method'], 'PUT')
+        self.assertTrue(body['storage_key'].endswith('/claim.pdf'))
+        self.assertEqual(
+            mock_storage.presigned_upload_url.call_args.kwargs['content_length'], len(self.content),
+        )
+        self.assertEqual(self.cleanup.call_args.kwargs['args'], (body['storage_key'],))
+
+        mock_storage.stat.return_value = (len(self.content), '"etag"')
+        mock_storage.sha256.return_value = hashlib.sha256(self.content).hexdigest()
+        response = self.client.post(
+            '/api/claimlens/upload/confirm/', {'upload_token': body['upload_token']}, format='json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        doc = Document.objects.get(storage_key=body['storage_key'])
+        self.assertEqual(doc.file_size, len(self.content))
+        audit = AuditLog.objects.get(document=doc, action=AuditLog.Action.UPLOAD)
+        self.assertEqual(audit.details['sha256'], hashlib.sha256(self.content).hexdigest())
+
+        response = self.client.post(
+            '/api/claimlens/upload/confirm/', {'upload_token': body['upload_token']}, format='json',
+        )
+        self.assertEqual(response.status_code, 409)
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_presign_sanitizes_filename(self, mock_storage_cls):
+        _mock_storage, response = self._presign(mock_storage_cls, filename='../../other/"claim" form.pdf')
+        self.assertEqual(response.status_code, 200)
+        storage_key = response.json()['storage_key']
+        self.assertTrue(storage_key.endswith('/claim_form.pdf'))
+        self.assertEqual(storage_key.count('/'), 2)
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_concurrent_confirm_returns_existing_document(self, mock_storage_cls):
+        mock_storage, response = self._presign(mock_storage_cls)
+        body = response.json()
+        mock_storage.stat.return_value = (len(self.content), '"etag"')
+        mock_storage.sha256.return_value = hashlib.sha256(self.content).hexdigest()
+        upload = DocumentService.upload
+
+        def confirmed_meanwhile(service, obj_data):
+            # The other request creates the document between our check and our insert
+            upload(service, dict(obj_data))
+            return upload(service, obj_data)
+
+        with patch.object(DocumentService, 'upload', autospec=True, side_effect=confirmed_meanwhile):
+            response = self.client.post(
+                '/api/claimlens/upload/confirm/', {'upload_token': body['upload_token']}, format='json',
+            )
+
+        self.assertEqual(response.status_code, 409)
+        doc = Document.objects.get(storage_key=body['storage_key'])
+        self.assertEqual(response.json()['document']['id'], str(doc.id))
+        mock_storage.delete.assert_not_called()
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_confirm_rejects_size_mismatch(self, mock_storage_cls):
+        mock_storage, response = self._presign(mock_storage_cls)
+        body = response.json()
+
+        mock_storage.stat.return_value = (len(self.content) + 1, '"etag"')
+        response = self.client.post(
+            '/api/claimlens/upload/confirm/', {'upload_token': body['upload_token']}, format='json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        mock_storage.delete.assert_called_once_with(body['storage_key'])
+        self.assertFalse(Document.objects.filter(storage_key=body['storage_key']).exists())
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_confirm_rejects_checksum_mismatch(self, mock_storage_cls):
+        mock_storage, response = self._presign(mock_storage_cls)
+        body = response.json()
+
+        mock_storage.stat.return_value = (len(self.content), '"etag"')
+        mock_storage.sha256.return_value = hashlib.sha256(b'something else').hexdigest()
+        response = self.client.post(
+            '/api/claimlens/upload/confirm/', {'upload_token': body['upload_token']}, format='json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        mock_storage.delete.assert_called_once_with(body['storage_key'])
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_confirm_rejects_tampered_token(self, mock_storage_cls):
+        _mock_storage, response = self._presign(mock_storage_cls)
+        token = response.json()['upload_token']
+
+        response = self.client.post(
+            '/api/claimlens/upload/confirm/', {'upload_token': token[:-2] + 'xx'}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_presign_rejects_oversized_file(self, mock_storage_cls):
+        _mock_storage, response = self._presign(mock_storage_cls, file_size=100 * 1024 * 1024)
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='claimlens.tests.test_views')
+class BatchUploadViewTest(TestCase, ClaimlensTestDataMixin):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = create_test_interactive_user(username='claimlens_batch_test')
+        cls.token = get_token(cls.user, DummyContext(user=cls.user))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    @patch('claimlens.views.ClaimlensStorage')
+    def test_zip_upload_with_hints(self, mock_storage_cls):
+        mock_storage = MagicMock()
+        mock_storage.save.side_effect = lambda key, content, content_type=None: key
+        mock_storage_cls.return_value = mock_storage
+
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as bundle:
+            bundle.writestr('march/claim_1.pdf', b'%PDF-1.4 one')
+            bundle.writestr('march/claim_2.pdf', b'%PDF-1.4 two')
+            bundle.writestr('march/notes.txt', b'not a claim')
+        archive.seek(0)
+        archive.name = 'march.zip'
+
+        response = self.client.post('/api/claimlens/batches/', {
+            'archive': archive,
+            'hints': json.dumps({'claim_2.pdf': {'language': 'sw'}}),
+            'language': 'en',
+            'process': 'false',
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(len(body['documents']), 2)
+        self.assertEqual([r['filename'] for r in body['rejected']], ['march/notes.txt'])
+        self.assertEqual(mock_storage.save.call_count, 2)
+        languages = dict(
+            Document.objects.filter(batch_id=body['batch_id']).values_list('original_filename', 'language')
+        )
+        self.assertEqual(languages, {'march/claim_1.pdf': 'en', 'march/claim_2.pdf': 'sw'})
+
+        response = self.client.get(f"/api/claimlens/batches/{body['batch_id']}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], 2)
+        self.assertEqual(response.json()['statuses'], {'pending': 2})
+
+    def test_batch_progress_not_found(self):
+        response = self.client.get(f'/api/claimlens/batches/{uuid.uuid4()}/')
+        self.assertEqual(response.status_code, 404)
+
+
 @override_settings(ROOT_URLCONF='claimlens.tests.test_views')
 class HealthCheckViewTest(TestCase):
 
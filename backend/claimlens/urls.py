@@ -1,9 +1,13 @@
 from django.urls import path
 
-from claimlens.views import upload_document, health_check, download_document
+from claimlens.views import upload_document, presign_upload, confirm_upload, upload_batch, batch_progress, health_check, download_document
 
 urlpatterns = [
     path('upload/', upload_document),
+    path('upload/presign/', presign_upload),
+    path('upload/confirm/', confirm_upload),
+    path('batches/', upload_batch),
+    path('batches/<uuid:batch_id>/', batch_progress),
     path('health/', health_check),
     path('documents/<uuid:document_uuid>/download/', download_document),
 ]
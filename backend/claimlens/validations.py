@@ -79,6 +79,26 @@ class EngineConfigValidation(BaseModelValidation):
             raise ValidationError(
                 f"Invalid adapter: {adapter}. Valid: {', '.join(valid_adapters)}"
             )
+        cls.validate_image_budget(data.get('image_budget'))
+
+    @staticmethod
+    def validate_image_budget(budget):
+        from claimlens.preprocessing import IMAGE_BUDGET_KEYS, IMAGE_FORMATS
+        if not budget:
+            return
+        if not isinstance(budget, dict):
+            raise ValidationError("image_budget must be a JSON object")
+        unknown = set(budget) - set(IMAGE_BUDGET_KEYS)
+        if unknown:
+            raise ValidationError(f"Unknown image_budget keys: {', '.join(sorted(unknown))}")
+        fmt = budget.get('format')
+        if fmt and fmt not in IMAGE_FORMATS and fmt != 'original':
+            raise ValidationError(
+                f"Invalid image_budget format: {fmt}. Valid: original, {', '.join(IMAGE_FORMATS)}"
+            )
+        quality = budget.get('quality')
+        if quality is not None and not 1 <= quality <= 100:
+            raise ValidationError("image_budget quality must be between 1 and 100")
 
     @classmethod
     def validate_update(cls, user, **data):
@@ -1,20 +1,36 @@
+import functools
+import json
 import logging
+import mimetypes
+import os
+import re
 import uuid as uuid_lib
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
-from django.core.exceptions import PermissionDenied
-from django.http import HttpResponse
+from django.core import signing
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.text import get_valid_filename
 from django.utils.translation import gettext as _
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 
 from core.security import checkUserWithRights
+from core.services.utils import model_representation
 from claimlens.apps import ClaimlensConfig
-from claimlens.models import Document
+from claimlens.models import Document, DocumentType
 from claimlens.services import DocumentService
 from claimlens.storage import ClaimlensStorage
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_TOKEN_SALT = "claimlens.direct-upload"
+# Upload tokens outlive their presigned URL so a slow PUT can still be confirmed
+UPLOAD_TOKEN_MAX_AGE_FACTOR = 2
+UPLOAD_CLEANUP_GRACE_SECONDS = 300
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
 
 @api_view(["POST"])
 @permission_classes([checkUserWithRights(ClaimlensConfig.gql_mutation_upload_document_perms)])
@@ -27,38 +43,224 @@ def upload_document(request):
     file_size = file.size
     original_filename = file.name
 
+    document_type, error = _check_upload(mime_type, file_size, request.data.get('document_type'))
+    if error:
+        return error
+
+    storage_key = f"documents/{uuid_lib.uuid4()}/{original_filename}"
+
+    try:
+        storage = ClaimlensStorage()
+        storage.save(storage_key, file, content_type=mime_type)
+    except Exception as e:
+        logger.error("Failed to upload file to storage: %s", e)
+        return Response(
+            {"success": False, "error": "Failed to store file"},
+            status=500,
+        )
+
+    service = DocumentService(request.user)
+    result = service.upload({
+        'original_filename': original_filename,
+        'mime_type': mime_type,
+        'file_size': file_size,
+        'storage_key': storage_key,
+        'document_type': document_type,
+    })
+
+    if result.get('success'):
+        return Response({
+            "success": True,
+            "document": result.get('data', {}),
+        })
+    else:
+        storage.delete(storage_key)
+        return Response(
+            {"success": False, "error": result.get('detail', 'Upload failed')},
+            status=500,
+        )
+
+
+def _check_upload(mime_type, file_size, document_type_code=None):
+    """Validate an upload's type, size and optional type hint; returns ``(document_type, error_response)``."""
     allowed = ClaimlensConfig.allowed_mime_types
     if allowed and mime_type not in allowed:
-        return Response(
+        return None, Response(
             {"success": False, "error": f"Unsupported file type: {mime_type}"},
             status=400,
         )
 
     max_bytes = (ClaimlensConfig.max_file_size_mb or 20) * 1024 * 1024
     if file_size > max_bytes:
-        return Response(
+        return None, Response(
             {"success": False, "error": f"File too large. Max: {ClaimlensConfig.max_file_size_mb} MB"},
             status=400,
         )
 
+    # Optional type known to the uploader; the document then skips LLM classification
+    document_type = None
+    if document_type_code:
+        document_type = DocumentType.objects.filter(
+            code=document_type_code, is_active=True, is_deleted=False
+        ).first()
+        if not document_type:
+            return None, Response(
+                {"success": False, "error": f"Unknown document type: {document_type_code}"},
+                status=400,
+            )
+    return document_type, None
+
+
+def _safe_filename(name):
+    """Client-supplied file name reduced to one path component fit for storage keys and headers."""
+    try:
+        return get_valid_filename(os.path.basename(str(name))) or "upload"
+    except SuspiciousFileOperation:
+        return "upload"
+
+
+def _already_confirmed(storage_key):
+    """409 with the document already created for a direct upload, or None."""
+    doc = Document.objects.filter(storage_key=storage_key).first()
+    if doc is None:
+        return None
+    return Response(
+        {"success": False, "error": "Upload already confirmed", "document": model_representation(doc)},
+        status=409,
+    )
+
+
+@api_view(["POST"])
+@permission_classes([checkUserWithRights(ClaimlensConfig.gql_mutation_upload_document_perms)])
+def presign_upload(request):
+    """First step of a direct upload: a presigned PUT URL for a new storage key.
+
+    The returned ``upload_token`` carries the declared file details, signed, so
+    ``confirm_upload`` can verify the stored object against them.
+    """
+    original_filename = request.data.get('filename')
+    if original_filename:
+        original_filename = _safe_filename(original_filename)
+    mime_type = request.data.get('mime_type')
+    try:
+        file_size = int(request.data.get('file_size'))
+    except (TypeError, ValueError):
+        file_size = None
+    if not original_filename or not mime_type or file_size is None:
+        return Response(
+            {"success": False, "error": "filename, mime_type and file_size are required"},
+            status=400,
+        )
+
+    document_type_code = request.data.get('document_type') or None
+    _document_type, error = _check_upload(mime_type, file_size, document_type_code)
+    if error:
+        return error
+
     storage_key = f"documents/{uuid_lib.uuid4()}/{original_filename}"
+    expires_in = ClaimlensConfig.upload_presigned_url_expiry_seconds or 900
+    try:
+        upload_url = ClaimlensStorage().presigned_upload_url(
+            storage_key, expires_in=expires_in, content_type=mime_type, content_length=file_size,
+        )
+    except Exception as e:
+        logger.error("Failed to presign upload: %s", e)
+        return Response({"success": False, "error": "Failed to prepare upload"}, status=500)
 
+    # Objects never confirmed are deleted once their token can no longer be redeemed
     try:
-        storage = ClaimlensStorage()
-        storage.save(storage_key, file, content_type=mime_type)
+        from claimlens.tasks import delete_unconfirmed_upload
+        delete_unconfirmed_upload.apply_async(
+            args=(storage_key,),
+            countdown=UPLOAD_TOKEN_MAX_AGE_FACTOR * expires_in + UPLOAD_CLEANUP_GRACE_SECONDS,
+            queue='claimlens.preprocessing',
+        )
     except Exception as e:
-        logger.error("Failed to upload file to storage: %s", e)
+        logger.error("Failed to schedule cleanup of upload %s: %s", storage_key, e)
+
+    upload_token = signing.dumps({
+        'user': str(request.user.id),
+        'storage_key': storage_key,
+        'original_filename': original_filename,
+        'mime_type': mime_type,
+        'file_size': file_size,
+        'sha256': (request.data.get('sha256') or '').lower() or None,
+        'document_type': document_type_code,
+    }, salt=UPLOAD_TOKEN_SALT)
+
+    return Response({
+        "success": True,
+        "upload_url": upload_url,
+        "method": "PUT",
+        "headers": {"Content-Type": mime_type},
+        "expires_in": expires_in,
+        "storage_key": storage_key,
+        "upload_token": upload_token,
+    })
+
+
+@api_view(["POST"])
+@permission_classes([checkUserWithRights(ClaimlensConfig.gql_mutation_upload_document_perms)])
+def confirm_upload(request):
+    """Second step of a direct upload: verify the stored object and create its Document.
+
+    The object's size must match the declared size and, when a SHA-256 was
+    declared, its content must hash to it; otherwise the object is deleted.
+    """
+    try:
+        upload = signing.loads(
+            request.data.get('upload_token') or '',
+            salt=UPLOAD_TOKEN_SALT,
+            max_age=UPLOAD_TOKEN_MAX_AGE_FACTOR * (ClaimlensConfig.upload_presigned_url_expiry_seconds or 900),
+        )
+    except signing.BadSignature:
+        return Response({"success": False, "error": "Invalid or expired upload token"}, status=400)
+    if upload['user'] != str(request.user.id):
+        return Response({"success": False, "error": "Invalid or expired upload token"}, status=400)
+
+    storage_key = upload['storage_key']
+    confirmed = _already_confirmed(storage_key)
+    if confirmed:
+        return confirmed
+
+    storage = ClaimlensStorage()
+    try:
+        size, _etag = storage.stat(storage_key)
+    except Exception as e:
+        logger.warning("Confirmed upload %s not found in storage: %s", storage_key, e)
+        return Response({"success": False, "error": "File has not been uploaded"}, status=400)
+
+    if size != upload['file_size']:
+        storage.delete(storage_key)
         return Response(
-            {"success": False, "error": "Failed to store file"},
-            status=500,
+            {"success": False, "error": f"Uploaded size {size} does not match declared size {upload['file_size']}"},
+            status=400,
         )
 
+    sha256 = None
+    if upload['sha256']:
+        try:
+            sha256 = storage.sha256(storage_key)
+        except Exception as e:
+            logger.error("Failed to read upload %s for verification: %s", storage_key, e)
+            return Response({"success": False, "error": "Failed to verify upload"}, status=500)
+        if sha256 != upload['sha256']:
+            storage.delete(storage_key)
+            return Response({"success": False, "error": "Uploaded file checksum mismatch"}, status=400)
+
+    document_type, error = _check_upload(upload['mime_type'], size, upload['document_type'])
+    if error:
+        storage.delete(storage_key)
+        return error
+
     service = DocumentService(request.user)
     result = service.upload({
-        'original_filename': original_filename,
-        'mime_type': mime_type,
-        'file_size': file_size,
+        'original_filename': upload['original_filename'],
+        'mime_type': upload['mime_type'],
+        'file_size': size,
         'storage_key': storage_key,
+        'document_type': document_type,
+        'sha256': sha256,
     })
 
     if result.get('success'):
@@ -66,13 +268,168 @@ def upload_document(request):
             "success": True,
             "document": result.get('data', {}),
         })
-    else:
-        storage.delete(storage_key)
+    # A concurrent confirm of the same token won the unique storage_key; its object must stay
+    confirmed = _already_confirmed(storage_key)
+    if confirmed:
+        return confirmed
+    storage.delete(storage_key)
+    return Response(
+        {"success": False, "error": result.get('detail', 'Upload failed')},
+        status=500,
+    )
+
+
+@api_view(["POST"])
+@permission_classes([checkUserWithRights(ClaimlensConfig.gql_mutation_upload_document_perms)])
+def upload_batch(request):
+    """Upload many files (``files`` parts and/or a zip ``archive``) as one batch.
+
+    Optional ``hints`` is a JSON object mapping file names to
+    ``{"document_type": code, "language": iso_code}``; top-level
+    ``document_type``/``language`` apply to files without a hint. Invalid files
+    are reported under ``rejected`` and do not fail the batch. Unless
+    ``process`` is false, the batch's pipelines are started as a Celery group.
+    """
+    try:
+        hints = json.loads(request.data.get('hints') or '{}')
+        if not isinstance(hints, dict):
+            raise ValueError
+    except ValueError:
+        return Response({"success": False, "error": "hints must be a JSON object"}, status=400)
+    default_hint = {
+        'document_type': request.data.get('document_type') or None,
+        'language': request.data.get('language') or None,
+    }
+
+    files = [(f.name, f.content_type, f.size, f) for f in request.FILES.getlist('files')]
+    archive = request.FILES.get('archive')
+    try:
+        if archive:
+            files.extend(_archive_members(archive))
+    except zipfile.BadZipFile:
+        return Response({"success": False, "error": "archive is not a valid zip file"}, status=400)
+    if not files:
+        return Response({"success": False, "error": "No files provided"}, status=400)
+    max_files = ClaimlensConfig.batch_max_files or 5000
+    if len(files) > max_files:
+        return Response(
+            {"success": False, "error": f"Too many files. Max per batch: {max_files}"},
+            status=400,
+        )
+
+    file_hints = []
+    for name, _mime_type, _size, _content in files:
+        hint = hints.get(name) or hints.get(os.path.basename(name))
+        hint = hint if isinstance(hint, dict) else {}
+        file_hints.append({**default_hint, **{k: v for k, v in hint.items() if v}})
+    codes = {hint['document_type'] for hint in file_hints if hint.get('document_type')}
+    document_types = {
+        document_type.code: document_type
+        for document_type in DocumentType.objects.filter(code__in=codes, is_active=True, is_deleted=False)
+    }
+
+    batch_id = uuid_lib.uuid4()
+    entries = []
+    rejected = []
+    for (name, mime_type, size, content), hint in zip(files, file_hints):
+        _document_type, error = _check_upload(mime_type, size)
+        if error:
+            rejected.append({"filename": name, "error": error.data["error"]})
+            continue
+        code = hint.get('document_type')
+        if code and code not in document_types:
+            rejected.append({"filename": name, "error": f"Unknown document type: {code}"})
+            continue
+        language = hint.get('language')
+        if language and (not isinstance(language, str) or len(language) > 10):
+            rejected.append({"filename": name, "error": f"Invalid language: {language}"})
+            continue
+        entries.append(({
+            'original_filename': name,
+            'mime_type': mime_type,
+            'file_size': size,
+            'storage_key': f"documents/{uuid_lib.uuid4()}/{_safe_filename(name)}",
+            'document_type': document_types.get(code),
+            'language': language,
+        }, content))
+
+    storage = ClaimlensStorage()
+    stored = [obj_data for obj_data, _content in entries]
+    try:
+        _store_batch(storage, entries)
+    except Exception as e:
+        logger.error("Failed to store batch %s: %s", batch_id, e)
+        _delete_batch_objects(storage, stored)
+        return Response({"success": False, "error": "Failed to store files"}, status=500)
+
+    service = DocumentService(request.user)
+    result = service.upload_batch(batch_id, stored) if stored else {
+        'success': True, 'data': {'batch_id': str(batch_id), 'documents': []},
+    }
+    if not result.get('success'):
+        _delete_batch_objects(storage, stored)
         return Response(
             {"success": False, "error": result.get('detail', 'Upload failed')},
             status=500,
         )
 
+    response = {"success": True, **result.get('data', {}), "rejected": rejected}
+    if stored and str(request.data.get('process', 'true')).lower() not in ('false', '0', 'no'):
+        started = service.start_batch_processing(batch_id)
+        if not started.get('success'):
+            # Documents stay pending and can be started individually
+            response["processing_error"] = started.get('detail', 'Failed to start processing')
+        else:
+            response["group_id"] = started.get('data', {}).get('group_id')
+    return Response(response)
+
+
+@api_view(["GET"])
+@permission_classes([checkUserWithRights(ClaimlensConfig.gql_query_documents_perms)])
+def batch_progress(request, batch_id):
+    progress = DocumentService.batch_progress(batch_id)
+    if not progress['total']:
+        return Response({"error": "Batch not found"}, status=404)
+    return Response(progress)
+
+
+def _archive_members(archive):
+    """``(name, mime_type, size, reader)`` of each file in a zip, read only when stored."""
+    bundle = zipfile.ZipFile(archive)
+    members = []
+    for info in bundle.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+            continue
+        mime_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        # Sizes come from the zip directory, so oversized members are rejected before
+        # anything is inflated; zipfile never inflates a member past its declared size
+        members.append((name, mime_type, info.file_size, functools.partial(bundle.read, info)))
+    return members
+
+
+def _store_batch(storage, entries):
+    """Write a batch's files to storage in parallel; zip members are inflated one window at a time."""
+    workers = ClaimlensConfig.batch_upload_workers or 8
+
+    def store(entry):
+        obj_data, content = entry
+        if callable(content):
+            content = content()
+        storage.save(obj_data['storage_key'], content, content_type=obj_data['mime_type'])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(entries), workers * 2):
+            list(pool.map(store, entries[start:start + workers * 2]))
+
+
+def _delete_batch_objects(storage, entries):
+    for obj_data in entries:
+        try:
+            storage.delete(obj_data['storage_key'])
+        except Exception as e:
+            logger.warning("Failed to delete %s: %s", obj_data['storage_key'], e)
+
 
 @api_view(["GET"])
 def health_check(request):
@@ -85,8 +442,14 @@ def health_check(request):
         results["storage"] = False
 
     try:
-        from claimlens.engine.manager import EngineManager
-        manager = EngineManager()
+        from claimlens.storage_cache import get_storage_cache_stats
+        results["storage_cache"] = get_storage_cache_stats()
+    except Exception:
+        results["storage_cache"] = {}
+
+    try:
+        from claimlens.engine.manager import get_engine_manager
+        manager = get_engine_manager()
         results["engines"] = manager.health_check()
     except Exception:
         results["engines"] = {}
@@ -106,13 +469,95 @@ def download_document(request, document_uuid):
         return Response({"error": "Document not found"}, status=404)
 
     storage = ClaimlensStorage()
+    if ClaimlensConfig.download_presigned_urls:
+        try:
+            url = storage.presigned_url(
+                doc.storage_key,
+                expires_in=ClaimlensConfig.download_presigned_url_expiry_seconds or 300,
+                filename=doc.original_filename,
+                content_type=doc.mime_type,
+            )
+        except Exception as e:
+            logger.error("Failed to presign download of document %s: %s", document_uuid, e)
+            return Response({"error": "Failed to retrieve document"}, status=500)
+        return HttpResponseRedirect(url)
+
+    try:
+        size, etag = storage.stat(doc.storage_key)
+    except Exception as e:
+        logger.error("Failed to read document %s from storage: %s", document_uuid, e)
+        return Response({"error": "Failed to retrieve document"}, status=500)
+
+    if _etag_matches(request.headers.get("If-None-Match"), etag):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if not if_range or if_range == etag:
+        try:
+            byte_range = _parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    chunk_size = (ClaimlensConfig.download_chunk_size_kb or 64) * 1024
+    start, end = byte_range or (None, None)
     try:
-        data = storage.read(doc.storage_key)
+        chunks = storage.stream(doc.storage_key, start=start, end=end, chunk_size=chunk_size)
     except Exception as e:
         logger.error("Failed to read document %s from storage: %s", document_uuid, e)
         return Response({"error": "Failed to retrieve document"}, status=500)
 
-    response = HttpResponse(data, content_type=doc.mime_type)
+    response = StreamingHttpResponse(chunks, content_type=doc.mime_type)
+    if byte_range:
+        response.status_code = 206
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    else:
+        response["Content-Length"] = size
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
     response["Content-Disposition"] = f'inline; filename="{doc.original_filename}"'
     response["Cache-Control"] = "private, max-age=3600"
     return response
+
+
+def _opaque_tag(tag):
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match requires
+    return "*" in candidates or _opaque_tag(etag) in (_opaque_tag(tag) for tag in candidates)
+
+
+def _parse_range(header, size):
+    """Return the inclusive ``(start, end)`` of a single-range Range header, or None to send the whole object.
+
+    Headers this endpoint does not support (other units, several ranges) are
+    ignored, as RFC 9110 allows. Raises ValueError for an unsatisfiable range.
+    """
+    match = RANGE_PATTERN.match(header or "")
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    if start > end:
+        return None
+    return start, end